@@ -1,61 +1,128 @@
-import sys
+import argparse
+import os
 import sqlite3
+import sys
 
-from PyQt6.QtCore import QDate, QFile
+from PyQt6.QtCore import Qt, QDate, QFile, QSize, QTimer, QThread, QUrl, pyqtSignal
 from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, \
     QTableWidget, QTableWidgetItem, QComboBox, QLineEdit, QDialog, QGridLayout, QDialogButtonBox, QMessageBox, \
-    QDateEdit, QAbstractItemView, QMenuBar, QToolBar, QSizePolicy
-from PyQt6.QtGui import QAction, QIcon, QKeySequence
-
-
-class DatabaseManager:
-    def __init__(self):
-        self.connection = sqlite3.connect("staff_database.db")
-        self.cursor = self.connection.cursor()
-
-        # Create the 'staff' table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS staff (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                mobile TEXT,
-                email TEXT,
-                role TEXT,
-                salary REAL,
-                joining_date TEXT,
-                address TEXT,
-                remark TEXT,
-                deleted_at TEXT
-            )
-        ''')
-        self.connection.commit()
-
-    def execute(self, query, values=None):
-        if values:
-            self.cursor.execute(query, values)
-        else:
-            self.cursor.execute(query)
-        self.connection.commit()
-
-    def fetch_all(self, query, values=None):
-        if values:
-            self.cursor.execute(query, values)
-        else:
-            self.cursor.execute(query)
-        return self.cursor.fetchall()
-
-    def close(self):
-        self.connection.close()
+    QDateEdit, QAbstractItemView, QMenuBar, QToolBar, QSizePolicy, QCheckBox, QInputDialog, QFileDialog, \
+    QTreeWidget, QTreeWidgetItem, QDockWidget, QSpinBox, QCompleter, QCalendarWidget
+from PyQt6.QtGui import QAction, QIcon, QKeySequence, QDesktopServices, QPdfWriter, QTextDocument, QImage, \
+    QPixmap, QPixmapCache, QTextCharFormat, QColor
+
+from database import DatabaseManager, STAFF_COLUMNS
+from validation import validate_mobile, validate_email, validate_salary
+from archive import StaffArchiver
+from backup import BackupManager, BackupError
+from history import ChangeHistory
+from salary_history import SalaryHistory
+from hierarchy import ReportingHierarchy
+from attendance import AttendanceLog, CLOCK_IN, CLOCK_OUT
+from payroll import PayrollEngine
+from reports import ReportGenerator, ReportCache, REPORTS
+from dedup import StaffDeduplicator, check_unique
+from roles import RoleDirectory
+from query_builder import QueryBuilder, FIELDS, OPERATORS, BASE_FILTER
+from profiling import ActionProfiler, EventLoopWatchdog
+from documents import DocumentStore, PHOTO, DOCUMENT, read_blob
+from versioning import RowVersions, EditConflict
+from sharding import BranchShards
+from sync import SyncEngine
+from search_cache import SearchCache
+from leave import LeaveCalendar, LEAVE_KINDS, HOLIDAY
+from milestones import MilestoneAlerts
+from bulk_edit import BulkEditor, BULK_OPERATIONS, CHANGE_SALARY
+from migrations import migrate
+
+# Interval between scheduled snapshots of the database
+BACKUP_INTERVAL_MS = 6 * 60 * 60 * 1000
+
+# Writes made within this window of each other share one commit
+GROUP_COMMIT_MS = 200
+
+# How often buffered clock events are written to the database
+ATTENDANCE_FLUSH_MS = 2000
+
+# Ask before showing a filter result larger than this
+LARGE_RESULT_ROWS = 10000
+
+# In profile mode, log the GUI thread's stack when the event loop is blocked for longer than this
+WATCHDOG_THRESHOLD_MS = 500
+
+# How far ahead the alerts panel looks for anniversaries and probation ends
+ALERT_DAYS = 30
+
+# Staff photo thumbnails shown next to names, and the memory the thumbnail cache may use
+THUMBNAIL_SIZE = 32
+THUMBNAIL_CACHE_KB = 16 * 1024
 
 
 class StaffManagementApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile=False, branch=None, read_only=False):
         super().__init__()
 
-        self.db_manager = DatabaseManager()
+        # In read-only mode the database is only looked at: nothing that writes to it is offered
+        self.read_only = read_only
+
+        # In branch mode this branch's own database file takes all the writes
+        self.branch = branch
+        self.shards = BranchShards() if branch else None
+        database_path = "staff_database.db"
+        if branch:
+            database_path = self.shards.branch_path(branch) if read_only else self.shards.open(branch)
+
+        self.db_manager = DatabaseManager(database_path, group_commit_window=GROUP_COMMIT_MS / 1000,
+                                          read_only=read_only)
+        self.db_manager.on_commit_pending = \
+            lambda window: QTimer.singleShot(int(window * 1000), self.db_manager.flush)
+        # A branch archives and backs up into its own files, so it never sees or rotates away another branch's
+        if branch:
+            self.archiver = StaffArchiver(self.db_manager, self.shards.archive_path(branch))
+            self.backup_manager = BackupManager(database_path, self.shards.backup_dir(branch))
+        else:
+            self.archiver = StaffArchiver(self.db_manager)
+            self.backup_manager = BackupManager(database_path)
+        self.search_cache = SearchCache(self.db_manager, self.archiver.search)
+        self.backup_worker = None
+        self.payroll_worker = None
+        self.report_worker = None
+        self.report_cache = ReportCache()
+        self.history = ChangeHistory(self.db_manager)
+        self.history.on_change = self.update_table_rows
+        self.salary_history = SalaryHistory(self.db_manager)
+        self.hierarchy = ReportingHierarchy(self.db_manager)
+        self.attendance = AttendanceLog(self.db_manager)
+        self.leave = LeaveCalendar(self.db_manager)
+        self.milestones = MilestoneAlerts(self.db_manager)
+        self.deduplicator = StaffDeduplicator(self.db_manager)
+        self.roles = RoleDirectory(self.db_manager)
+        self.query_builder = QueryBuilder(self.db_manager)
+        self.documents = DocumentStore(self.db_manager)
+        self.versions = RowVersions(self.db_manager)
+        self.sync_engine = SyncEngine(self.db_manager, self.archiver)
+        self.bulk_editor = BulkEditor(self.db_manager)
+        self.thumbnail_worker = None
+        self.thumbnail_requests = {}
+        self.thumbnails_pending = False
+
+        # In profile mode each user action writes a cProfile report, and event loop stalls are logged
+        self.watchdog = None
+        if profile:
+            profiler = ActionProfiler()
+            for action_name in ("add_staff", "edit_staff", "delete_staff", "search_staff", "filter_staff"):
+                setattr(self, action_name, profiler.wrap(action_name, getattr(self, action_name)))
+
+            self.watchdog = EventLoopWatchdog(WATCHDOG_THRESHOLD_MS / 1000)
+            self.watchdog_timer = QTimer(self)
+            self.watchdog_timer.timeout.connect(self.watchdog.heartbeat)
+            self.watchdog_timer.start(WATCHDOG_THRESHOLD_MS // 5)
+            self.watchdog.start()
 
         # Set up the main window
-        self.setWindowTitle("Staff Management System")
+        self.setWindowTitle(f"Staff Management System - {branch}" if branch else "Staff Management System")
+        if read_only:
+            self.setWindowTitle(self.windowTitle() + " (read only)")
         self.setGeometry(100, 100, 1000, 1000)
 
         self.central_widget = QWidget()
@@ -97,6 +164,121 @@ class StaffManagementApp(QMainWindow):
         toolbar.addAction(search_action)
         file_menu.addAction(search_action)
 
+        # Create Documents action
+        documents_action = QAction("Staff Documents...", self)
+        documents_action.triggered.connect(self.manage_documents)
+        file_menu.addAction(documents_action)
+
+        # Create Filter actions
+        filter_action = QAction("Filter Staff...", self)
+        filter_action.triggered.connect(self.filter_staff)
+        file_menu.addAction(filter_action)
+
+        clear_filter_action = QAction("Clear Filter", self)
+        clear_filter_action.triggered.connect(self.clear_filter)
+        file_menu.addAction(clear_filter_action)
+
+        # Create Archive actions (menu only)
+        file_menu.addSeparator()
+        archive_action = QAction("Archive Deleted Staff...", self)
+        archive_action.triggered.connect(self.archive_deleted_staff)
+        file_menu.addAction(archive_action)
+
+        restore_action = QAction("Restore Archived Staff...", self)
+        restore_action.triggered.connect(self.restore_archived_staff)
+        file_menu.addAction(restore_action)
+
+        # Create Backup actions (menu only)
+        file_menu.addSeparator()
+        backup_action = QAction("Back Up Now", self)
+        backup_action.triggered.connect(self.start_backup)
+        file_menu.addAction(backup_action)
+
+        restore_backup_action = QAction("Restore From Backup...", self)
+        restore_backup_action.triggered.connect(self.restore_from_backup)
+        file_menu.addAction(restore_backup_action)
+
+        # Exchange changed records with another office's copy of the database
+        file_menu.addSeparator()
+        export_changes_action = QAction("Export Changes...", self)
+        export_changes_action.triggered.connect(self.export_changes)
+        file_menu.addAction(export_changes_action)
+
+        import_changes_action = QAction("Import Changes...", self)
+        import_changes_action.triggered.connect(self.import_changes)
+        file_menu.addAction(import_changes_action)
+
+        # Create edit menu with Undo/Redo actions
+        edit_menu = menu_bar.addMenu("Edit")
+
+        self.undo_action = QAction("Undo", self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(self.undo_change)
+        edit_menu.addAction(self.undo_action)
+
+        self.redo_action = QAction("Redo", self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(self.redo_change)
+        edit_menu.addAction(self.redo_action)
+
+        self.update_undo_actions()
+
+        edit_menu.addSeparator()
+        duplicates_action = QAction("Find Duplicates...", self)
+        duplicates_action.triggered.connect(self.find_duplicates)
+        edit_menu.addAction(duplicates_action)
+
+        bulk_edit_action = QAction("Bulk Edit...", self)
+        bulk_edit_action.triggered.connect(self.bulk_edit_staff)
+        edit_menu.addAction(bulk_edit_action)
+
+        # Create attendance menu
+        attendance_menu = menu_bar.addMenu("Attendance")
+
+        clock_in_action = QAction("Clock In Selected", self)
+        clock_in_action.triggered.connect(lambda: self.clock_selected_staff(CLOCK_IN))
+        attendance_menu.addAction(clock_in_action)
+
+        clock_out_action = QAction("Clock Out Selected", self)
+        clock_out_action.triggered.connect(lambda: self.clock_selected_staff(CLOCK_OUT))
+        attendance_menu.addAction(clock_out_action)
+
+        attendance_menu.addSeparator()
+        attendance_report_action = QAction("Attendance Summary...", self)
+        attendance_report_action.triggered.connect(self.show_attendance)
+        attendance_menu.addAction(attendance_report_action)
+
+        leave_calendar_action = QAction("Leave Calendar...", self)
+        leave_calendar_action.triggered.connect(self.show_leave_calendar)
+        attendance_menu.addAction(leave_calendar_action)
+
+        # Write buffered clock events in batches
+        self.attendance_timer = QTimer(self)
+        self.attendance_timer.timeout.connect(self.flush_attendance)
+        self.attendance_timer.start(ATTENDANCE_FLUSH_MS)
+
+        # Create reports menu
+        reports_menu = menu_bar.addMenu("Reports")
+
+        payroll_action = QAction("Payroll As Of...", self)
+        payroll_action.triggered.connect(self.show_payroll_as_of)
+        reports_menu.addAction(payroll_action)
+
+        run_payroll_action = QAction("Run Payroll...", self)
+        run_payroll_action.triggered.connect(self.run_payroll)
+        reports_menu.addAction(run_payroll_action)
+
+        reports_menu.addSeparator()
+        generate_report_action = QAction("Generate Report...", self)
+        generate_report_action.triggered.connect(self.generate_report)
+        reports_menu.addAction(generate_report_action)
+
+        # Take scheduled snapshots in the background; a read-only instance leaves that to the instances that write
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.start_backup)
+        if not read_only:
+            self.backup_timer.start(BACKUP_INTERVAL_MS)
+
         # Setting tooltips and shortcuts for actions
         add_action.setToolTip("Add a new staff member")
         edit_action.setToolTip("Edit staff member details")
@@ -112,17 +294,38 @@ class StaffManagementApp(QMainWindow):
         # Create a table to display staff data
         self.table = QTableWidget()
         self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setColumnCount(9)  # Number of columns
         self.table.setHorizontalHeaderLabels(
             ["ID", "Name", "Mobile", "Email", "Role", "Salary", "Joining Date", "Address", "Remark"])
 
-        # Create a list to store main table data
+        # Create a list to store main table data, and a map from staff id to its row
         self.main_data_list = []
+        self.row_index = {}
+
+        # The rows shown in the table, as a WHERE clause shared by the table and its footer
+        self.view_filter = BASE_FILTER
+        self.view_parameters = ()
+
+        # Show staff photos next to names, loading thumbnails only for the rows in view once scrolling settles
+        self.table.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        QPixmapCache.setCacheLimit(THUMBNAIL_CACHE_KB)
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(100)
+        self.thumbnail_timer.timeout.connect(self.load_visible_thumbnails)
+        self.table.verticalScrollBar().valueChanged.connect(lambda value: self.thumbnail_timer.start())
+
+        # Footer with the headcount and salary totals of the rows in the table
+        self.footer_label = QLabel()
+        self.footer_count = 0
+        self.footer_salary_total = 0.0
 
         # Populate the table with staff data from the database
         self.populate_table()
 
         self.layout.addWidget(self.table)
+        self.layout.addWidget(self.footer_label)
 
         # Create buttons and search options
         self.add_button = QPushButton("Add Staff")
@@ -157,34 +360,468 @@ class StaffManagementApp(QMainWindow):
 
         self.central_widget.setLayout(self.layout)
 
+        if read_only:
+            for widget in (add_action, edit_action, delete_action, archive_action, restore_action,
+                           restore_backup_action, import_changes_action, duplicates_action, bulk_edit_action,
+                           clock_in_action,
+                           clock_out_action, run_payroll_action, self.add_button, self.edit_button, self.delete_button):
+                widget.setEnabled(False)
+
+        # Create the organisation tree, loading each manager's reports only when expanded
+        self.org_tree = QTreeWidget()
+        self.org_tree.setHeaderLabels(["Name", "Role"])
+        self.org_tree.itemExpanded.connect(self.load_direct_reports)
+        self.org_tree.itemDoubleClicked.connect(self.select_staff_from_tree)
+
+        org_dock = QDockWidget("Organisation", self)
+        org_dock.setWidget(self.org_tree)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, org_dock)
+
+        # Create the alerts panel with the milestones coming up
+        self.alerts_tree = QTreeWidget()
+        self.alerts_tree.setHeaderLabels(["Staff", "Date", "Milestone"])
+        self.alerts_tree.itemDoubleClicked.connect(self.select_staff_from_tree)
+
+        alerts_dock = QDockWidget("Upcoming", self)
+        alerts_dock.setWidget(self.alerts_tree)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, alerts_dock)
+
+        # Create view menu
+        view_menu = menu_bar.addMenu("View")
+        view_menu.addAction(org_dock.toggleViewAction())
+        view_menu.addAction(alerts_dock.toggleViewAction())
+
+        if self.shards:
+            branch_totals_action = QAction("Branch Totals...", self)
+            branch_totals_action.triggered.connect(self.show_branch_totals)
+            view_menu.addAction(branch_totals_action)
+
+        diagnostics_action = QAction("Diagnostics...", self)
+        diagnostics_action.triggered.connect(self.show_diagnostics)
+        view_menu.addAction(diagnostics_action)
+
+        self.load_org_tree()
+        self.load_alerts()
+
+        # Existing duplicates keep the unique indexes from being created until they are merged
+        if self.deduplicator.missing_indexes and not read_only:
+            self.statusBar().showMessage(f"Duplicate {' and '.join(self.deduplicator.missing_indexes)} values found. "
+                                         f"Use Edit > Find Duplicates to merge them.")
+
+    def closeEvent(self, event):
+        # Write buffered clock events and commit any held back writes before quitting
+        self.attendance.flush()
+        self.db_manager.close()
+        # Large undo steps live in temporary files, which are deleted with the history
+        self.history.reset()
+        if self.watchdog:
+            self.watchdog.stop()
+        super().closeEvent(event)
+
     def apply_button_style(self, button):
         button.setStyleSheet("QPushButton { background-color: #000000; color: white; border-radius: 5px; height: 25px; "
                              "width: 100px; font-weight: bold; }"
                              ":hover { background-color: #ffffff; color: #000000; }")
 
     def add_staff(self):
-        dialog = AddStaffDialog(self.db_manager, self.populate_table)
-        if dialog.exec() == QDialog.accepted:
-            self.populate_table()  # Update the table after adding
+        dialog = AddStaffDialog(self.db_manager, self.history, self.hierarchy, self.roles)
+        dialog.exec()
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
 
     def edit_staff(self):
-        dialog = EditStaffDialog(self.db_manager, self.populate_table)
-        if dialog.exec() == QDialog.accepted:
-            self.populate_table()  # Update the table after adding
+        # The row may have been removed by someone else since the table was loaded
+        staff_id = int(self.table.item(self.table.currentRow(), 0).text())
+        record, version = self.versions.fetch(staff_id)
+        if record is None or record[9] is not None:
+            QMessageBox.warning(self, "Edit Staff", "This staff member no longer exists.")
+            self.update_table_rows([(staff_id, record)])
+            return
+
+        dialog = EditStaffDialog(self.db_manager, self.history, self.salary_history, self.hierarchy, self.roles,
+                                 self.versions)
+        dialog.exec()
+
+        # Someone else may have changed the record, so show it as it is now
+        staff_id = int(dialog.staff_id)
+        self.update_table_rows([(staff_id, self.versions.fetch(staff_id)[0])])
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
 
     def delete_staff(self):
-        dialog = DeleteStaffDialog(self.db_manager, self.populate_table)
+        dialog = DeleteStaffDialog(self.db_manager, self.history)
+        dialog.exec()
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
+
+    def bulk_edit_staff(self):
+        if not self.main_data_list:
+            QMessageBox.warning(self, "Bulk Edit", "There are no staff in the table to edit.")
+            return
+
+        selected_ids = [int(self.table.item(index.row(), 0).text())
+                        for index in self.table.selectionModel().selectedRows()]
+        shown_ids = [record[0] for record in self.main_data_list]
+        dialog = BulkEditDialog(self.bulk_editor, self.history, selected_ids, shown_ids)
+        dialog.exec()
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
+
+    def clock_selected_staff(self, event_type):
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
+            QMessageBox.warning(self, "Attendance", "Please select the staff members to clock.")
+            return
+
+        for index in selected_rows:
+            self.attendance.clock(int(self.table.item(index.row(), 0).text()), event_type)
+        self.statusBar().showMessage(f"Clocked {event_type} {len(selected_rows)} staff member(s)", 5000)
+
+    def flush_attendance(self):
+        # The events stay buffered when the write fails, so the next flush tries them again
+        try:
+            self.attendance.flush()
+        except sqlite3.Error as error:
+            self.statusBar().showMessage(f"Clock events could not be saved yet, will retry: {error}", 5000)
+
+    def show_attendance(self):
+        self.flush_attendance()
+        dialog = AttendanceDialog(self.attendance)
+        dialog.exec()
+
+    def show_leave_calendar(self):
+        # Leave can be added for the staff member selected in the table
+        row_num = self.table.currentRow()
+        staff = self.main_data_list[row_num][:2] if 0 <= row_num < len(self.main_data_list) else None
+        dialog = LeaveCalendarDialog(self.leave, staff)
+        dialog.exec()
+
+    def show_payroll_as_of(self):
+        dialog = PayrollAsOfDialog(self.salary_history)
+        dialog.exec()
+
+    def run_payroll(self):
+        if self.payroll_worker is not None and self.payroll_worker.isRunning():
+            QMessageBox.information(self, "Payroll", "A payroll run is already in progress.")
+            return
+
+        period, ok = QInputDialog.getText(self, "Run Payroll", "Payroll month (yyyy-MM):",
+                                          text=QDate.currentDate().toString("yyyy-MM"))
+        if not ok:
+            return
+        if not QDate.fromString(period + "-01", "yyyy-MM-dd").isValid():
+            QMessageBox.critical(self, "Input Error", "Invalid payroll month. Please use the yyyy-MM format.")
+            return
+
+        # The worker uses its own connection, so it must see every held back write
+        self.db_manager.flush()
+
+        self.payroll_worker = PayrollWorker(self.db_manager.database_path, period)
+        self.payroll_worker.completed.connect(self.show_payroll_result)
+        self.payroll_worker.failed.connect(lambda message: QMessageBox.critical(self, "Payroll Error", message))
+        self.payroll_worker.start()
+        self.statusBar().showMessage(f"Running payroll for {period}...")
+
+    def generate_report(self):
+        if self.report_worker is not None and self.report_worker.isRunning():
+            QMessageBox.information(self, "Reports", "A report is already being generated.")
+            return
+
+        titles = {title: report_name for report_name, (title, headers, query) in REPORTS.items()}
+        title, ok = QInputDialog.getItem(self, "Generate Report", "Report:", list(titles), 0, False)
+        if not ok:
+            return
+        report_format, ok = QInputDialog.getItem(self, "Generate Report", "Format:", ["HTML", "PDF"], 0, False)
+        if not ok:
+            return
+
+        # Reuse the last file for this report if nothing has changed since it was generated
+        self.db_manager.flush()
+        change_version = self.db_manager.change_version()
+        report_path = self.report_cache.get(titles[title], report_format, change_version)
+        if report_path:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(report_path)))
+            return
+
+        self.report_worker = ReportWorker(self.db_manager.database_path, titles[title], report_format)
+        self.report_worker.progress.connect(
+            lambda done, total: self.statusBar().showMessage(f"Generating {title}... {done}/{total} rows"))
+        self.report_worker.completed.connect(
+            lambda path: self.show_report(titles[title], report_format, change_version, path))
+        self.report_worker.failed.connect(lambda message: QMessageBox.critical(self, "Report Error", message))
+        self.report_worker.start()
+
+    def show_report(self, report_name, report_format, change_version, report_path):
+        self.report_cache.put(report_name, report_format, change_version, report_path)
+        self.statusBar().showMessage(f"Report saved to {report_path}", 5000)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(report_path)))
+
+    def show_payroll_result(self, period, headcount, total_gross, total_deductions, total_net, skipped):
+        self.statusBar().showMessage(f"Payroll for {period} complete", 5000)
+        message = (f"Payroll for {period}\n\n"
+                   f"Staff paid: {headcount}\n"
+                   f"Gross pay: {total_gross:,.2f}\n"
+                   f"Deductions: {total_deductions:,.2f}\n"
+                   f"Net pay: {total_net:,.2f}")
+        if skipped:
+            message += (f"\n\nNot paid, joining date is not a valid date: "
+                        f"ID {', '.join(str(staff_id) for staff_id in skipped)}")
+        QMessageBox.information(self, "Payroll", message)
+
+    def undo_change(self):
+        try:
+            self.update_table_rows(self.history.undo())
+        except ValueError as error:
+            QMessageBox.warning(self, "Undo", str(error))
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
+
+    def redo_change(self):
+        try:
+            self.update_table_rows(self.history.redo())
+        except ValueError as error:
+            QMessageBox.warning(self, "Redo", str(error))
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
+
+    def find_duplicates(self):
+        dialog = DuplicatesDialog(self.deduplicator, self.update_table_rows)
         dialog.exec()
+        self.load_org_tree()
+        self.load_alerts()
+
+        if not self.deduplicator.ensure_unique_indexes():
+            self.statusBar().showMessage("Mobile numbers and email addresses are now kept unique", 5000)
+
+    def load_org_tree(self):
+        """
+        Loads the top of the organisation; lower levels are fetched as they are expanded.
+        """
+        self.org_tree.clear()
+        self.add_org_tree_items(self.org_tree.invisibleRootItem(), self.hierarchy.direct_reports())
+
+    def add_org_tree_items(self, parent_item, reports):
+        for staff_id, name, role, has_reports in reports:
+            item = QTreeWidgetItem([name or "", role or ""])
+            item.setData(0, Qt.ItemDataRole.UserRole, staff_id)
+            if has_reports:
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            parent_item.addChild(item)
+
+    def load_direct_reports(self, item):
+        if item.childCount() == 0:
+            self.add_org_tree_items(item, self.hierarchy.direct_reports(item.data(0, Qt.ItemDataRole.UserRole)))
+
+    def select_staff_from_tree(self, item, column):
+        # Select the staff member in the main table
+        row_num = self.row_index.get(item.data(0, Qt.ItemDataRole.UserRole))
+        if row_num is not None:
+            self.table.selectRow(row_num)
+
+    def load_alerts(self):
+        """
+        Lists work anniversaries and probation ends in the next ALERT_DAYS days.
+        """
+        self.alerts_tree.clear()
+
+        anniversaries = QTreeWidgetItem([f"Work anniversaries (next {ALERT_DAYS} days)"])
+        for anniversary, years, staff_id, name in self.milestones.anniversaries(ALERT_DAYS):
+            item = QTreeWidgetItem([name or "", anniversary.strftime("%d-%m-%Y"),
+                                    f"{years} year{'s' if years > 1 else ''}"])
+            item.setData(0, Qt.ItemDataRole.UserRole, staff_id)
+            anniversaries.addChild(item)
+
+        probation_endings = QTreeWidgetItem([f"Probation ending (next {ALERT_DAYS} days)"])
+        for probation_end, staff_id, name in self.milestones.probation_endings(ALERT_DAYS):
+            item = QTreeWidgetItem([name or "", probation_end.strftime("%d-%m-%Y"), "Probation ends"])
+            item.setData(0, Qt.ItemDataRole.UserRole, staff_id)
+            probation_endings.addChild(item)
+
+        for group in (anniversaries, probation_endings):
+            self.alerts_tree.addTopLevelItem(group)
+            group.setExpanded(True)
+
+    def update_undo_actions(self):
+        self.undo_action.setEnabled(self.history.can_undo() and not self.read_only)
+        self.redo_action.setEnabled(self.history.can_redo() and not self.read_only)
+        self.undo_action.setText(f"Undo {self.history.undo_stack[-1].label}" if self.history.can_undo() else "Undo")
+        self.redo_action.setText(f"Redo {self.history.redo_stack[-1].label}" if self.history.can_redo() else "Redo")
 
     def search_staff(self):
         dialog = SearchStaffDialog(self.db_manager, self.populate_table, self)
         if dialog.exec() == QDialog.accepted:
             self.populate_table()
 
+    def show_branch_totals(self):
+        # Other branches read committed data only, so commit ours first
+        self.db_manager.flush()
+        totals = self.shards.totals()
+        lines = [f"{branch}: {headcount} staff, total salary {salary_total:,.2f}"
+                 for branch, headcount, salary_total in totals]
+        lines.append(f"All branches: {sum(row[1] for row in totals)} staff, "
+                     f"total salary {sum(row[2] for row in totals):,.2f}")
+        QMessageBox.information(self, "Branch Totals", "\n".join(lines))
+
+    def show_diagnostics(self):
+        cache = self.search_cache
+        QMessageBox.information(self, "Diagnostics",
+                                f"Search cache: {len(cache.entries)} of {cache.max_entries} queries cached\n"
+                                f"Hit rate: {cache.hit_rate():.0%} ({cache.hits} repeated, "
+                                f"{cache.refinements} refined, {cache.misses} from the database)")
+
+    def filter_staff(self):
+        dialog = QueryBuilderDialog(self.query_builder, self.apply_filter)
+        dialog.exec()
+
+    def apply_filter(self, where, parameters):
+        self.view_filter = where
+        self.view_parameters = parameters
+        self.populate_table()
+        self.statusBar().showMessage("Filter applied" if where != BASE_FILTER else "")
+
+    def clear_filter(self):
+        self.apply_filter(BASE_FILTER, ())
+
+    def visible_ids(self, staff_ids):
+        """
+        Returns which of the given staff ids the current filter shows.
+        """
+        if not staff_ids:
+            return set()
+        placeholders = ", ".join("?" * len(staff_ids))
+        return {row[0] for row in self.db_manager.fetch_all(
+            f"SELECT id FROM staff WHERE id IN ({placeholders}) AND ({self.view_filter})",
+            list(staff_ids) + list(self.view_parameters))}
+
     def open_search_dialog(self):
         dialog = SearchStaffDialog(self.db_manager, self.populate_table, self)
         dialog.exec()
 
+    def archive_deleted_staff(self):
+        max_age_days, ok = QInputDialog.getInt(self, "Archive Deleted Staff",
+                                               "Archive records deleted more than this many days ago:", 365, 0, 36500)
+        if not ok:
+            return
+
+        self.archive_cutoff = self.archiver.cutoff_date(max_age_days)
+        self.archived_count = 0
+        QTimer.singleShot(0, self.archive_next_batch)
+
+    def archive_next_batch(self):
+        """
+        Archives one batch and schedules the next, so the event loop keeps running between batches.
+        """
+        moved = self.archiver.archive_batch(self.archive_cutoff)
+        self.archived_count += moved
+
+        if moved:
+            self.statusBar().showMessage(f"Archiving... {self.archived_count} staff records moved")
+            QTimer.singleShot(0, self.archive_next_batch)
+        else:
+            self.statusBar().showMessage(f"Archive complete: {self.archived_count} staff records moved", 5000)
+
+    def restore_archived_staff(self):
+        staff_id, ok = QInputDialog.getInt(self, "Restore Archived Staff", "Staff ID to restore:", 1, 1, 2147483647)
+        if not ok:
+            return
+
+        try:
+            restored_id = self.archiver.restore(staff_id)
+        except ValueError as error:
+            QMessageBox.warning(self, "Restore Error", str(error))
+            return
+        if restored_id is None:
+            QMessageBox.warning(self, "Restore Error", f"No archived staff record found with ID {staff_id}.")
+            return
+
+        if restored_id != staff_id:
+            QMessageBox.information(self, "Restore", f"ID {staff_id} is in use, record restored with ID {restored_id}.")
+        self.populate_table()
+
+    def start_backup(self):
+        # Skip if the previous snapshot is still being written
+        if self.backup_worker is not None and self.backup_worker.isRunning():
+            return
+
+        self.backup_worker = BackupWorker(self.backup_manager)
+        self.backup_worker.progress.connect(
+            lambda copied, total: self.statusBar().showMessage(f"Backing up... {copied}/{total} pages"))
+        self.backup_worker.completed.connect(
+            lambda path: self.statusBar().showMessage(f"Backup saved to {path}", 5000))
+        self.backup_worker.failed.connect(lambda message: QMessageBox.critical(self, "Backup Error", message))
+        self.backup_worker.start()
+
+    def restore_from_backup(self):
+        backup_path, _ = QFileDialog.getOpenFileName(self, "Restore From Backup", self.backup_manager.backup_dir,
+                                                     "Database Snapshots (*.db)")
+        if not backup_path:
+            return
+
+        confirmation = QMessageBox.question(self, "Confirmation",
+                                            "Restoring replaces all current staff records. Continue?",
+                                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirmation != QMessageBox.StandardButton.Yes:
+            return
+
+        try:
+            self.db_manager.flush()
+            self.backup_manager.restore(backup_path, self.db_manager.connection)
+            # The snapshot may come from before later schema changes
+            migrate(self.db_manager)
+        except (BackupError, sqlite3.Error) as error:
+            QMessageBox.critical(self, "Restore Error", str(error))
+            return
+
+        # Replacing the whole file does not move the change version, so forget what was cached about the old data
+        self.history.reset()
+        self.search_cache.clear()
+        self.report_cache.clear()
+        self.roles.clear()
+        self.attendance.load_partitions()
+
+        self.populate_table()
+        self.update_undo_actions()
+        self.load_org_tree()
+        self.load_alerts()
+        self.statusBar().showMessage(f"Restored from {backup_path}", 5000)
+
+    def export_changes(self):
+        new_peer = "Another office (first sync)"
+        peer_ids = [row[0] for row in self.sync_engine.peers()]
+        peer, ok = QInputDialog.getItem(self, "Export Changes", "Changes for:", peer_ids + [new_peer], 0, False)
+        if not ok:
+            return
+        changeset_path, _ = QFileDialog.getSaveFileName(self, "Export Changes", "staff.changes.gz",
+                                                        "Staff Changesets (*.gz)")
+        if not changeset_path:
+            return
+
+        written = self.sync_engine.export_changes(changeset_path, None if peer == new_peer else peer)
+        QMessageBox.information(self, "Export Changes", f"{written} changed records written to {changeset_path}.")
+
+    def import_changes(self):
+        changeset_path, _ = QFileDialog.getOpenFileName(self, "Import Changes", "", "Staff Changesets (*.gz)")
+        if not changeset_path:
+            return
+
+        try:
+            applied, skipped, rejected = self.sync_engine.import_changes(changeset_path)
+        except ValueError as error:
+            QMessageBox.critical(self, "Import Error", str(error))
+            return
+
+        self.populate_table()
+        message = f"{applied} records updated, {skipped} already up to date."
+        if rejected:
+            message += "\n\nNot imported because they clash with existing records:\n" + "\n".join(rejected)
+        QMessageBox.information(self, "Import Changes", message)
+
     def populate_table(self, data=None, table=None, main_data_list=None):
         """
         Populates the table with provided staff data.
@@ -197,38 +834,296 @@ class StaffManagementApp(QMainWindow):
 
         # Check if specific data is provided, otherwise fetch all staff data from the database
         if data is None:
-            data = self.db_manager.fetch_all("SELECT * FROM staff WHERE deleted_at is NULL")
-            self.main_data_list = data  # Store main table data
+            data = self.db_manager.fetch_all(f"SELECT {STAFF_COLUMNS} FROM staff WHERE {self.view_filter}",
+                                             self.view_parameters)
+            self.load_footer()
+        else:
+            # Rows such as search results need not match the view filter, so total what is shown
+            data = list(data)
+            self.load_footer(data)
+
+        # Store main table data in the same order as the table rows
+        self.main_data_list = list(data)
+        self.row_index = {}
 
         # Iterate through the data and populate the table rows
-        for row_num, (id, name, mobile, email, role, salary, joining_date, address, remark, deleted_at) in enumerate(data):
+        for row_num, record in enumerate(data):
             self.table.insertRow(row_num)
-            self.table.setItem(row_num, 0, QTableWidgetItem(str(id)))
-            self.table.setItem(row_num, 1, QTableWidgetItem(name))
-            self.table.setItem(row_num, 2, QTableWidgetItem(mobile))
-            self.table.setItem(row_num, 3, QTableWidgetItem(email))
-            self.table.setItem(row_num, 4, QTableWidgetItem(role))
-            self.table.setItem(row_num, 5, QTableWidgetItem(str(salary)))
-            self.table.setItem(row_num, 6, QTableWidgetItem(joining_date))
-            self.table.setItem(row_num, 7, QTableWidgetItem(address))
-            self.table.setItem(row_num, 8, QTableWidgetItem(remark))
+            self.set_table_row(row_num, record)
+            self.row_index[record[0]] = row_num
 
             if main_data_list is not None:
-                main_data_list.append((id, name, mobile, email, role, salary, joining_date, address, remark))
+                main_data_list.append(record[:9])
+
+        self.thumbnail_timer.start()
+
+    def set_table_row(self, row_num, record):
+        id, name, mobile, email, role, salary, joining_date, address, remark, deleted_at = record
+        self.table.setItem(row_num, 0, QTableWidgetItem(str(id)))
+        self.table.setItem(row_num, 1, QTableWidgetItem(name))
+        self.table.setItem(row_num, 2, QTableWidgetItem(mobile))
+        self.table.setItem(row_num, 3, QTableWidgetItem(email))
+        self.table.setItem(row_num, 4, QTableWidgetItem(role))
+        self.table.setItem(row_num, 5, QTableWidgetItem(str(salary)))
+        self.table.setItem(row_num, 6, QTableWidgetItem(joining_date))
+        self.table.setItem(row_num, 7, QTableWidgetItem(address))
+        self.table.setItem(row_num, 8, QTableWidgetItem(remark))
+
+    def load_visible_thumbnails(self):
+        """
+        Shows photos for the rows in view, from the cache where possible and from a background thread otherwise.
+        """
+        if self.thumbnail_worker is not None and self.thumbnail_worker.isRunning():
+            # Load the rows then in view once the current batch is done
+            self.thumbnails_pending = True
+            return
+
+        first_row = self.table.rowAt(0)
+        last_row = self.table.rowAt(self.table.viewport().height() - 1)
+        if first_row < 0:
+            return
+        if last_row < 0:
+            last_row = self.table.rowCount() - 1
+
+        self.thumbnail_requests = {}
+        photos = self.documents.photos_for([self.main_data_list[row_num][0]
+                                            for row_num in range(first_row, last_row + 1)])
+        for staff_id, blob_id in photos.items():
+            pixmap = QPixmapCache.find(f"staff-thumbnail-{blob_id}")
+            if pixmap is not None:
+                self.set_avatar(staff_id, pixmap)
+            else:
+                self.thumbnail_requests.setdefault(blob_id, []).append(staff_id)
+
+        if self.thumbnail_requests:
+            # The worker reads with its own connection, so it must see every held back write
+            self.db_manager.flush()
+            self.thumbnail_worker = ThumbnailWorker(self.db_manager.database_path, list(self.thumbnail_requests))
+            self.thumbnail_worker.thumbnail_ready.connect(self.show_thumbnail)
+            self.thumbnail_worker.finished.connect(self.thumbnail_worker_finished)
+            self.thumbnail_worker.start()
+
+    def thumbnail_worker_finished(self):
+        if self.thumbnails_pending:
+            self.thumbnails_pending = False
+            self.thumbnail_timer.start()
+
+    def show_thumbnail(self, blob_id, image):
+        pixmap = QPixmap.fromImage(image)
+        QPixmapCache.insert(f"staff-thumbnail-{blob_id}", pixmap)
+        for staff_id in self.thumbnail_requests.get(blob_id, []):
+            self.set_avatar(staff_id, pixmap)
+
+    def set_avatar(self, staff_id, pixmap):
+        row_num = self.row_index.get(staff_id)
+        if row_num is not None and self.table.item(row_num, 1) is not None:
+            self.table.item(row_num, 1).setIcon(QIcon(pixmap))
+
+    def manage_documents(self):
+        row_num = self.table.currentRow()
+        if row_num < 0:
+            QMessageBox.warning(self, "Staff Documents", "Please select a staff member.")
+            return
+
+        staff_id = self.main_data_list[row_num][0]
+        dialog = DocumentsDialog(self.documents, staff_id, self.main_data_list[row_num][1])
+        dialog.exec()
+
+        # Drop the old avatar in case the photo was removed, then show the current one
+        self.set_avatar(staff_id, QPixmap())
+        self.thumbnail_timer.start()
+
+    def load_footer(self, data=None):
+        """
+        Totals the given rows, or else the rows in the view with one SQL aggregate over the same filter as the table.
+        """
+        if data is not None:
+            self.footer_count, self.footer_salary_total = len(data), sum(salary_value(record) for record in data)
+        else:
+            self.footer_count, self.footer_salary_total = self.db_manager.fetch_all(
+                f"SELECT count(*), total(salary) FROM staff WHERE {self.view_filter}", self.view_parameters)[0]
+        self.show_footer()
+
+    def show_footer(self):
+        average_salary = self.footer_salary_total / self.footer_count if self.footer_count else 0
+        self.footer_label.setText(f"Headcount: {self.footer_count}    "
+                                  f"Total salary: {self.footer_salary_total:,.2f}    "
+                                  f"Average salary: {average_salary:,.2f}")
+
+    def update_table_rows(self, rows):
+        """
+        Updates only the table rows for the given (staff_id, record) pairs instead of reloading the whole table.
+        A record that is None or no longer matches the view filter removes its row.
+        """
+        visible = self.visible_ids([staff_id for staff_id, record in rows if record is not None])
+
+        removed_rows = []
+        for staff_id, record in rows:
+            row_num = self.row_index.get(staff_id)
+
+            # Adjust the footer by the difference instead of adding everything up again
+            if row_num is not None:
+                self.footer_count -= 1
+                self.footer_salary_total -= salary_value(self.main_data_list[row_num])
+            if staff_id in visible:
+                self.footer_count += 1
+                self.footer_salary_total += salary_value(record)
+
+            if staff_id not in visible:
+                if row_num is not None:
+                    removed_rows.append(row_num)
+            elif row_num is None:
+                row_num = self.table.rowCount()
+                self.table.insertRow(row_num)
+                self.set_table_row(row_num, record)
+                self.row_index[staff_id] = row_num
+                self.main_data_list.append(record)
+            else:
+                self.set_table_row(row_num, record)
+                self.main_data_list[row_num] = record
+        self.show_footer()
+
+        # Remove from the bottom up so the remaining row numbers stay valid
+        if removed_rows:
+            for row_num in sorted(removed_rows, reverse=True):
+                self.table.removeRow(row_num)
+                del self.main_data_list[row_num]
+            self.row_index = {record[0]: row_num for row_num, record in enumerate(self.main_data_list)}
+        self.thumbnail_timer.start()
+
+
+def role_completer(roles):
+    # Suggests existing roles as the user types, ignoring case
+    completer = QCompleter(roles.names())
+    completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+    completer.setFilterMode(Qt.MatchFlag.MatchContains)
+    return completer
+
+
+def salary_value(record):
+    # Salary as SQL total() would count it
+    try:
+        return float(record[5] or 0)
+    except ValueError:
+        return 0.0
+
+
+class BackupWorker(QThread):
+    """
+    Writes a database snapshot from a background thread so the window stays responsive.
+    """
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, backup_manager):
+        super().__init__()
+        self.backup_manager = backup_manager
+
+    def run(self):
+        try:
+            backup_path = self.backup_manager.snapshot(progress=self.progress.emit)
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        self.completed.emit(backup_path)
+
+
+class ReportWorker(QThread):
+    """
+    Generates a report from a background thread, converting it to PDF when asked.
+    """
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, database_path, report_name, report_format):
+        super().__init__()
+        self.database_path = database_path
+        self.report_name = report_name
+        self.report_format = report_format
+
+    def run(self):
+        try:
+            report_path = ReportGenerator(self.database_path).generate(self.report_name, progress=self.progress.emit)
+
+            if self.report_format == "PDF":
+                document = QTextDocument()
+                with open(report_path, encoding="utf-8") as report_file:
+                    document.setHtml(report_file.read())
+                pdf_path = os.path.splitext(report_path)[0] + ".pdf"
+                document.print(QPdfWriter(pdf_path))
+                os.remove(report_path)
+                report_path = pdf_path
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        self.completed.emit(report_path)
+
+
+class ThumbnailWorker(QThread):
+    """
+    Reads staff photos on its own connection and scales them down to thumbnails.
+    QImage is safe to use off the GUI thread; the GUI thread turns each one into a pixmap.
+    """
+    thumbnail_ready = pyqtSignal(int, QImage)
+
+    def __init__(self, database_path, blob_ids):
+        super().__init__()
+        self.database_path = database_path
+        self.blob_ids = blob_ids
+
+    def run(self):
+        connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        try:
+            for blob_id in self.blob_ids:
+                image = QImage.fromData(b"".join(read_blob(connection, blob_id)))
+                if not image.isNull():
+                    self.thumbnail_ready.emit(blob_id, image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                                                                    Qt.AspectRatioMode.KeepAspectRatio,
+                                                                    Qt.TransformationMode.SmoothTransformation))
+        finally:
+            connection.close()
+
+
+class PayrollWorker(QThread):
+    """
+    Runs payroll from a background thread on its own database connection.
+    """
+    completed = pyqtSignal(str, int, float, float, float, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, database_path, period):
+        super().__init__()
+        self.database_path = database_path
+        self.period = period
+
+    def run(self):
+        db_manager = DatabaseManager(self.database_path)
+        payroll = PayrollEngine(db_manager)
+        try:
+            totals = payroll.run(self.period)
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        finally:
+            db_manager.close()
+        self.completed.emit(self.period, *totals, payroll.skipped)
 
 
 class AddStaffDialog(QDialog):
     """
        Opens a dialog to add new staff member to the database.
        """
-    def __init__(self, db_manager, populate_table_callback):
+    def __init__(self, db_manager, history, hierarchy, roles):
         super().__init__()
 
         self.db_manager = db_manager
-        self.populate_table = populate_table_callback
+        self.history = history
+        self.hierarchy = hierarchy
 
         self.setWindowTitle("Add New Staff Details")
-        self.setFixedSize(400, 500)
+        self.setFixedSize(400, 560)
 
         add_staff_layout = QVBoxLayout()
 
@@ -243,6 +1138,7 @@ class AddStaffDialog(QDialog):
 
         self.role_label = QLabel("Job Role:")
         self.role_input = QLineEdit()
+        self.role_input.setCompleter(role_completer(roles))
 
         self.salary_label = QLabel("Salary:")
         self.salary_input = QLineEdit()
@@ -259,6 +1155,9 @@ class AddStaffDialog(QDialog):
         self.remark_label = QLabel("Remark:")
         self.remark_input = QLineEdit()
 
+        self.manager_label = QLabel("Reports To (Manager ID):")
+        self.manager_input = QLineEdit()
+
         submit_button = QPushButton("Submit")
         submit_button.clicked.connect(self.add_new_staff)
 
@@ -278,31 +1177,20 @@ class AddStaffDialog(QDialog):
         add_staff_layout.addWidget(self.address_input)
         add_staff_layout.addWidget(self.remark_label)
         add_staff_layout.addWidget(self.remark_input)
+        add_staff_layout.addWidget(self.manager_label)
+        add_staff_layout.addWidget(self.manager_input)
         add_staff_layout.addWidget(submit_button)
 
         self.setLayout(add_staff_layout)
 
     def validate_mobile(self, mobile_text):
-        if not mobile_text.isdigit() or len(mobile_text) != 10:
-            return None
-        return mobile_text
+        return validate_mobile(mobile_text)
 
     def validate_email(self, email_text):
-        # Use a basic regular expression for email validation
-        import re
-        pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4}$"
-        if not re.match(pattern, email_text):
-            return None
-        return email_text
+        return validate_email(email_text)
 
     def validate_salary(self, salary_text):
-        try:
-            salary = float(salary_text)
-            if salary <= 0:
-                raise ValueError("Salary must be a positive number")
-            return salary
-        except ValueError:
-            return None
+        return validate_salary(salary_text)
 
     def add_new_staff(self):
         """
@@ -338,13 +1226,26 @@ class AddStaffDialog(QDialog):
             QMessageBox.critical(self, "Input Error", "Invalid salary input. Please enter a valid positive number.")
             return
 
-        self.db_manager.execute(
-            "INSERT INTO staff (name, mobile, email, role, salary, joining_date, address, remark, deleted_at) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
-            (name, mobile, email, role, salary, joining_date, address, remark)
-        )
-        self.db_manager.connection.commit()
-        self.populate_table()  # Update the table in the main window
+        # Validate manager ID input (optional)
+        manager_id = self.manager_input.text().strip()
+        if manager_id and not manager_id.isdigit():
+            QMessageBox.critical(self, "Input Error", "Invalid manager ID. Please enter a staff ID or leave it empty.")
+            return
+
+        try:
+            check_unique(self.db_manager, mobile, email)
+            with self.history.track("Add Staff") as change:
+                self.db_manager.execute(
+                    "INSERT INTO staff (name, mobile, email, role, salary, joining_date, address, remark, deleted_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                    (name, mobile, email, role, salary, joining_date, address, remark)
+                )
+                change.staff_ids.append(self.db_manager.cursor.lastrowid)
+                if manager_id:
+                    self.hierarchy.set_manager(change.staff_ids[-1], int(manager_id))
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return
         self.accept()
 
 
@@ -352,15 +1253,18 @@ class EditStaffDialog(QDialog):
     """
     Opens a dialog to edit staff member's details in the database.
     """
-    def __init__(self, db_manager, populate_table_callback):
+    def __init__(self, db_manager, history, salary_history, hierarchy, roles, versions):
         super().__init__()
 
         self.db_manager = db_manager
-        self.populate_table = populate_table_callback
+        self.history = history
+        self.salary_history = salary_history
+        self.hierarchy = hierarchy
+        self.versions = versions
 
         # Set the title and fixed size of the dialog
         self.setWindowTitle("Update the Staff Records")
-        self.setFixedSize(400, 500)
+        self.setFixedSize(400, 740)
 
         # Create a layout for the dialog
         edit_staff_layout = QVBoxLayout()
@@ -371,55 +1275,64 @@ class EditStaffDialog(QDialog):
         # Get the selected id
         self.staff_id = window.table.item(index, 0).text()
 
-        # Get the current selected staff name
-        selected_name = window.table.item(index, 1).text()
-        self.name = QLineEdit(selected_name)
+        self.name = QLineEdit()
         self.name.setPlaceholderText("Name")
         edit_staff_layout.addWidget(self.name)
 
-        # Get the current selected staff mobile number
-        selected_mobile = window.table.item(index, 2).text()
-        self.mobile = QLineEdit(selected_mobile)
+        self.mobile = QLineEdit()
         self.mobile.setPlaceholderText("Mobile No.")
         edit_staff_layout.addWidget(self.mobile)
 
-        # Get the current selected staff email
-        selected_email = window.table.item(index, 3).text()
-        self.email = QLineEdit(selected_email)
+        self.email = QLineEdit()
         self.email.setPlaceholderText("Email ID")
         edit_staff_layout.addWidget(self.email)
 
-        # Get the current selected staff job role
-        selected_role = window.table.item(index, 4).text()
-        self.role = QLineEdit(selected_role)
+        self.role = QLineEdit()
         self.role.setPlaceholderText("Job Role")
+        self.role.setCompleter(role_completer(roles))
         edit_staff_layout.addWidget(self.role)
 
-        # Get the current selected staff salary
-        selected_salary = window.table.item(index, 5).text()
-        self.salary = QLineEdit(selected_salary)
+        self.salary = QLineEdit()
         self.salary.setPlaceholderText("Salary")
         edit_staff_layout.addWidget(self.salary)
 
-        # Get the current selected staff joining date
-        selected_joining_date = window.table.item(index, 6).text()
-        qdate = QDate.fromString(selected_joining_date, "dd-MM-yyyy")
-        self.joining_date = QDateEdit(qdate)
+        self.joining_date = QDateEdit()
         self.joining_date.setCalendarPopup(True)
         edit_staff_layout.addWidget(self.joining_date)
 
-        # Get the current selected staff address
-        selected_address = window.table.item(index, 7).text()
-        self.address = QLineEdit(selected_address)
+        self.address = QLineEdit()
         self.address.setPlaceholderText("Address")
         edit_staff_layout.addWidget(self.address)
 
-        # Get the current selected staff remark
-        selected_remark = window.table.item(index, 8).text()
-        self.remark = QLineEdit(selected_remark)
+        self.remark = QLineEdit()
         self.remark.setPlaceholderText("Remark")
         edit_staff_layout.addWidget(self.remark)
 
+        # Fill in the record as it is in the database, since the main table may be out of date,
+        # and remember its version so the update can tell whether someone else changed it meanwhile
+        record, self.version = self.versions.fetch(int(self.staff_id))
+        self.fill_fields(record)
+
+        # Get the current manager of the selected staff
+        selected_manager = self.hierarchy.manager_of(int(self.staff_id))
+        self.manager = QLineEdit("" if selected_manager is None else str(selected_manager))
+        self.manager.setPlaceholderText("Reports To (Manager ID)")
+        edit_staff_layout.addWidget(self.manager)
+
+        # Show the salary history of the selected staff member
+        edit_staff_layout.addWidget(QLabel("Salary History:"))
+        self.salary_history_table = QTableWidget()
+        self.salary_history_table.verticalHeader().setVisible(False)
+        self.salary_history_table.setColumnCount(3)
+        self.salary_history_table.setHorizontalHeaderLabels(["Valid From", "Valid To", "Salary"])
+        self.salary_history_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        for row_num, (valid_from, valid_to, salary) in enumerate(self.salary_history.history_for(int(self.staff_id))):
+            self.salary_history_table.insertRow(row_num)
+            self.salary_history_table.setItem(row_num, 0, QTableWidgetItem(valid_from))
+            self.salary_history_table.setItem(row_num, 1, QTableWidgetItem(valid_to or "Current"))
+            self.salary_history_table.setItem(row_num, 2, QTableWidgetItem(str(salary)))
+        edit_staff_layout.addWidget(self.salary_history_table)
+
         # Create an "Update" button and connect it to the update_staff_records method
         update_button = QPushButton("Update")
         update_button.clicked.connect(self.update_staff_records)
@@ -428,27 +1341,25 @@ class EditStaffDialog(QDialog):
         # Set the layout for the dialog
         self.setLayout(edit_staff_layout)
 
+    def fill_fields(self, record):
+        id, name, mobile, email, role, salary, joining_date, address, remark, deleted_at = record
+        self.name.setText(name)
+        self.mobile.setText(mobile)
+        self.email.setText(email)
+        self.role.setText(role)
+        self.salary.setText(str(salary))
+        self.joining_date.setDate(QDate.fromString(joining_date or "", "dd-MM-yyyy"))
+        self.address.setText(address)
+        self.remark.setText(remark)
+
     def validate_mobile(self, mobile_text):
-        if not mobile_text.isdigit() or len(mobile_text) != 10:
-            return None
-        return mobile_text
+        return validate_mobile(mobile_text)
 
     def validate_email(self, email_text):
-        # Use a basic regular expression for email validation
-        import re
-        pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4}$"
-        if not re.match(pattern, email_text):
-            return None
-        return email_text
+        return validate_email(email_text)
 
     def validate_salary(self, salary_text):
-        try:
-            salary = float(salary_text)
-            if salary <= 0:  # Corrected condition here
-                raise ValueError("Salary must be a positive number")
-            return salary
-        except ValueError:
-            return None
+        return validate_salary(salary_text)
 
     def update_staff_records(self):
         """
@@ -475,23 +1386,703 @@ class EditStaffDialog(QDialog):
             QMessageBox.critical(self, "Input Error", "Invalid salary input. Please enter a valid positive number.")
             return
 
-        self.db_manager.execute(
-            "UPDATE staff SET name = ?, mobile = ?, email = ?, role = ?, salary = ?, joining_date = ?, address = ?, "
-            "remark = ? Where id = ?",
-            (self.name.text(), self.mobile.text(), self.email.text(), self.role.text(), self.salary.text(),
-             self.joining_date.date().toString("dd-MM-yyyy"), self.address.text(), self.remark.text(), self.staff_id)
-        )
-        self.db_manager.connection.commit()
-        self.populate_table()
+        # Validate manager ID input (optional)
+        manager_id = self.manager.text().strip()
+        if manager_id and not manager_id.isdigit():
+            QMessageBox.critical(self, "Input Error", "Invalid manager ID. Please enter a staff ID or leave it empty.")
+            return
+
+        try:
+            check_unique(self.db_manager, mobile, email, int(self.staff_id))
+            with self.history.track("Edit Staff", [int(self.staff_id)]):
+                # Only writes if nobody has changed the record since this dialog read it
+                self.versions.update(int(self.staff_id), self.version, {
+                    "name": self.name.text(), "mobile": self.mobile.text(), "email": self.email.text(),
+                    "role": self.role.text(), "salary": self.salary.text(),
+                    "joining_date": self.joining_date.date().toString("dd-MM-yyyy"),
+                    "address": self.address.text(), "remark": self.remark.text(),
+                })
+                self.hierarchy.set_manager(int(self.staff_id), int(manager_id) if manager_id else None)
+        except EditConflict as conflict:
+            QMessageBox.warning(self, "Edit Conflict", str(conflict))
+            if conflict.current is None or conflict.current[9] is not None:
+                self.reject()
+                return
+            self.fill_fields(conflict.current)
+            self.version = conflict.version
+            return
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return
+        self.accept()
+
+
+class BulkEditDialog(QDialog):
+    """
+    Makes the same change to many staff records at once: the selected rows or every row in the table.
+    The whole change is one update and can be undone in one step.
+    """
+    def __init__(self, bulk_editor, history, selected_ids, shown_ids):
+        super().__init__()
+
+        self.bulk_editor = bulk_editor
+        self.history = history
+
+        self.setWindowTitle("Bulk Edit Staff")
+        self.setFixedSize(400, 250)
+
+        bulk_edit_layout = QVBoxLayout()
+
+        # Each choice of staff, with the ids it covers
+        self.scope = QComboBox()
+        if selected_ids:
+            self.scope.addItem(f"Selected staff ({len(selected_ids)})", selected_ids)
+        self.scope.addItem(f"All staff in the table ({len(shown_ids)})", shown_ids)
+        self.scope.currentIndexChanged.connect(self.show_preview)
+
+        self.operation = QComboBox()
+        self.operation.addItems(BULK_OPERATIONS)
+        self.operation.currentIndexChanged.connect(self.show_preview)
+
+        self.value = QLineEdit()
+        self.value.textChanged.connect(self.show_preview)
+
+        self.preview_label = QLabel()
+
+        apply_button = QPushButton("Apply")
+        apply_button.clicked.connect(self.apply_change)
+
+        bulk_edit_layout.addWidget(QLabel("Apply to:"))
+        bulk_edit_layout.addWidget(self.scope)
+        bulk_edit_layout.addWidget(QLabel("Change:"))
+        bulk_edit_layout.addWidget(self.operation)
+        bulk_edit_layout.addWidget(self.value)
+        bulk_edit_layout.addWidget(self.preview_label)
+        bulk_edit_layout.addWidget(apply_button)
+
+        self.setLayout(bulk_edit_layout)
+        self.show_preview()
+
+    def show_preview(self):
+        # Placeholder hints follow the chosen change
+        operation = self.operation.currentText()
+        if operation == "Set Joining Date":
+            self.value.setPlaceholderText("dd-MM-yyyy")
+        elif operation == CHANGE_SALARY:
+            self.value.setPlaceholderText("e.g. 5 for a 5% raise, -2.5 for a cut")
+        else:
+            self.value.setPlaceholderText("")
+
+        try:
+            count = self.bulk_editor.preview(self.scope.currentData(), operation, self.value.text())
+        except ValueError as error:
+            self.preview_label.setText(str(error) if self.value.text().strip() else "")
+            return
+        self.preview_label.setText(f"{count} staff record(s) will be updated.")
+
+    def apply_change(self):
+        staff_ids = self.scope.currentData()
+        operation = self.operation.currentText()
+        try:
+            count = self.bulk_editor.preview(staff_ids, operation, self.value.text())
+            if count == 0:
+                QMessageBox.information(self, "Bulk Edit", "None of these staff records would change.")
+                return
+
+            confirmation = QMessageBox.question(self, "Confirmation", f"Update {count} staff record(s)?",
+                                                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirmation != QMessageBox.StandardButton.Yes:
+                return
+
+            # The grid is refreshed row by row from the changes the history records
+            with self.history.track("Bulk Edit", staff_ids):
+                self.bulk_editor.apply(staff_ids, operation, self.value.text())
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return
         self.accept()
 
 
+class AttendanceDialog(QDialog):
+    """
+    Shows who clocked in on a day, or the attendance totals for a month.
+    """
+    def __init__(self, attendance):
+        super().__init__()
+
+        self.attendance = attendance
+
+        self.setWindowTitle("Attendance Summary")
+        self.setFixedSize(600, 400)
+
+        attendance_layout = QVBoxLayout()
+
+        self.period = QComboBox()
+        self.period.addItems(["Daily", "Monthly"])
+        self.period.currentIndexChanged.connect(self.show_summary)
+
+        self.day = QDateEdit(QDate.currentDate())
+        self.day.setCalendarPopup(True)
+        self.day.dateChanged.connect(self.show_summary)
+
+        self.summary_table = QTableWidget()
+        self.summary_table.verticalHeader().setVisible(False)
+        self.summary_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        period_layout = QHBoxLayout()
+        period_layout.addWidget(self.period)
+        period_layout.addWidget(self.day)
+
+        attendance_layout.addLayout(period_layout)
+        attendance_layout.addWidget(self.summary_table)
+
+        self.setLayout(attendance_layout)
+        self.show_summary()
+
+    def show_summary(self):
+        if self.period.currentText() == "Daily":
+            headers = ["ID", "Name", "First In", "Last Out", "Events"]
+            data = self.attendance.daily_summary(self.day.date().toString("yyyy-MM-dd"))
+        else:
+            headers = ["ID", "Name", "Days Present", "Clock Ins", "Clock Outs"]
+            data = self.attendance.monthly_rollup(self.day.date().toString("yyyy-MM"))
+
+        self.summary_table.setRowCount(0)
+        self.summary_table.setColumnCount(len(headers))
+        self.summary_table.setHorizontalHeaderLabels(headers)
+        for row_num, row_data in enumerate(data):
+            self.summary_table.insertRow(row_num)
+            for col_num, value in enumerate(row_data):
+                self.summary_table.setItem(row_num, col_num, QTableWidgetItem("" if value is None else str(value)))
+
+
+class LeaveCalendarDialog(QDialog):
+    """
+    Shows a month of leave and holidays at a time, who is away on the selected day,
+    and records leave for the selected staff member or a company holiday.
+    """
+    def __init__(self, leave, staff):
+        super().__init__()
+
+        self.leave = leave
+        self.staff = staff  # (id, name) of the staff member selected in the main table, or None
+        self.month_leave = []
+        self.highlighted_dates = []
+
+        self.setWindowTitle("Leave Calendar")
+        self.setFixedSize(700, 600)
+
+        leave_layout = QVBoxLayout()
+
+        self.calendar = QCalendarWidget()
+        self.calendar.currentPageChanged.connect(self.load_month)
+        self.calendar.selectionChanged.connect(self.show_day)
+
+        self.day_table = QTableWidget()
+        self.day_table.verticalHeader().setVisible(False)
+        self.day_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.day_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.day_table.setColumnCount(5)
+        self.day_table.setHorizontalHeaderLabels(["Name", "From", "To", "Kind", "Note"])
+
+        self.start_date = QDateEdit(QDate.currentDate())
+        self.start_date.setCalendarPopup(True)
+        self.end_date = QDateEdit(QDate.currentDate())
+        self.end_date.setCalendarPopup(True)
+        self.kind = QComboBox()
+        self.kind.addItems(LEAVE_KINDS + [HOLIDAY])
+        self.note = QLineEdit()
+        self.note.setPlaceholderText("Note")
+
+        add_button = QPushButton(f"Add Leave for {staff[1]}" if staff else "Add Holiday")
+        add_button.clicked.connect(self.add_leave)
+        remove_button = QPushButton("Remove Selected")
+        remove_button.clicked.connect(self.remove_leave)
+        for button in (add_button, remove_button):
+            button.setEnabled(not leave.db_manager.read_only)
+        if not staff:
+            self.kind.setCurrentText(HOLIDAY)
+            self.kind.setEnabled(False)
+
+        add_layout = QHBoxLayout()
+        add_layout.addWidget(self.start_date)
+        add_layout.addWidget(self.end_date)
+        add_layout.addWidget(self.kind)
+        add_layout.addWidget(self.note)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(add_button)
+        button_layout.addWidget(remove_button)
+
+        leave_layout.addWidget(self.calendar)
+        leave_layout.addWidget(self.day_table)
+        leave_layout.addLayout(add_layout)
+        leave_layout.addLayout(button_layout)
+
+        self.setLayout(leave_layout)
+        self.load_month(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def load_month(self, year, month):
+        """
+        Loads only the leave overlapping the month on screen, and marks the days someone is away.
+        """
+        self.month_leave = self.leave.month(year, month)
+
+        for qdate in self.highlighted_dates:
+            self.calendar.setDateTextFormat(qdate, QTextCharFormat())
+        self.highlighted_dates = []
+
+        away_format = QTextCharFormat()
+        away_format.setBackground(QColor("#ffe0b2"))
+        holiday_format = QTextCharFormat()
+        holiday_format.setBackground(QColor("#c8e6c9"))
+
+        first_day = QDate(year, month, 1)
+        last_day = first_day.addDays(first_day.daysInMonth() - 1)
+        for leave_id, staff_id, name, start_date, end_date, kind, note in self.month_leave:
+            qdate = max(QDate.fromString(start_date, "yyyy-MM-dd"), first_day)
+            while qdate <= min(QDate.fromString(end_date, "yyyy-MM-dd"), last_day):
+                # Holidays take precedence over individual leave
+                if staff_id is None or self.calendar.dateTextFormat(qdate) != holiday_format:
+                    self.calendar.setDateTextFormat(qdate, holiday_format if staff_id is None else away_format)
+                self.highlighted_dates.append(qdate)
+                qdate = qdate.addDays(1)
+        self.show_day()
+
+    def show_day(self):
+        day = self.calendar.selectedDate().toString("yyyy-MM-dd")
+        self.day_leave = [row for row in self.month_leave if row[3] <= day <= row[4]]
+
+        self.day_table.setRowCount(0)
+        for row_num, (leave_id, staff_id, name, start_date, end_date, kind, note) in enumerate(self.day_leave):
+            self.day_table.insertRow(row_num)
+            # Leave of archived or removed staff has a staff id but no staff record to name
+            who = "Everyone" if staff_id is None else name or "(removed)"
+            values = [who, QDate.fromString(start_date, "yyyy-MM-dd").toString("dd-MM-yyyy"),
+                      QDate.fromString(end_date, "yyyy-MM-dd").toString("dd-MM-yyyy"), kind, note or ""]
+            for col_num, value in enumerate(values):
+                self.day_table.setItem(row_num, col_num, QTableWidgetItem(value))
+
+    def add_leave(self):
+        holiday = self.kind.currentText() == HOLIDAY
+        try:
+            self.leave.add(None if holiday else self.staff[0], self.start_date.date().toPyDate(),
+                           self.end_date.date().toPyDate(), self.kind.currentText(), self.note.text())
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return
+        self.note.clear()
+        self.load_month(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def remove_leave(self):
+        row_num = self.day_table.currentRow()
+        if row_num < 0:
+            return
+        self.leave.remove(self.day_leave[row_num][0])
+        self.load_month(self.calendar.yearShown(), self.calendar.monthShown())
+
+
+class PayrollAsOfDialog(QDialog):
+    """
+    Shows the headcount and total salary that was in effect on a chosen date.
+    """
+    def __init__(self, salary_history):
+        super().__init__()
+
+        self.salary_history = salary_history
+
+        self.setWindowTitle("Payroll As Of Date")
+        self.setFixedSize(300, 150)
+
+        payroll_layout = QVBoxLayout()
+
+        self.as_of_date = QDateEdit(QDate.currentDate())
+        self.as_of_date.setCalendarPopup(True)
+        self.as_of_date.dateChanged.connect(self.show_payroll)
+
+        self.result_label = QLabel()
+
+        payroll_layout.addWidget(QLabel("Payroll as of:"))
+        payroll_layout.addWidget(self.as_of_date)
+        payroll_layout.addWidget(self.result_label)
+
+        self.setLayout(payroll_layout)
+        self.show_payroll()
+
+    def show_payroll(self):
+        headcount, total_salary = self.salary_history.payroll_as_of(self.as_of_date.date().toString("yyyy-MM-dd"))
+        self.result_label.setText(f"Staff on payroll: {headcount}\nTotal salary: {total_salary:,.2f}")
+
+
+class DuplicatesDialog(QDialog):
+    """
+    Lists groups of staff records that look like the same person and merges each group into one record.
+    """
+    def __init__(self, deduplicator, update_rows_callback):
+        super().__init__()
+
+        self.deduplicator = deduplicator
+        self.update_rows = update_rows_callback
+
+        self.setWindowTitle("Duplicate Staff Records")
+        self.setFixedSize(800, 500)
+
+        duplicates_layout = QVBoxLayout()
+
+        self.duplicates_tree = QTreeWidget()
+        self.duplicates_tree.setHeaderLabels(["ID", "Name", "Mobile", "Email", "Role", "Joining Date"])
+
+        merge_button = QPushButton("Merge Group Into Selected")
+        merge_button.clicked.connect(self.merge_selected)
+        merge_all_button = QPushButton("Merge All Into Oldest")
+        merge_all_button.clicked.connect(self.merge_all)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(merge_button)
+        button_layout.addWidget(merge_all_button)
+
+        duplicates_layout.addWidget(QLabel("Select the record to keep in a group, then merge. Merging cannot be undone."))
+        duplicates_layout.addWidget(self.duplicates_tree)
+        duplicates_layout.addLayout(button_layout)
+
+        self.setLayout(duplicates_layout)
+        self.load_duplicates()
+
+    def load_duplicates(self):
+        self.duplicates_tree.clear()
+        for matched_on, rows in self.deduplicator.find_duplicates():
+            group_item = QTreeWidgetItem([f"Matched on {', '.join(matched_on)}"])
+            group_item.setFirstColumnSpanned(True)
+            self.duplicates_tree.addTopLevelItem(group_item)
+            for id, name, mobile, email, role, salary, joining_date, address, remark, deleted_at in rows:
+                item = QTreeWidgetItem([str(id), name or "", mobile or "", email or "", role or "", joining_date or ""])
+                item.setData(0, Qt.ItemDataRole.UserRole, id)
+                group_item.addChild(item)
+            group_item.setExpanded(True)
+
+    def merge_group(self, group_item, keep_id):
+        staff_ids = [group_item.child(index).data(0, Qt.ItemDataRole.UserRole)
+                     for index in range(group_item.childCount())]
+        self.update_rows(self.deduplicator.merge(keep_id, staff_ids))
+
+    def merge_selected(self):
+        item = self.duplicates_tree.currentItem()
+        if item is None or item.parent() is None:
+            QMessageBox.warning(self, "Merge", "Please select the staff record to keep.")
+            return
+
+        try:
+            self.merge_group(item.parent(), item.data(0, Qt.ItemDataRole.UserRole))
+        except ValueError as error:
+            QMessageBox.warning(self, "Merge", str(error))
+            return
+        self.load_duplicates()
+
+    def merge_all(self):
+        confirmation = QMessageBox.question(self, "Confirmation",
+                                            "Merge every group into its oldest record? This cannot be undone.",
+                                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirmation != QMessageBox.StandardButton.Yes:
+            return
+
+        # Groups that cannot be merged are skipped and listed afterwards
+        errors = []
+        for index in range(self.duplicates_tree.topLevelItemCount()):
+            group_item = self.duplicates_tree.topLevelItem(index)
+            try:
+                self.merge_group(group_item, group_item.child(0).data(0, Qt.ItemDataRole.UserRole))
+            except ValueError as error:
+                errors.append(str(error))
+        self.load_duplicates()
+        if errors:
+            QMessageBox.warning(self, "Merge", "\n".join(errors))
+
+
+class QueryBuilderDialog(QDialog):
+    """
+    Builds a staff filter from conditions in numbered groups, and saves, counts and applies it.
+    """
+    def __init__(self, query_builder, apply_filter_callback):
+        super().__init__()
+
+        self.query_builder = query_builder
+        self.apply_filter = apply_filter_callback
+
+        self.setWindowTitle("Filter Staff")
+        self.setFixedSize(700, 450)
+
+        filter_layout = QVBoxLayout()
+
+        self.saved_filters = QComboBox()
+        self.saved_filters.addItems([""] + self.query_builder.saved_filters())
+        self.saved_filters.currentTextChanged.connect(self.load_saved_filter)
+        delete_saved_button = QPushButton("Delete Saved Filter")
+        delete_saved_button.clicked.connect(self.delete_saved_filter)
+
+        saved_layout = QHBoxLayout()
+        saved_layout.addWidget(QLabel("Saved filter:"))
+        saved_layout.addWidget(self.saved_filters)
+        saved_layout.addWidget(delete_saved_button)
+
+        self.group_match = QComboBox()
+        self.group_match.addItems(["all", "any"])
+        self.condition_match = QComboBox()
+        self.condition_match.addItems(["all", "any"])
+
+        match_layout = QHBoxLayout()
+        match_layout.addWidget(QLabel("Match"))
+        match_layout.addWidget(self.group_match)
+        match_layout.addWidget(QLabel("groups; within a group match"))
+        match_layout.addWidget(self.condition_match)
+        match_layout.addWidget(QLabel("conditions"))
+
+        self.conditions_table = QTableWidget()
+        self.conditions_table.verticalHeader().setVisible(False)
+        self.conditions_table.setColumnCount(4)
+        self.conditions_table.setHorizontalHeaderLabels(["Group", "Field", "Operator", "Value"])
+        self.conditions_table.horizontalHeader().setStretchLastSection(True)
+
+        add_condition_button = QPushButton("Add Condition")
+        add_condition_button.clicked.connect(lambda: self.add_condition())
+        remove_condition_button = QPushButton("Remove Condition")
+        remove_condition_button.clicked.connect(self.remove_condition)
+
+        condition_buttons = QHBoxLayout()
+        condition_buttons.addWidget(add_condition_button)
+        condition_buttons.addWidget(remove_condition_button)
+
+        self.result_label = QLabel()
+        self.result_label.setWordWrap(True)
+
+        count_button = QPushButton("Count")
+        count_button.clicked.connect(self.count_matches)
+        save_button = QPushButton("Save As...")
+        save_button.clicked.connect(self.save_filter)
+        apply_button = QPushButton("Apply")
+        apply_button.clicked.connect(self.apply_to_table)
+
+        action_buttons = QHBoxLayout()
+        action_buttons.addWidget(count_button)
+        action_buttons.addWidget(save_button)
+        action_buttons.addWidget(apply_button)
+
+        # Saved filters are stored in the database
+        delete_saved_button.setEnabled(not query_builder.db_manager.read_only)
+        save_button.setEnabled(not query_builder.db_manager.read_only)
+
+        filter_layout.addLayout(saved_layout)
+        filter_layout.addLayout(match_layout)
+        filter_layout.addWidget(self.conditions_table)
+        filter_layout.addLayout(condition_buttons)
+        filter_layout.addWidget(self.result_label)
+        filter_layout.addLayout(action_buttons)
+
+        self.setLayout(filter_layout)
+        self.add_condition()
+
+    def add_condition(self, group=1, field="Name", operator="contains", value=""):
+        row_num = self.conditions_table.rowCount()
+        self.conditions_table.insertRow(row_num)
+
+        group_input = QSpinBox()
+        group_input.setRange(1, 99)
+        group_input.setValue(group)
+        field_input = QComboBox()
+        field_input.addItems(list(FIELDS))
+        field_input.setCurrentText(field)
+        operator_input = QComboBox()
+        operator_input.addItems(list(OPERATORS))
+        operator_input.setCurrentText(operator)
+
+        self.conditions_table.setCellWidget(row_num, 0, group_input)
+        self.conditions_table.setCellWidget(row_num, 1, field_input)
+        self.conditions_table.setCellWidget(row_num, 2, operator_input)
+        self.conditions_table.setCellWidget(row_num, 3, QLineEdit(str(value)))
+
+    def remove_condition(self):
+        row_num = self.conditions_table.currentRow()
+        if row_num < 0:
+            row_num = self.conditions_table.rowCount() - 1
+        if row_num >= 0:
+            self.conditions_table.removeRow(row_num)
+
+    def definition(self):
+        groups = {}
+        for row_num in range(self.conditions_table.rowCount()):
+            groups.setdefault(self.conditions_table.cellWidget(row_num, 0).value(), []).append({
+                "field": self.conditions_table.cellWidget(row_num, 1).currentText(),
+                "operator": self.conditions_table.cellWidget(row_num, 2).currentText(),
+                "value": self.conditions_table.cellWidget(row_num, 3).text(),
+            })
+        return {"match": self.group_match.currentText(),
+                "conditions": [{"match": self.condition_match.currentText(), "conditions": groups[group]}
+                               for group in sorted(groups)]}
+
+    def load_saved_filter(self, name):
+        definition = self.query_builder.load(name) if name else None
+        if definition is None:
+            return
+
+        self.conditions_table.setRowCount(0)
+        self.group_match.setCurrentText(definition.get("match", "all"))
+        for group, condition in enumerate(definition.get("conditions", []), start=1):
+            if "conditions" in condition:
+                self.condition_match.setCurrentText(condition.get("match", "all"))
+                for inner_condition in condition["conditions"]:
+                    self.add_condition(group, inner_condition["field"], inner_condition["operator"],
+                                       inner_condition.get("value", ""))
+            else:
+                self.add_condition(group, condition["field"], condition["operator"], condition.get("value", ""))
+
+    def delete_saved_filter(self):
+        name = self.saved_filters.currentText()
+        if name:
+            self.query_builder.delete(name)
+            self.saved_filters.removeItem(self.saved_filters.currentIndex())
+
+    def save_filter(self):
+        name, ok = QInputDialog.getText(self, "Save Filter", "Filter name:", text=self.saved_filters.currentText())
+        if not ok or not name.strip():
+            return
+        try:
+            self.query_builder.save(name.strip(), self.definition())
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return
+
+        if self.saved_filters.findText(name.strip()) < 0:
+            self.saved_filters.addItem(name.strip())
+        self.saved_filters.setCurrentText(name.strip())
+
+    def count_matches(self):
+        """
+        Compiles the filter, checks its query plan and counts the matches without fetching any rows.
+        Returns (where clause, parameters, count), or None if the filter is invalid.
+        """
+        try:
+            where, parameters = self.query_builder.compile(self.definition())
+        except ValueError as error:
+            QMessageBox.critical(self, "Input Error", str(error))
+            return None
+
+        count = self.query_builder.count(where, parameters)
+        plan, full_scan = self.query_builder.explain(where, parameters)
+        note = "Reads every active staff row; filter on role, salary or joining date to use an index." \
+            if full_scan else "Uses an index."
+        self.result_label.setText(f"{count} matching staff. {note}")
+        return where, parameters, count
+
+    def apply_to_table(self):
+        result = self.count_matches()
+        if result is None:
+            return
+
+        where, parameters, count = result
+        if count > LARGE_RESULT_ROWS:
+            confirmation = QMessageBox.question(self, "Confirmation", f"{count} staff match. Show them all?",
+                                                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirmation != QMessageBox.StandardButton.Yes:
+                return
+
+        self.apply_filter(where, parameters)
+        self.accept()
+
+
+class DocumentsDialog(QDialog):
+    """
+    Lists a staff member's photos and documents, and adds, saves or removes them.
+    """
+    def __init__(self, documents, staff_id, staff_name):
+        super().__init__()
+
+        self.documents = documents
+        self.staff_id = staff_id
+
+        self.setWindowTitle(f"Documents for {staff_name}")
+        self.setFixedSize(600, 400)
+
+        documents_layout = QVBoxLayout()
+
+        self.documents_table = QTableWidget()
+        self.documents_table.verticalHeader().setVisible(False)
+        self.documents_table.setColumnCount(4)
+        self.documents_table.setHorizontalHeaderLabels(["Kind", "File Name", "Size (KB)", "Added"])
+        self.documents_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.documents_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+
+        add_photo_button = QPushButton("Add Photo...")
+        add_photo_button.clicked.connect(lambda: self.add_document(PHOTO))
+        add_document_button = QPushButton("Add Document...")
+        add_document_button.clicked.connect(lambda: self.add_document(DOCUMENT))
+        save_button = QPushButton("Save As...")
+        save_button.clicked.connect(self.save_document)
+        remove_button = QPushButton("Remove")
+        remove_button.clicked.connect(self.remove_document)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(add_photo_button)
+        button_layout.addWidget(add_document_button)
+        button_layout.addWidget(save_button)
+        button_layout.addWidget(remove_button)
+
+        documents_layout.addWidget(self.documents_table)
+        for button in (add_photo_button, add_document_button, remove_button):
+            button.setEnabled(not documents.db_manager.read_only)
+        documents_layout.addLayout(button_layout)
+
+        self.setLayout(documents_layout)
+        self.load_documents()
+
+    def load_documents(self):
+        self.document_ids = []
+        self.documents_table.setRowCount(0)
+        for row_num, (document_id, kind, file_name, size, added_at) in enumerate(
+                self.documents.documents_for(self.staff_id)):
+            self.documents_table.insertRow(row_num)
+            self.documents_table.setItem(row_num, 0, QTableWidgetItem(kind.capitalize()))
+            self.documents_table.setItem(row_num, 1, QTableWidgetItem(file_name))
+            self.documents_table.setItem(row_num, 2, QTableWidgetItem(f"{size / 1024:,.1f}"))
+            self.documents_table.setItem(row_num, 3, QTableWidgetItem(added_at))
+            self.document_ids.append(document_id)
+
+    def add_document(self, kind):
+        file_filter = "Images (*.png *.jpg *.jpeg *.bmp)" if kind == PHOTO else "All Files (*)"
+        path, _ = QFileDialog.getOpenFileName(self, f"Add {kind.capitalize()}", "", file_filter)
+        if not path:
+            return
+        try:
+            self.documents.add(self.staff_id, path, kind)
+        except OSError as error:
+            QMessageBox.critical(self, "Documents", str(error))
+            return
+        self.load_documents()
+
+    def save_document(self):
+        row_num = self.documents_table.currentRow()
+        if row_num < 0:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Document", self.documents_table.item(row_num, 1).text())
+        if path:
+            self.documents.export(self.document_ids[row_num], path)
+
+    def remove_document(self):
+        row_num = self.documents_table.currentRow()
+        if row_num < 0:
+            return
+        confirmation = QMessageBox.question(self, "Confirmation",
+                                            f"Remove {self.documents_table.item(row_num, 1).text()}?",
+                                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if confirmation == QMessageBox.StandardButton.Yes:
+            self.documents.remove(self.document_ids[row_num])
+            self.load_documents()
+
+
 class DeleteStaffDialog(QDialog):
-    def __init__(self, db_manager, main_table_populate_callback):
+    def __init__(self, db_manager, history):
         super().__init__()
 
         self.db_manager = db_manager
-        self.main_table_populate = main_table_populate_callback
+        self.history = history
 
         self.setWindowTitle("Delete Staff Records")
         self.setFixedSize(800, 400)
@@ -506,7 +2097,7 @@ class DeleteStaffDialog(QDialog):
         self.staff_records_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.staff_records_table.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
 
-        self.staff_data = self.db_manager.fetch_all("SELECT * FROM staff WHERE deleted_at is NULL")
+        self.staff_data = self.db_manager.fetch_all(f"SELECT {STAFF_COLUMNS} FROM staff WHERE deleted_at is NULL")
         self.populate_table(self.staff_data, self.staff_records_table)  # Populate the table with staff data
 
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Yes | QDialogButtonBox.StandardButton.No)
@@ -553,10 +2144,10 @@ class DeleteStaffDialog(QDialog):
             selected_ids.append(int(self.staff_records_table.item(index.row(), 0).text()))
 
         if selected_ids:
-            for staff_id in selected_ids:
-                self.db_manager.execute("UPDATE staff SET deleted_at = ? Where id = ?",
-                                        (deletion_date, staff_id))
-            self.main_table_populate(self.db_manager.fetch_all("SELECT * FROM staff WHERE deleted_at is NULL"))  # Update main table
+            # Soft delete all selected records with a single commit
+            with self.history.track("Delete Staff", selected_ids):
+                self.db_manager.execute_many("UPDATE staff SET deleted_at = ? Where id = ?",
+                                             [(deletion_date, staff_id) for staff_id in selected_ids])
             self.accept()
 
 
@@ -580,11 +2171,20 @@ class SearchStaffDialog(QDialog):
         self.name.setPlaceholderText("Search with Staff Name...")
         self.name.textChanged.connect(self.perform_search)
 
+        self.include_archive = QCheckBox("Include archived records")
+        self.include_archive.toggled.connect(lambda: self.perform_search(self.name.text()))
+
+        # In branch mode, search every branch's database instead of only this one
+        self.all_branches = QCheckBox("Search all branches")
+        self.all_branches.setVisible(parent_window.shards is not None)
+        self.all_branches.toggled.connect(lambda: self.perform_search(self.name.text()))
+
         self.search_results = QTableWidget()
         self.search_results.verticalHeader().setVisible(False)
-        self.search_results.setColumnCount(9)
+        self.search_results.setColumnCount(10)
         self.search_results.setHorizontalHeaderLabels(
-            ["ID", "Name", "Mobile", "Email", "Role", "Salary", "Joining Date", "Address", "Remark"])
+            ["ID", "Name", "Mobile", "Email", "Role", "Salary", "Joining Date", "Address", "Remark", "Branch"])
+        self.search_results.setColumnHidden(9, True)
         self.search_results.setHidden(True)
 
         self.search_results_main_data = []  # To store main table data corresponding to search results
@@ -594,6 +2194,8 @@ class SearchStaffDialog(QDialog):
         clear_button.clicked.connect(self.clear_search_results)
 
         search_staff_layout.addWidget(self.name)
+        search_staff_layout.addWidget(self.include_archive)
+        search_staff_layout.addWidget(self.all_branches)
         search_staff_layout.addWidget(self.search_results)
         search_staff_layout.addWidget(clear_button)
 
@@ -607,8 +2209,13 @@ class SearchStaffDialog(QDialog):
         # Perform real-time search
         searched_name = text.strip()  # Remove leading/trailing whitespace
         if searched_name:
-            staff_data = self.db_manager.fetch_all("SELECT * FROM staff WHERE deleted_at is NULL AND "
-                                                   "name LIKE ?", (f"%{searched_name}%",))
+            if self.all_branches.isChecked():
+                self.db_manager.flush()
+                staff_data = self.parent_window.shards.search(searched_name)
+            else:
+                staff_data = self.parent_window.search_cache.get(searched_name, self.include_archive.isChecked())
+            self.include_archive.setEnabled(not self.all_branches.isChecked())
+            self.search_results.setColumnHidden(9, not self.all_branches.isChecked())
             self.populate_search_table(staff_data)  # Populate search results table
             self.search_results.setHidden(False)
         else:
@@ -624,12 +2231,10 @@ class SearchStaffDialog(QDialog):
         # When a search result is double-clicked, get the corresponding row data
         selected_row_data = self.search_results_main_data[row]
 
-        # Iterate through the main_data_list to find the matching data
-        for idx, row_data in enumerate(self.parent_window.main_data_list):
-            if row_data == selected_row_data:
-                # Select the corresponding row in the main table
-                self.parent_window.table.selectRow(idx)
-                break
+        # Select the corresponding row in the main table; other branches' staff are not in it
+        row_num = self.parent_window.row_index.get(selected_row_data[0])
+        if row_num is not None:
+            self.parent_window.table.selectRow(row_num)
 
         # Close the search dialog
         self.accept()
@@ -652,7 +2257,25 @@ class SearchStaffDialog(QDialog):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = StaffManagementApp()
+    parser = argparse.ArgumentParser(description="Staff Management System")
+    parser.add_argument("--profile", action="store_true",
+                        help="write a cProfile report for each action and log event loop stalls to profiles/")
+    parser.add_argument("--branch",
+                        help="work on this branch's own database in branches/, creating it if needed")
+    parser.add_argument("--read-only", action="store_true",
+                        help="open the database for lookups and reports only, never writing to it")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    try:
+        window = StaffManagementApp(profile=args.profile, branch=args.branch, read_only=args.read_only)
+    except sqlite3.OperationalError as error:
+        if not args.read_only:
+            raise
+        # A missing database, or one that still needs the upgrades a normal launch makes, cannot be opened read only
+        QMessageBox.critical(None, "Read-Only Mode",
+                             f"The database cannot be opened read only ({error}).\n"
+                             f"Start the application once without --read-only to create or upgrade it.")
+        sys.exit(1)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,205 @@
+import os
+from datetime import date, timedelta
+
+from database import STAFF_COLUMNS
+from dedup import check_unique
+
+
+ARCHIVE_DATABASE = "staff_archive.db"
+
+
+class StaffArchiver:
+    """
+    Moves soft-deleted staff records out of the main 'staff' table into an attached archive database.
+    """
+    def __init__(self, db_manager, archive_path=ARCHIVE_DATABASE, batch_size=500):
+        self.db_manager = db_manager
+        self.archive_path = archive_path
+        self.batch_size = batch_size
+        self.attached = False
+        self.columns = []  # Every column of the main 'staff' table, all of which the archive keeps
+
+    @staticmethod
+    def create_schema(db_manager):
+        # Partial index so finding old leavers never has to walk the active rows
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_staff_deleted_at ON staff (deleted_at) "
+                           "WHERE deleted_at IS NOT NULL")
+
+    def attach(self):
+        """
+        Attaches the archive database on first use and creates its table. Returns False when there is
+        no archive to read, which happens in read-only mode before anything was archived.
+        """
+        if self.attached:
+            return True
+
+        if self.db_manager.read_only:
+            return self.attach_read_only()
+
+        # ATTACH cannot run inside an open transaction
+        self.db_manager.flush()
+        attached_names = [row[1] for row in self.db_manager.fetch_all("PRAGMA database_list")]
+        if "archive" not in attached_names:
+            self.db_manager.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+
+        # Archives made before 'archive_id' keyed rows on the staff id, which the main table used to reuse
+        archive_columns = [row[1] for row in self.db_manager.fetch_all("PRAGMA archive.table_info(staff)")]
+        upgrade = archive_columns and "archive_id" not in archive_columns
+
+        with self.db_manager.transaction():
+            if upgrade:
+                self.db_manager.execute("ALTER TABLE archive.staff RENAME TO staff_before_archive_id")
+            self.create_archive_table()
+            if upgrade:
+                self.db_manager.execute(f"INSERT INTO archive.staff ({STAFF_COLUMNS}, archived_at) "
+                                        f"SELECT {STAFF_COLUMNS}, archived_at FROM archive.staff_before_archive_id "
+                                        f"ORDER BY archived_at, id")
+                self.db_manager.execute("DROP TABLE archive.staff_before_archive_id")
+            # Columns added to the main table since the archive was made, e.g. 'manager_id' and 'sync_uid'
+            archive_columns = [row[1] for row in self.db_manager.fetch_all("PRAGMA archive.table_info(staff)")]
+            for row in self.db_manager.fetch_all("PRAGMA main.table_info(staff)"):
+                if row[1] not in archive_columns:
+                    self.db_manager.execute(f"ALTER TABLE archive.staff ADD COLUMN {row[1]} {row[2]}")
+            self.db_manager.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_staff_name ON staff (name)")
+            self.db_manager.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_staff_id ON staff (id)")
+            # Ids archived before they were protected from reuse are not handed out again either
+            self.db_manager.execute("UPDATE main.sqlite_sequence SET seq = (SELECT max(id) FROM archive.staff) "
+                                    "WHERE name = 'staff' AND seq < (SELECT max(id) FROM archive.staff)")
+        self.columns = [row[1] for row in self.db_manager.fetch_all("PRAGMA main.table_info(staff)")]
+        self.attached = True
+        return True
+
+    def attach_read_only(self):
+        # Attaching would create a missing file, and creating tables would write, so only read what is there
+        if not os.path.exists(self.archive_path):
+            return False
+        attached_names = [row[1] for row in self.db_manager.fetch_all("PRAGMA database_list")]
+        if "archive" not in attached_names:
+            self.db_manager.execute("ATTACH DATABASE ? AS archive", (f"file:{self.archive_path}?mode=ro",))
+        if not self.db_manager.fetch_all("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'staff'"):
+            return False
+        self.attached = True
+        return True
+
+    def create_archive_table(self):
+        # 'id' is the record's id in the main table. Older databases reused ids, so one id can be archived
+        # more than once.
+        self.db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS archive.staff (
+                archive_id INTEGER PRIMARY KEY,
+                id INTEGER,
+                name TEXT,
+                mobile TEXT,
+                email TEXT,
+                role TEXT,
+                salary REAL,
+                joining_date TEXT,
+                address TEXT,
+                remark TEXT,
+                deleted_at TEXT,
+                archived_at TEXT
+            )
+        ''')
+
+    def cutoff_date(self, max_age_days):
+        # 'deleted_at' is stored as yyyy-MM-dd, so an ISO date compares correctly as text
+        return (date.today() - timedelta(days=max_age_days)).isoformat()
+
+    def archive_batch(self, cutoff):
+        """
+        Moves one batch of records deleted before the cutoff date. Returns the number of records moved.
+        """
+        self.attach()
+
+        rows = self.db_manager.fetch_all("SELECT id FROM main.staff WHERE deleted_at IS NOT NULL AND deleted_at < ? "
+                                         "ORDER BY deleted_at LIMIT ?", (cutoff, self.batch_size))
+        if not rows:
+            return 0
+
+        staff_ids = [row[0] for row in rows]
+        self.move(staff_ids)
+        return len(staff_ids)
+
+    def move(self, staff_ids):
+        """
+        Moves the given records into the archive as they are. The archive must be attached already.
+        """
+        placeholders = ", ".join("?" * len(staff_ids))
+
+        # Copy and delete in one short transaction so each batch holds the write lock only briefly
+        columns = ", ".join(self.columns)
+        with self.db_manager.transaction():
+            self.db_manager.execute(
+                f"INSERT INTO archive.staff ({columns}, archived_at) "
+                f"SELECT {columns}, ? FROM main.staff WHERE id IN ({placeholders})",
+                [date.today().isoformat()] + staff_ids
+            )
+            self.db_manager.execute(f"DELETE FROM main.staff WHERE id IN ({placeholders})", staff_ids)
+
+    def archive_all(self, max_age_days):
+        """
+        Archives every record deleted more than max_age_days ago, one batch at a time.
+        """
+        cutoff = self.cutoff_date(max_age_days)
+        total = 0
+        while True:
+            moved = self.archive_batch(cutoff)
+            if not moved:
+                return total
+            total += moved
+
+    def restore(self, staff_id):
+        """
+        Moves an archived record back into the main table as an active staff member, with its manager, role,
+        version and sync id. If the id was archived more than once, the latest one is restored. Returns the id
+        of the restored record, or None if it is not in the archive. Raises ValueError if an active staff member
+        now uses its mobile number or email.
+        """
+        self.attach()
+
+        rows = self.db_manager.fetch_all(f"SELECT archive_id, {', '.join(self.columns)} FROM archive.staff "
+                                         f"WHERE id = ? ORDER BY archive_id DESC LIMIT 1", (staff_id,))
+        if not rows:
+            return None
+
+        archive_id = rows[0][0]
+        record = dict(zip(self.columns, rows[0][1:]))
+        record["deleted_at"] = None
+        check_unique(self.db_manager, record["mobile"], record["email"])
+
+        # Databases from before ids were protected from reuse may have given the id to a newer record
+        if self.db_manager.fetch_all("SELECT 1 FROM main.staff WHERE id = ?", (staff_id,)):
+            record["id"] = None
+        # A manager archived in the meantime is no longer there to report to
+        if not self.db_manager.fetch_all("SELECT 1 FROM main.staff WHERE id = ?", (record.get("manager_id"),)):
+            record["manager_id"] = None
+
+        # Columns left empty, including those older archives lack, get their defaults and trigger values
+        record = {column: value for column, value in record.items() if value is not None}
+        with self.db_manager.transaction():
+            self.db_manager.execute(f"INSERT INTO main.staff ({', '.join(record)}) "
+                                    f"VALUES ({', '.join('?' * len(record))})", list(record.values()))
+            restored_id = self.db_manager.cursor.lastrowid
+            self.db_manager.execute("DELETE FROM archive.staff WHERE archive_id = ?", (archive_id,))
+
+        return restored_id
+
+    def remove_archived(self, sync_uid):
+        """
+        Deletes the archived copies of a record that has been brought back elsewhere. The archive must be
+        attached already.
+        """
+        self.db_manager.execute("DELETE FROM archive.staff WHERE sync_uid = ?", (sync_uid,))
+
+    def search(self, name, include_archive=False):
+        """
+        Searches active staff by name, optionally including archived records.
+        """
+        query = f"SELECT {STAFF_COLUMNS} FROM main.staff WHERE deleted_at IS NULL AND name LIKE ?"
+        values = [f"%{name}%"]
+
+        if include_archive and self.attach():
+            query += f" UNION ALL SELECT {STAFF_COLUMNS} FROM archive.staff WHERE name LIKE ?"
+            values.append(f"%{name}%")
+
+        return self.db_manager.fetch_all(query, values)
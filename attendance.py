@@ -0,0 +1,197 @@
+from datetime import date, datetime
+
+
+CLOCK_IN = "in"
+CLOCK_OUT = "out"
+
+
+class AttendanceLog:
+    """
+    Records staff clock events. Events are buffered in memory and written in batches into one
+    append-only table per month, with per-day and per-month summaries kept up to date as they are written.
+    """
+    def __init__(self, db_manager, batch_size=1000):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.buffer = []
+
+        self.load_partitions()
+
+    def load_partitions(self):
+        # Month partitions that already exist, so writes don't need to check the schema
+        self.partitions = {row[0] for row in self.db_manager.fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'attendance_[0-9]*'")}
+
+    @staticmethod
+    def create_schema(db_manager):
+        # One row per staff member per day they clocked in or out
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_daily (
+                day TEXT NOT NULL,
+                staff_id INTEGER NOT NULL,
+                first_in TEXT,
+                last_out TEXT,
+                events INTEGER NOT NULL,
+                PRIMARY KEY (day, staff_id)
+            ) WITHOUT ROWID
+        ''')
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_monthly (
+                month TEXT NOT NULL,
+                staff_id INTEGER NOT NULL,
+                days_present INTEGER NOT NULL DEFAULT 0,
+                clock_ins INTEGER NOT NULL DEFAULT 0,
+                clock_outs INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, staff_id)
+            ) WITHOUT ROWID
+        ''')
+
+        # A new daily row means one more day present in that month
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS attendance_daily_after_insert AFTER INSERT ON attendance_daily
+            BEGIN
+                INSERT INTO attendance_monthly (month, staff_id, days_present)
+                VALUES (substr(new.day, 1, 7), new.staff_id, 1)
+                ON CONFLICT (month, staff_id) DO UPDATE SET days_present = days_present + 1;
+            END
+        ''')
+
+    def partition_name(self, month):
+        # month is yyyy-MM
+        return f"attendance_{month.replace('-', '_')}"
+
+    def ensure_partition(self, month):
+        table = self.partition_name(month)
+        if table in self.partitions:
+            return table
+
+        self.db_manager.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                staff_id INTEGER NOT NULL,
+                event_time TEXT NOT NULL,
+                event_type TEXT NOT NULL
+            )
+        ''')
+        self.db_manager.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_staff ON {table} (staff_id, event_time)")
+        self.db_manager.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table} (event_time)")
+        self.partitions.add(table)
+        return table
+
+    def clock(self, staff_id, event_type=CLOCK_IN, event_time=None):
+        """
+        Buffers one clock event; the buffer is written once it reaches the batch size.
+        """
+        if event_type not in (CLOCK_IN, CLOCK_OUT):
+            raise ValueError(f"Unknown clock event type: {event_type}")
+        if event_time is None:
+            event_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        self.buffer.append((staff_id, event_time, event_type))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every buffered event in one transaction. Returns the number of events written.
+        """
+        if not self.buffer:
+            return 0
+        events, self.buffer = self.buffer, []
+
+        # Group the batch by month partition and summarise it per staff member and day
+        by_month = {}
+        daily = {}
+        monthly = {}
+        for staff_id, event_time, event_type in events:
+            day = event_time[:10]
+            by_month.setdefault(day[:7], []).append((staff_id, event_time, event_type))
+
+            first_in, last_out, count = daily.get((day, staff_id), (None, None, 0))
+            if event_type == CLOCK_IN and (first_in is None or event_time < first_in):
+                first_in = event_time
+            if event_type == CLOCK_OUT and (last_out is None or event_time > last_out):
+                last_out = event_time
+            daily[(day, staff_id)] = (first_in, last_out, count + 1)
+
+            clock_ins, clock_outs = monthly.get((day[:7], staff_id), (0, 0))
+            monthly[(day[:7], staff_id)] = (clock_ins + (event_type == CLOCK_IN),
+                                            clock_outs + (event_type == CLOCK_OUT))
+
+        try:
+            with self.db_manager.transaction():
+                for month, month_events in by_month.items():
+                    table = self.ensure_partition(month)
+                    self.db_manager.execute_many(f"INSERT INTO {table} (staff_id, event_time, event_type) "
+                                                 f"VALUES (?, ?, ?)", month_events)
+
+                self.db_manager.execute_many(
+                    "INSERT INTO attendance_daily (day, staff_id, first_in, last_out, events) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (day, staff_id) DO UPDATE SET "
+                    "first_in = min(coalesce(first_in, excluded.first_in), coalesce(excluded.first_in, first_in)), "
+                    "last_out = max(coalesce(last_out, excluded.last_out), coalesce(excluded.last_out, last_out)), "
+                    "events = events + excluded.events",
+                    [(day, staff_id) + summary for (day, staff_id), summary in daily.items()]
+                )
+                self.db_manager.execute_many(
+                    "INSERT INTO attendance_monthly (month, staff_id, clock_ins, clock_outs) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (month, staff_id) DO UPDATE SET clock_ins = clock_ins + excluded.clock_ins, "
+                    "clock_outs = clock_outs + excluded.clock_outs",
+                    [(month, staff_id) + counts for (month, staff_id), counts in monthly.items()]
+                )
+        except Exception:
+            # Keep the events so the next flush can retry them
+            self.buffer = events + self.buffer
+            self.load_partitions()
+            raise
+
+        return len(events)
+
+    def months_between(self, start_day, end_day):
+        year, month = int(start_day[:4]), int(start_day[5:7])
+        while f"{year:04d}-{month:02d}" <= end_day[:7]:
+            yield f"{year:04d}-{month:02d}"
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def events_for_staff(self, staff_id, start_day, end_day):
+        """
+        Returns (event_time, event_type) for one staff member between two yyyy-MM-dd days, inclusive.
+        Only the month partitions covering the range are read.
+        """
+        events = []
+        for month in self.months_between(start_day, end_day):
+            table = self.partition_name(month)
+            if table in self.partitions:
+                events += self.db_manager.fetch_all(
+                    f"SELECT event_time, event_type FROM {table} WHERE staff_id = ? AND event_time >= ? "
+                    f"AND event_time < ? ORDER BY event_time", (staff_id, start_day, end_day + "~"))
+        return events
+
+    def events_on_day(self, day):
+        """
+        Returns (staff_id, event_time, event_type) for every clock event on a yyyy-MM-dd day.
+        """
+        table = self.partition_name(day[:7])
+        if table not in self.partitions:
+            return []
+        return self.db_manager.fetch_all(f"SELECT staff_id, event_time, event_type FROM {table} "
+                                         f"WHERE event_time >= ? AND event_time < ? ORDER BY event_time",
+                                         (day, day + "~"))
+
+    def daily_summary(self, day=None):
+        """
+        Returns (staff_id, name, first_in, last_out, events) for everyone who clocked in or out on a day.
+        """
+        day = day or date.today().isoformat()
+        return self.db_manager.fetch_all(
+            "SELECT attendance_daily.staff_id, staff.name, first_in, last_out, events FROM attendance_daily "
+            "LEFT JOIN staff ON staff.id = attendance_daily.staff_id WHERE day = ? ORDER BY staff.name", (day,))
+
+    def monthly_rollup(self, month):
+        """
+        Returns (staff_id, name, days_present, clock_ins, clock_outs) for a yyyy-MM month.
+        """
+        return self.db_manager.fetch_all(
+            "SELECT attendance_monthly.staff_id, staff.name, days_present, clock_ins, clock_outs "
+            "FROM attendance_monthly LEFT JOIN staff ON staff.id = attendance_monthly.staff_id "
+            "WHERE month = ? ORDER BY staff.name", (month,))
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+
+BACKUP_DIRECTORY = "backups"
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupManager:
+    """
+    Takes online snapshots of the staff database, keeps the newest few and restores them after verification.
+    """
+    def __init__(self, database_path, backup_dir=BACKUP_DIRECTORY, keep=7, pages=256, sleep=0.005):
+        self.database_path = database_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages = pages  # Pages copied per step, the source is only locked while a step runs
+        self.sleep = sleep  # Pause between steps so writers can get in
+
+    def snapshot_name(self):
+        base_name = os.path.splitext(os.path.basename(self.database_path))[0]
+        # Microseconds too, so two snapshots taken within the same second don't overwrite each other
+        return f"{base_name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db"
+
+    def snapshot(self, progress=None):
+        """
+        Copies the live database into a new snapshot file and writes its checksum next to it.
+        Opens its own connections, so it can run from a background thread.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        backup_path = os.path.join(self.backup_dir, self.snapshot_name())
+
+        source = sqlite3.connect(self.database_path)
+        destination = sqlite3.connect(backup_path)
+        try:
+            source.backup(destination, pages=self.pages, sleep=self.sleep,
+                          progress=(lambda status, remaining, total: progress(total - remaining, total))
+                          if progress else None)
+        finally:
+            destination.close()
+            source.close()
+
+        with open(backup_path + ".sha256", "w") as checksum_file:
+            checksum_file.write(f"{self.checksum(backup_path)}  {os.path.basename(backup_path)}\n")
+
+        self.rotate()
+        return backup_path
+
+    def checksum(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as backup_file:
+            for chunk in iter(lambda: backup_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def list_snapshots(self):
+        """
+        Returns this database's snapshot files, newest first. Snapshots of other databases sharing
+        the directory are left alone.
+        """
+        if not os.path.isdir(self.backup_dir):
+            return []
+
+        prefix = os.path.splitext(os.path.basename(self.database_path))[0] + "-"
+        snapshots = [os.path.join(self.backup_dir, name) for name in os.listdir(self.backup_dir)
+                     if name.startswith(prefix) and name.endswith(".db")]
+        return sorted(snapshots, reverse=True)
+
+    def rotate(self):
+        for old_snapshot in self.list_snapshots()[self.keep:]:
+            os.remove(old_snapshot)
+            if os.path.exists(old_snapshot + ".sha256"):
+                os.remove(old_snapshot + ".sha256")
+
+    def verify(self, backup_path):
+        """
+        Checks the snapshot against its recorded checksum and runs SQLite's integrity check on it.
+        """
+        try:
+            with open(backup_path + ".sha256") as checksum_file:
+                expected = checksum_file.read().split()[0]
+        except (OSError, IndexError):
+            raise BackupError(f"No checksum recorded for {backup_path}")
+
+        if self.checksum(backup_path) != expected:
+            raise BackupError(f"Checksum mismatch for {backup_path}")
+
+        backup = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+        try:
+            result = backup.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            backup.close()
+        if result != "ok":
+            raise BackupError(f"Integrity check failed for {backup_path}: {result}")
+
+    def restore(self, backup_path, connection):
+        """
+        Verifies the snapshot and copies it over the database behind the given connection.
+        """
+        self.verify(backup_path)
+
+        backup = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+        try:
+            backup.backup(connection)
+        finally:
+            backup.close()
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime
+
+from query_builder import BASE_FILTER
+from validation import validate_salary
+
+
+# Fields that can be set to one value for many staff at once. Mobile numbers and email addresses
+# belong to one person each, so they are left out.
+BULK_FIELDS = {
+    "Role": "role",
+    "Salary": "salary",
+    "Joining Date": "joining_date",
+    "Address": "address",
+    "Remark": "remark",
+}
+
+CHANGE_SALARY = "Change Salary by %"
+APPEND_REMARK = "Append to Remark"
+
+BULK_OPERATIONS = [f"Set {label}" for label in BULK_FIELDS] + [CHANGE_SALARY, APPEND_REMARK]
+
+
+class BulkEditor:
+    """
+    Applies one change to many staff records with a single set-based UPDATE.
+    The staff are passed as a list of ids, sent to SQLite as one JSON array, so the statement is the same
+    size however many rows it touches. Rows the change would leave as they are are not written at all.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def change(self, operation, value):
+        """
+        Returns (column, SQL expression for its new value, parameters). Raises ValueError for invalid input.
+        """
+        value = value.strip()
+        if operation == CHANGE_SALARY:
+            try:
+                percent = float(value.rstrip("%"))
+            except ValueError:
+                raise ValueError("Please enter the salary change as a percentage, e.g. 5 or -2.5.")
+            if percent <= -100:
+                raise ValueError("A salary cannot be cut by 100% or more.")
+            # Salaries that are not numbers are left alone
+            return "salary", "CASE WHEN typeof(salary) IN ('integer', 'real') THEN round(salary * ?, 2) " \
+                             "ELSE salary END", [1 + percent / 100]
+
+        if operation == APPEND_REMARK:
+            if not value:
+                raise ValueError("Please enter the text to add to the remarks.")
+            return "remark", "CASE WHEN coalesce(remark, '') = '' THEN ? ELSE remark || ' ' || ? END", [value, value]
+
+        label = operation[len("Set "):]
+        if label not in BULK_FIELDS:
+            raise ValueError(f"Unknown bulk edit: {operation}")
+        if label == "Salary":
+            value = validate_salary(value)
+            if value is None:
+                raise ValueError("Invalid salary input. Please enter a valid positive number.")
+        if label == "Joining Date":
+            try:
+                datetime.strptime(value, "%d-%m-%Y")
+            except ValueError:
+                raise ValueError("Please enter the joining date as dd-MM-yyyy.")
+        return BULK_FIELDS[label], "?", [value]
+
+    def target(self, staff_ids, column, expression, values):
+        # Active staff among the ids whose value the change would actually alter
+        return (f"id IN (SELECT value FROM json_each(?)) AND {BASE_FILTER} AND {column} IS NOT ({expression})",
+                [json.dumps(list(staff_ids))] + values)
+
+    def preview(self, staff_ids, operation, value):
+        """
+        Returns how many of the staff the change would update, without changing anything.
+        """
+        column, expression, values = self.change(operation, value)
+        where, parameters = self.target(staff_ids, column, expression, values)
+        return self.db_manager.fetch_all(f"SELECT count(*) FROM staff WHERE {where}", parameters)[0][0]
+
+    def apply(self, staff_ids, operation, value):
+        """
+        Updates the staff in one statement and one transaction. Returns the number of rows updated.
+        """
+        column, expression, values = self.change(operation, value)
+        where, parameters = self.target(staff_ids, column, expression, values)
+        with self.db_manager.transaction():
+            self.db_manager.execute(f"UPDATE staff SET {column} = ({expression}) WHERE {where}", values + parameters)
+            updated = self.db_manager.cursor.rowcount
+        return updated
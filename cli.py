@@ -0,0 +1,362 @@
+"""
+Command line interface for batch staff operations. Never imports PyQt6, so it starts instantly.
+
+    python cli.py add --name "Asha Rao" --mobile 9876543210 --email asha@example.com --salary 42000
+    python cli.py update 12 --salary 45000
+    python cli.py delete 12 13
+    python cli.py search rao
+    python cli.py import staff.csv
+    python cli.py export > staff.csv
+    python cli.py stats
+    python cli.py --branch north stats --all-branches
+    python cli.py payroll 2026-03 --all-branches
+    python cli.py batch < changes.jsonl
+    python cli.py sync-export north.changes.gz --peer <sync id>
+    python cli.py sync-import head-office.changes.gz
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import date, datetime
+from itertools import islice
+
+from archive import StaffArchiver, ARCHIVE_DATABASE
+from database import DatabaseManager, STAFF_COLUMNS
+from validation import validate_mobile, validate_email, validate_salary
+from dedup import check_unique
+from sharding import BranchShards
+from sync import SyncEngine
+
+
+STAFF_FIELDS = ["name", "mobile", "email", "role", "salary", "joining_date", "address", "remark"]
+REQUIRED_FIELDS = ["name", "mobile", "email", "salary"]
+
+
+def check_fields(fields, required=()):
+    """
+    Checks staff fields with the same rules as the dialogs and returns them cleaned up.
+    Raises ValueError with a message for the user.
+    """
+    unknown = set(fields) - set(STAFF_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    missing = [field for field in required if fields.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+
+    fields = dict(fields)
+    if "mobile" in fields and validate_mobile(str(fields["mobile"])) is None:
+        raise ValueError("Invalid mobile number. Please enter a valid 10-digit number.")
+    if "email" in fields and validate_email(str(fields["email"])) is None:
+        raise ValueError("Invalid email address. Please enter a valid email address.")
+    if "salary" in fields:
+        fields["salary"] = validate_salary(str(fields["salary"]))
+        if fields["salary"] is None:
+            raise ValueError("Invalid salary input. Please enter a valid positive number.")
+    if fields.get("joining_date"):
+        try:
+            datetime.strptime(fields["joining_date"], "%d-%m-%Y")
+        except ValueError:
+            raise ValueError("Invalid joining date. Please use the dd-MM-yyyy format.")
+    return fields
+
+
+def add_staff(db_manager, fields):
+    fields = check_fields(fields, REQUIRED_FIELDS)
+    fields.setdefault("joining_date", date.today().strftime("%d-%m-%Y"))
+    check_unique(db_manager, fields["mobile"], fields["email"])
+
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" * len(fields))
+    db_manager.execute(f"INSERT INTO staff ({columns}) VALUES ({placeholders})", list(fields.values()))
+    return db_manager.cursor.lastrowid
+
+
+def update_staff(db_manager, staff_id, fields):
+    fields = check_fields(fields)
+    if not fields:
+        raise ValueError("Nothing to update.")
+    if "mobile" in fields or "email" in fields:
+        check_unique(db_manager, fields.get("mobile"), fields.get("email"), staff_id)
+
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    db_manager.execute(f"UPDATE staff SET {assignments} WHERE id = ? AND deleted_at IS NULL",
+                       list(fields.values()) + [staff_id])
+    if db_manager.cursor.rowcount == 0:
+        raise ValueError(f"No active staff member with ID {staff_id}.")
+
+
+def delete_staff(db_manager, staff_ids):
+    db_manager.execute_many("UPDATE staff SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+                            [(date.today().isoformat(), staff_id) for staff_id in staff_ids])
+    return db_manager.cursor.rowcount
+
+
+def write_rows(rows, output=sys.stdout):
+    writer = csv.writer(output)
+    writer.writerow(STAFF_COLUMNS.split(", "))
+    writer.writerows(rows)
+
+
+def run_add(db_manager, args):
+    fields = {field: getattr(args, field) for field in STAFF_FIELDS if getattr(args, field) is not None}
+    print(add_staff(db_manager, fields))
+
+
+def run_update(db_manager, args):
+    fields = {field: getattr(args, field) for field in STAFF_FIELDS if getattr(args, field) is not None}
+    update_staff(db_manager, args.id, fields)
+
+
+def run_delete(db_manager, args):
+    print(delete_staff(db_manager, args.ids))
+
+
+def archiver_for(db_manager, args):
+    # A branch keeps its own archive next to its database
+    return StaffArchiver(db_manager, BranchShards().archive_path(args.branch) if args.branch else ARCHIVE_DATABASE)
+
+
+def run_search(db_manager, args):
+    if args.include_archive:
+        rows = archiver_for(db_manager, args).search(args.name, include_archive=True)
+    else:
+        rows = db_manager.fetch_all(f"SELECT {STAFF_COLUMNS} FROM staff WHERE deleted_at IS NULL AND name LIKE ?",
+                                    (f"%{args.name}%",))
+    write_rows(rows)
+
+
+def run_export(db_manager, args):
+    condition = "" if args.include_deleted else " WHERE deleted_at IS NULL"
+    db_manager.cursor.execute(f"SELECT {STAFF_COLUMNS} FROM staff{condition} ORDER BY id")
+    write_rows(db_manager.cursor)
+
+
+def run_import(db_manager, args):
+    """
+    Imports staff from a CSV file with a header row naming the staff fields. Bad rows are reported and skipped.
+    """
+    input_file = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    imported = failed = 0
+    try:
+        reader = csv.DictReader(input_file)
+        with db_manager.transaction():
+            for line_num, row in enumerate(reader, start=2):
+                fields = {field: value for field, value in row.items() if field in STAFF_FIELDS and value != ""}
+                try:
+                    add_staff(db_manager, fields)
+                    imported += 1
+                except ValueError as error:
+                    print(f"line {line_num}: {error}", file=sys.stderr)
+                    failed += 1
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+
+    print(f"{imported} imported, {failed} failed")
+    return 1 if failed else 0
+
+
+def run_stats(db_manager, args):
+    if args.all_branches:
+        db_manager.flush()
+        totals = BranchShards().totals()
+        for branch, headcount, total_salary in totals:
+            print(f"{branch}: headcount {headcount}, total salary {total_salary:.2f}")
+        print(f"All branches: headcount {sum(row[1] for row in totals)}, "
+              f"total salary {sum(row[2] for row in totals):.2f}")
+        return
+
+    headcount, total_salary, average_salary = db_manager.fetch_all(
+        "SELECT count(*), coalesce(sum(salary), 0), coalesce(avg(salary), 0) FROM staff WHERE deleted_at IS NULL")[0]
+    print(f"Headcount: {headcount}")
+    print(f"Total salary: {total_salary:.2f}")
+    print(f"Average salary: {average_salary:.2f}")
+    for role, role_headcount in db_manager.fetch_all(
+            "SELECT coalesce(roles.name, ''), count(*) FROM staff LEFT JOIN roles ON roles.id = staff.role_id "
+            "WHERE staff.deleted_at IS NULL GROUP BY staff.role_id ORDER BY count(*) DESC"):
+        print(f"  {role or '(no role)'}: {role_headcount}")
+
+
+def print_payroll(label, totals, skipped):
+    headcount, total_gross, total_deductions, total_net = totals
+    print(f"{label}: staff paid {headcount}, gross {total_gross:.2f}, deductions {total_deductions:.2f}, "
+          f"net {total_net:.2f}")
+    if skipped:
+        print(f"  not paid, joining date is not a valid date: ID {', '.join(str(staff_id) for staff_id in skipped)}")
+
+
+def run_payroll(db_manager, args):
+    # Imported here so the other commands do not wait for NumPy to load
+    from payroll import PayrollEngine
+
+    try:
+        datetime.strptime(args.period, "%Y-%m")
+    except ValueError:
+        raise ValueError("Invalid payroll month. Please use the yyyy-MM format.")
+
+    if args.all_branches:
+        db_manager.flush()
+        for branch, (totals, skipped) in PayrollEngine.run_branches(args.period, workers=args.workers).items():
+            print_payroll(branch, totals, skipped)
+        return
+
+    payroll = PayrollEngine(db_manager)
+    print_payroll(f"Payroll for {args.period}", payroll.run(args.period), payroll.skipped)
+
+
+def run_batch(db_manager, args):
+    """
+    Applies JSON lines from stdin, one operation per line, committing every --commit-every lines:
+        {"action": "add", "name": "...", "mobile": "...", "email": "...", "salary": 42000}
+        {"action": "update", "id": 12, "salary": 45000}
+        {"action": "delete", "id": 12}
+    Bad lines are reported and skipped.
+    """
+    applied = failed = 0
+    lines = enumerate(sys.stdin, start=1)
+    while True:
+        chunk = list(islice(lines, args.commit_every))
+        if not chunk:
+            break
+
+        with db_manager.transaction():
+            for line_num, line in chunk:
+                if not line.strip():
+                    continue
+                try:
+                    operation = json.loads(line)
+                    if not isinstance(operation, dict):
+                        raise ValueError("Each line must be a JSON object.")
+                    action = operation.pop("action", None)
+                    if action == "add":
+                        add_staff(db_manager, operation)
+                    elif action == "update":
+                        update_staff(db_manager, int(operation.pop("id")), operation)
+                    elif action == "delete":
+                        if not delete_staff(db_manager, [int(operation["id"])]):
+                            raise ValueError(f"No active staff member with ID {operation['id']}.")
+                    else:
+                        raise ValueError(f"Unknown action: {action}")
+                    applied += 1
+                except (ValueError, KeyError, TypeError) as error:
+                    print(f"line {line_num}: {error}", file=sys.stderr)
+                    failed += 1
+
+    print(f"{applied} applied, {failed} failed")
+    return 1 if failed else 0
+
+
+def run_sync_export(db_manager, args):
+    written = SyncEngine(db_manager, archiver_for(db_manager, args)).export_changes(args.file, args.peer)
+    print(f"{written} changed rows written to {args.file}")
+
+
+def run_sync_import(db_manager, args):
+    applied, skipped, rejected = SyncEngine(db_manager, archiver_for(db_manager, args)).import_changes(args.file)
+    for message in rejected:
+        print(f"rejected: {message}", file=sys.stderr)
+    print(f"{applied} applied, {skipped} already up to date, {len(rejected)} rejected")
+    return 1 if rejected else 0
+
+
+def run_sync_status(db_manager, args):
+    sync_engine = SyncEngine(db_manager)
+    if args.new_id:
+        sync_engine.new_identity()
+    print(f"Sync id: {sync_engine.database_id}")
+    for database_id, received_seq, acked_seq in sync_engine.peers():
+        print(f"  peer {database_id}: received up to {received_seq}, confirmed ours up to {acked_seq}")
+
+
+def add_field_arguments(parser):
+    for field in STAFF_FIELDS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Batch operations on the staff database.")
+    parser.add_argument("--database", default="staff_database.db", help="database file (default: %(default)s)")
+    parser.add_argument("--branch", help="use this branch's database in branches/ instead of --database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="add a staff member and print the new ID")
+    add_field_arguments(add_parser)
+    add_parser.set_defaults(handler=run_add)
+
+    update_parser = commands.add_parser("update", help="update fields of a staff member")
+    update_parser.add_argument("id", type=int)
+    add_field_arguments(update_parser)
+    update_parser.set_defaults(handler=run_update)
+
+    delete_parser = commands.add_parser("delete", help="soft delete staff members")
+    delete_parser.add_argument("ids", type=int, nargs="+")
+    delete_parser.set_defaults(handler=run_delete)
+
+    search_parser = commands.add_parser("search", help="search staff by name, printing CSV")
+    search_parser.add_argument("name")
+    search_parser.add_argument("--include-archive", action="store_true")
+    search_parser.set_defaults(handler=run_search)
+
+    import_parser = commands.add_parser("import", help="import staff from a CSV file ('-' for stdin)")
+    import_parser.add_argument("file")
+    import_parser.set_defaults(handler=run_import)
+
+    export_parser = commands.add_parser("export", help="export staff as CSV")
+    export_parser.add_argument("--include-deleted", action="store_true")
+    export_parser.set_defaults(handler=run_export)
+
+    stats_parser = commands.add_parser("stats", help="print headcount and salary statistics")
+    stats_parser.add_argument("--all-branches", action="store_true",
+                              help="print headcount and salary totals of every branch database")
+    stats_parser.set_defaults(handler=run_stats)
+
+    payroll_parser = commands.add_parser("payroll", help="run payroll for a month and print the totals")
+    payroll_parser.add_argument("period", help="payroll month as yyyy-MM")
+    payroll_parser.add_argument("--all-branches", action="store_true",
+                                help="run payroll for every branch database, each in its own process")
+    payroll_parser.add_argument("--workers", type=int, help="worker processes for --all-branches")
+    payroll_parser.set_defaults(handler=run_payroll)
+
+    batch_parser = commands.add_parser("batch", help="apply JSON line operations from stdin")
+    batch_parser.add_argument("--commit-every", type=int, default=1000)
+    batch_parser.set_defaults(handler=run_batch)
+
+    sync_export_parser = commands.add_parser("sync-export", help="write rows changed since the peer's last sync "
+                                                                 "to a compressed changeset file")
+    sync_export_parser.add_argument("file")
+    sync_export_parser.add_argument("--peer", help="sync id of the database the changeset is for")
+    sync_export_parser.set_defaults(handler=run_sync_export)
+
+    sync_import_parser = commands.add_parser("sync-import", help="apply a changeset file from another database")
+    sync_import_parser.add_argument("file")
+    sync_import_parser.set_defaults(handler=run_sync_import)
+
+    sync_status_parser = commands.add_parser("sync-status", help="print this database's sync id and its peers")
+    sync_status_parser.add_argument("--new-id", action="store_true",
+                                    help="give this database a new sync id, e.g. after copying the file")
+    sync_status_parser.set_defaults(handler=run_sync_status)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        database_path = BranchShards().open(args.branch) if args.branch else args.database
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    db_manager = DatabaseManager(database_path)
+    try:
+        return args.handler(db_manager, args) or 0
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    finally:
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
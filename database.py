@@ -0,0 +1,129 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+# Columns of a staff record, in the order the application reads them
+STAFF_COLUMNS = "id, name, mobile, email, role, salary, joining_date, address, remark, deleted_at"
+
+# Bytes of the database file read-only connections map into memory, so reads skip copying pages
+READ_ONLY_MMAP_SIZE = 256 * 1024 * 1024
+
+
+class DatabaseManager:
+    def __init__(self, database_path="staff_database.db", group_commit_window=0, read_only=False):
+        self.database_path = database_path
+        self.read_only = read_only
+        if read_only:
+            # Opened read only, this connection never takes a write lock, so it cannot hold up other users' writes
+            self.connection = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(database_path)
+        self.cursor = self.connection.cursor()
+
+        self.group_commit_window = 0
+        self.pending_commit_since = None
+        self.on_commit_pending = None  # Called with the window when a commit is held back
+
+        self.transaction_depth = 0
+        self.savepoint_count = 0
+
+        if read_only:
+            self.cursor.execute(f"PRAGMA mmap_size = {READ_ONLY_MMAP_SIZE}")
+        else:
+            # Write-ahead logging lets backups and other readers run without blocking writers
+            self.cursor.execute("PRAGMA journal_mode=WAL")
+
+        # Bring the schema up to date before group commits start, so each upgrade step commits as it finishes.
+        # Imported here because the migrations use the feature modules, which import this one.
+        from migrations import migrate
+        migrate(self)
+
+        # Seconds a commit may be held back so several quick writes share one commit
+        self.group_commit_window = group_commit_window
+
+    def execute(self, query, values=None):
+        if values:
+            self.cursor.execute(query, values)
+        else:
+            self.cursor.execute(query)
+        self.commit()
+
+    def execute_many(self, query, values_list):
+        self.cursor.executemany(query, values_list)
+        self.commit()
+
+    def fetch_all(self, query, values=None):
+        if values:
+            self.cursor.execute(query, values)
+        else:
+            self.cursor.execute(query)
+        return self.cursor.fetchall()
+
+    def change_version(self):
+        """
+        Returns a value that changes whenever this or any other connection modifies the database.
+        """
+        return self.fetch_all("PRAGMA data_version")[0][0], self.connection.total_changes
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs every statement inside the block as one unit of work with a single commit.
+        Blocks can be nested; a failing block only undoes its own statements.
+        """
+        savepoint = None
+        if self.connection.in_transaction:
+            self.savepoint_count += 1
+            savepoint = f"unit_of_work_{self.savepoint_count}"
+            self.cursor.execute(f"SAVEPOINT {savepoint}")
+        else:
+            self.cursor.execute("BEGIN")
+
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if savepoint:
+                self.cursor.execute(f"ROLLBACK TO {savepoint}")
+                self.cursor.execute(f"RELEASE {savepoint}")
+            else:
+                self.connection.rollback()
+            raise
+        finally:
+            self.transaction_depth -= 1
+
+        if savepoint:
+            self.cursor.execute(f"RELEASE {savepoint}")
+        self.commit()
+
+    def commit(self):
+        """
+        Commits the open transaction, or holds it back while the group-commit window is open.
+        """
+        if self.transaction_depth or not self.connection.in_transaction:
+            return
+
+        if self.group_commit_window:
+            if self.pending_commit_since is None:
+                self.pending_commit_since = time.monotonic()
+                if self.on_commit_pending:
+                    self.on_commit_pending(self.group_commit_window)
+            if time.monotonic() - self.pending_commit_since < self.group_commit_window:
+                return
+
+        self.flush()
+
+    def flush(self):
+        """
+        Commits any held back writes immediately.
+        """
+        if self.transaction_depth:
+            return
+        if self.connection.in_transaction:
+            self.connection.commit()
+        self.pending_commit_since = None
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,166 @@
+import hashlib
+import sqlite3
+from datetime import date
+
+from database import STAFF_COLUMNS
+
+
+# Index name: (field, indexed expression). Only active staff must be unique, so leavers can be re-hired,
+# and only filled in values, so any number of records can have no mobile or email.
+UNIQUE_INDEXES = {
+    "idx_staff_unique_mobile": ("mobile", "mobile"),
+    "idx_staff_unique_email": ("email", "lower(trim(email))"),
+}
+
+MERGE_FIELDS = ["name", "mobile", "email", "role", "salary", "joining_date", "address", "remark"]
+
+
+def normalize_mobile(mobile):
+    # Keep the last 10 digits, so "+91 98983-50808" and "9898350808" match
+    return "".join(character for character in mobile or "" if character.isdigit())[-10:]
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def check_unique(db_manager, mobile, email, staff_id=None):
+    """
+    Raises ValueError naming the active staff member who already uses the mobile number or email address.
+    Fields left empty are not checked, since many records may have no mobile or email.
+    """
+    conditions, values = [], [staff_id]
+    if mobile:
+        conditions.append("mobile = ?")
+        values.append(mobile)
+    if normalize_email(email):
+        conditions.append("lower(trim(email)) = ?")
+        values.append(normalize_email(email))
+    if not conditions:
+        return
+
+    for staff_id_found, name, mobile_found in db_manager.fetch_all(
+            f"SELECT id, name, mobile FROM staff WHERE deleted_at IS NULL AND id IS NOT ? "
+            f"AND ({' OR '.join(conditions)}) LIMIT 1", values):
+        field = "Mobile number" if mobile and mobile_found == mobile else "Email address"
+        raise ValueError(f"{field} is already used by {name} (ID {staff_id_found}).")
+
+
+def record_digest(row):
+    # Hash of every field except the id, for spotting rows that were entered twice
+    return hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=16).digest()
+
+
+class StaffDeduplicator:
+    """
+    Keeps mobile numbers and email addresses unique among active staff, and finds and merges existing duplicates.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.ensure_unique_indexes()
+
+    def ensure_unique_indexes(self):
+        """
+        Creates the unique indexes that the current data allows. Returns the fields still holding duplicates.
+        """
+        self.missing_indexes = []
+        existing_indexes = {row[0] for row in self.db_manager.fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for index_name, (field, expression) in UNIQUE_INDEXES.items():
+            if index_name in existing_indexes:
+                continue
+            if self.db_manager.read_only:
+                self.missing_indexes.append(field)
+                continue
+            try:
+                self.db_manager.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON staff ({expression}) "
+                                        f"WHERE deleted_at IS NULL AND {expression} != ''")
+            except sqlite3.IntegrityError:
+                self.missing_indexes.append(field)
+        return self.missing_indexes
+
+    def find_duplicates(self):
+        """
+        Finds groups of active staff that are the same person, in one pass over the table.
+        Each row is keyed on a hash of its whole record and on its normalized mobile and email; rows sharing
+        any key join the same group. Returns [(matched_on, rows)] with each group's rows oldest first.
+        """
+        first_seen = {}
+        parent = {}
+        matched_on = {}
+
+        def find(staff_id):
+            while parent[staff_id] != staff_id:
+                parent[staff_id] = parent[parent[staff_id]]
+                staff_id = parent[staff_id]
+            return staff_id
+
+        cursor = self.db_manager.connection.execute(
+            "SELECT id, name, mobile, email, role, salary, joining_date, address, remark FROM staff "
+            "WHERE deleted_at IS NULL ORDER BY id")
+        for row in cursor:
+            staff_id = row[0]
+            parent[staff_id] = staff_id
+            keys = [("exact", record_digest(row[1:])), ("mobile", normalize_mobile(row[2])),
+                    ("email", normalize_email(row[3]))]
+
+            for key in keys:
+                if not key[1]:
+                    continue
+                other_id = first_seen.setdefault(key, staff_id)
+                if other_id != staff_id:
+                    root, other_root = find(staff_id), find(other_id)
+                    parent[max(root, other_root)] = min(root, other_root)
+                    matched_on.setdefault(other_id, set()).add(key[0])
+                    matched_on.setdefault(staff_id, set()).add(key[0])
+
+        groups = {}
+        for staff_id in matched_on:
+            groups.setdefault(find(staff_id), []).append(staff_id)
+
+        duplicates = []
+        for staff_ids in groups.values():
+            placeholders = ", ".join("?" * len(staff_ids))
+            rows = self.db_manager.fetch_all(f"SELECT {STAFF_COLUMNS} FROM staff WHERE id IN ({placeholders}) "
+                                             f"ORDER BY id", staff_ids)
+            reasons = set().union(*(matched_on[staff_id] for staff_id in staff_ids))
+            duplicates.append((sorted(reasons), rows))
+        return sorted(duplicates, key=lambda group: group[1][0][0])
+
+    def merge(self, keep_id, duplicate_ids):
+        """
+        Merges duplicates into the record being kept: blank fields are filled from the duplicates,
+        their reports move to the kept record, and the duplicates are soft deleted.
+        Returns [(staff_id, row)] for every changed record. Raises ValueError if moving the reports
+        would make the kept record report to itself.
+        """
+        duplicate_ids = [staff_id for staff_id in duplicate_ids if staff_id != keep_id]
+        if not duplicate_ids:
+            return []
+        placeholders = ", ".join("?" * len(duplicate_ids))
+
+        with self.db_manager.transaction():
+            # Delete the duplicates first, so filling in their mobile or email doesn't trip the unique indexes
+            self.db_manager.execute(f"UPDATE staff SET deleted_at = ? WHERE id IN ({placeholders})",
+                                    [date.today().isoformat()] + duplicate_ids)
+
+            assignments = ", ".join(
+                f"{field} = coalesce(nullif({field}, ''), (SELECT duplicate.{field} FROM staff AS duplicate "
+                f"WHERE duplicate.id IN ({placeholders}) AND coalesce(duplicate.{field}, '') != '' "
+                f"ORDER BY duplicate.id LIMIT 1))" for field in MERGE_FIELDS)
+            self.db_manager.execute(f"UPDATE staff SET {assignments} WHERE id = ?",
+                                    duplicate_ids * len(MERGE_FIELDS) + [keep_id])
+
+            columns = [row[1] for row in self.db_manager.fetch_all("PRAGMA table_info(staff)")]
+            if "manager_id" in columns:
+                try:
+                    self.db_manager.execute(f"UPDATE staff SET manager_id = ? WHERE manager_id IN ({placeholders}) "
+                                            f"AND id != ?", [keep_id] + duplicate_ids + [keep_id])
+                except sqlite3.IntegrityError as error:
+                    # The reporting hierarchy trigger refuses a cycle; the whole merge is rolled back
+                    raise ValueError(f"Cannot merge: {error}")
+
+        staff_ids = [keep_id] + duplicate_ids
+        rows = {row[0]: row for row in self.db_manager.fetch_all(
+            f"SELECT {STAFF_COLUMNS} FROM staff WHERE id IN ({', '.join('?' * len(staff_ids))})", staff_ids)}
+        return [(staff_id, rows.get(staff_id)) for staff_id in staff_ids]
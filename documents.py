@@ -0,0 +1,145 @@
+import hashlib
+import mimetypes
+import os
+from datetime import datetime
+
+
+PHOTO = "photo"
+DOCUMENT = "document"
+
+
+class DocumentStore:
+    """
+    Stores staff photos and document scans outside the 'staff' table, so loading the grid never reads them.
+    File contents are kept once per SHA-256 in 'document_blobs' and streamed in and out in chunks
+    with incremental blob I/O, so large scans are never held in memory whole.
+    """
+    def __init__(self, db_manager, chunk_size=64 * 1024):
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def create_schema(db_manager):
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS document_blobs (
+                id INTEGER PRIMARY KEY,
+                sha256 TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS staff_documents (
+                id INTEGER PRIMARY KEY,
+                staff_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                mime_type TEXT,
+                blob_id INTEGER NOT NULL REFERENCES document_blobs (id),
+                added_at TEXT NOT NULL
+            )
+        ''')
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_staff_documents_staff "
+                           "ON staff_documents (staff_id, kind)")
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_staff_documents_blob ON staff_documents (blob_id)")
+
+        # An active staff row removed for good (an undone add) takes its documents with it; contents shared
+        # with someone else's documents are kept. Archived leavers were soft deleted first and keep theirs,
+        # since ids are never reused and a restored record gets its id back.
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_documents_after_staff_delete AFTER DELETE ON staff
+            WHEN old.deleted_at IS NULL
+            BEGIN
+                DELETE FROM document_blobs WHERE id IN (SELECT blob_id FROM staff_documents WHERE staff_id = old.id)
+                    AND NOT EXISTS (SELECT 1 FROM staff_documents WHERE blob_id = document_blobs.id
+                                    AND staff_id != old.id);
+                DELETE FROM staff_documents WHERE staff_id = old.id;
+            END
+        ''')
+
+    def file_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as source_file:
+            for chunk in iter(lambda: source_file.read(self.chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def add(self, staff_id, path, kind=DOCUMENT):
+        """
+        Attaches a file to a staff member and returns the new document id.
+        """
+        sha256 = self.file_digest(path)
+        size = os.path.getsize(path)
+
+        with self.db_manager.transaction():
+            rows = self.db_manager.fetch_all("SELECT id FROM document_blobs WHERE sha256 = ?", (sha256,))
+            if rows:
+                blob_id = rows[0][0]
+            else:
+                # Reserve the space, then stream the file into it
+                self.db_manager.execute("INSERT INTO document_blobs (sha256, size, data) VALUES (?, ?, zeroblob(?))",
+                                        (sha256, size, size))
+                blob_id = self.db_manager.cursor.lastrowid
+                if size:
+                    with open(path, "rb") as source_file, \
+                            self.db_manager.connection.blobopen("document_blobs", "data", blob_id) as blob:
+                        for chunk in iter(lambda: source_file.read(self.chunk_size), b""):
+                            blob.write(chunk)
+
+            self.db_manager.execute(
+                "INSERT INTO staff_documents (staff_id, kind, file_name, mime_type, blob_id, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (staff_id, kind, os.path.basename(path), mimetypes.guess_type(path)[0], blob_id,
+                 datetime.now().isoformat(timespec="seconds"))
+            )
+            return self.db_manager.cursor.lastrowid
+
+    def documents_for(self, staff_id):
+        """
+        Returns (id, kind, file_name, size, added_at) for a staff member's documents, newest first.
+        """
+        return self.db_manager.fetch_all(
+            "SELECT staff_documents.id, kind, file_name, document_blobs.size, added_at FROM staff_documents "
+            "JOIN document_blobs ON document_blobs.id = staff_documents.blob_id "
+            "WHERE staff_id = ? ORDER BY staff_documents.id DESC", (staff_id,))
+
+    def photos_for(self, staff_ids):
+        """
+        Returns {staff_id: blob_id} of the latest photo of each staff member who has one.
+        """
+        if not staff_ids:
+            return {}
+        placeholders = ", ".join("?" * len(staff_ids))
+        return dict(self.db_manager.fetch_all(
+            f"SELECT staff_id, blob_id FROM staff_documents WHERE id IN (SELECT max(id) FROM staff_documents "
+            f"WHERE kind = '{PHOTO}' AND staff_id IN ({placeholders}) GROUP BY staff_id)", list(staff_ids)))
+
+    def export(self, document_id, path):
+        """
+        Writes a document's contents to a file, one chunk at a time.
+        """
+        blob_id = self.db_manager.fetch_all("SELECT blob_id FROM staff_documents WHERE id = ?", (document_id,))[0][0]
+        with open(path, "wb") as target_file:
+            for chunk in read_blob(self.db_manager.connection, blob_id, self.chunk_size):
+                target_file.write(chunk)
+
+    def remove(self, document_id):
+        """
+        Detaches a document, deleting its contents once no other document shares them.
+        """
+        with self.db_manager.transaction():
+            rows = self.db_manager.fetch_all("SELECT blob_id FROM staff_documents WHERE id = ?", (document_id,))
+            if not rows:
+                return
+            self.db_manager.execute("DELETE FROM staff_documents WHERE id = ?", (document_id,))
+            self.db_manager.execute("DELETE FROM document_blobs WHERE id = ? AND NOT EXISTS "
+                                    "(SELECT 1 FROM staff_documents WHERE blob_id = ?)", (rows[0][0], rows[0][0]))
+
+
+def read_blob(connection, blob_id, chunk_size=64 * 1024):
+    """
+    Yields a stored file's contents in chunks. Works on any connection, so background threads can use their own.
+    """
+    with connection.blobopen("document_blobs", "data", blob_id, readonly=True) as blob:
+        for chunk in iter(lambda: blob.read(chunk_size), b""):
+            yield chunk
@@ -0,0 +1,144 @@
+import sqlite3
+
+
+class ReportingHierarchy:
+    """
+    Tracks who reports to whom through 'staff.manager_id' and a closure table holding every
+    (ancestor, descendant) pair, so subtree and chain-of-command queries are single index lookups.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+        if "manager_id" not in columns:
+            db_manager.execute("ALTER TABLE staff ADD COLUMN manager_id INTEGER REFERENCES staff (id)")
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_staff_manager ON staff (manager_id)")
+
+        # Every staff member has a depth 0 row for itself, plus one row per manager above them
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS staff_hierarchy (
+                ancestor_id INTEGER NOT NULL,
+                descendant_id INTEGER NOT NULL,
+                depth INTEGER NOT NULL,
+                PRIMARY KEY (ancestor_id, descendant_id)
+            ) WITHOUT ROWID
+        ''')
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_staff_hierarchy_descendant "
+                           "ON staff_hierarchy (descendant_id, depth)")
+
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_hierarchy_after_insert AFTER INSERT ON staff
+            BEGIN
+                INSERT OR IGNORE INTO staff_hierarchy (ancestor_id, descendant_id, depth) VALUES (new.id, new.id, 0);
+                INSERT OR IGNORE INTO staff_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, new.id, depth + 1 FROM staff_hierarchy WHERE descendant_id = new.manager_id;
+            END
+        ''')
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_hierarchy_before_manager_update BEFORE UPDATE OF manager_id ON staff
+            WHEN new.manager_id IS NOT NULL
+            BEGIN
+                SELECT RAISE(ABORT, 'A staff member cannot report to themselves or to someone who reports to them')
+                WHERE EXISTS (SELECT 1 FROM staff_hierarchy
+                              WHERE ancestor_id = new.id AND descendant_id = new.manager_id);
+            END
+        ''')
+
+        # Moving a staff member moves their whole subtree: drop the old paths into it, then join it to the new manager
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_hierarchy_after_manager_update AFTER UPDATE OF manager_id ON staff
+            WHEN new.manager_id IS NOT old.manager_id
+            BEGIN
+                DELETE FROM staff_hierarchy
+                WHERE descendant_id IN (SELECT descendant_id FROM staff_hierarchy WHERE ancestor_id = new.id)
+                AND ancestor_id NOT IN (SELECT descendant_id FROM staff_hierarchy WHERE ancestor_id = new.id);
+
+                INSERT INTO staff_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+                FROM staff_hierarchy AS above, staff_hierarchy AS below
+                WHERE above.descendant_id = new.manager_id AND below.ancestor_id = new.id;
+            END
+        ''')
+
+        # When a row is removed for good, its reports move up to its own manager
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS staff_hierarchy_after_delete AFTER DELETE ON staff
+            BEGIN
+                UPDATE staff SET manager_id = old.manager_id WHERE manager_id = old.id;
+                DELETE FROM staff_hierarchy WHERE descendant_id = old.id OR ancestor_id = old.id;
+            END
+        ''')
+
+    @staticmethod
+    def build_closure(db_manager):
+        # Build the closure table once from the existing reporting lines
+        if not db_manager.fetch_all("SELECT 1 FROM staff_hierarchy LIMIT 1"):
+            db_manager.execute('''
+                INSERT INTO staff_hierarchy (ancestor_id, descendant_id, depth)
+                WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+                    SELECT id, id, 0 FROM staff
+                    UNION ALL
+                    SELECT staff.manager_id, paths.descendant_id, paths.depth + 1
+                    FROM paths JOIN staff ON staff.id = paths.ancestor_id
+                    WHERE staff.manager_id IS NOT NULL
+                )
+                SELECT ancestor_id, descendant_id, min(depth) FROM paths GROUP BY ancestor_id, descendant_id
+            ''')
+
+    def manager_of(self, staff_id):
+        rows = self.db_manager.fetch_all("SELECT manager_id FROM staff WHERE id = ?", (staff_id,))
+        return rows[0][0] if rows else None
+
+    def set_manager(self, staff_id, manager_id):
+        """
+        Changes who a staff member reports to. Raises ValueError for an unknown manager or a cycle.
+        """
+        if manager_id is not None and not self.db_manager.fetch_all(
+                "SELECT 1 FROM staff WHERE id = ? AND deleted_at IS NULL", (manager_id,)):
+            raise ValueError(f"No active staff member with ID {manager_id}.")
+
+        try:
+            self.db_manager.execute("UPDATE staff SET manager_id = ? WHERE id = ?", (manager_id, staff_id))
+        except sqlite3.IntegrityError as error:
+            raise ValueError(str(error))
+
+    def direct_reports(self, manager_id=None):
+        """
+        Returns (id, name, role, has_reports) for the active staff directly under a manager,
+        or for the top of the organisation when manager_id is None. Staff whose manager has been deleted
+        are shown at the top, so deleting a manager doesn't hide everyone below them.
+        """
+        condition = "staff.manager_id = ?"
+        if manager_id is None:
+            condition = ("(staff.manager_id IS NULL OR staff.manager_id IN "
+                         "(SELECT id FROM staff WHERE deleted_at IS NOT NULL))")
+        return self.db_manager.fetch_all(
+            f"SELECT staff.id, staff.name, staff.role, EXISTS (SELECT 1 FROM staff AS report "
+            f"WHERE report.manager_id = staff.id AND report.deleted_at IS NULL) "
+            f"FROM staff WHERE {condition} AND staff.deleted_at IS NULL ORDER BY staff.name",
+            () if manager_id is None else (manager_id,)
+        )
+
+    def everyone_under(self, manager_id):
+        """
+        Returns (id, name, role, depth) for every active staff member below a manager, nearest first.
+        """
+        return self.db_manager.fetch_all(
+            "SELECT staff.id, staff.name, staff.role, staff_hierarchy.depth FROM staff_hierarchy "
+            "JOIN staff ON staff.id = staff_hierarchy.descendant_id "
+            "WHERE staff_hierarchy.ancestor_id = ? AND staff_hierarchy.depth > 0 AND staff.deleted_at IS NULL "
+            "ORDER BY staff_hierarchy.depth, staff.name", (manager_id,)
+        )
+
+    def chain_of_command(self, staff_id):
+        """
+        Returns (id, name, role, depth) for every manager above a staff member, from the nearest up.
+        """
+        return self.db_manager.fetch_all(
+            "SELECT staff.id, staff.name, staff.role, staff_hierarchy.depth FROM staff_hierarchy "
+            "JOIN staff ON staff.id = staff_hierarchy.ancestor_id "
+            "WHERE staff_hierarchy.descendant_id = ? AND staff_hierarchy.depth > 0 "
+            "ORDER BY staff_hierarchy.depth", (staff_id,)
+        )
@@ -0,0 +1,181 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from database import STAFF_COLUMNS
+
+
+# Number of ids looked up per query when reading row images
+LOOKUP_CHUNK_SIZE = 500
+
+# Columns of a row image: the staff record plus its manager, which the table doesn't show but undo must put back
+IMAGE_COLUMNS = STAFF_COLUMNS + ", manager_id"
+
+
+def table_row(image):
+    # The part of a row image the table shows
+    return image[:-1] if image is not None else None
+
+
+class Change:
+    """
+    One undoable user action: the before and after image of every staff row it touched.
+    Large changes are kept in a temporary file instead of memory.
+    """
+    def __init__(self, label):
+        self.label = label
+        self.staff_ids = []
+        self.rows = []  # (staff_id, before, after)
+        self.row_count = 0
+        self.spill_path = None
+
+    def spill(self):
+        file_descriptor, self.spill_path = tempfile.mkstemp(prefix="staff_undo_", suffix=".pickle")
+        with os.fdopen(file_descriptor, "wb") as spill_file:
+            pickle.dump(self.rows, spill_file)
+        self.rows = None
+
+    def load_rows(self):
+        if self.rows is not None:
+            return self.rows
+        with open(self.spill_path, "rb") as spill_file:
+            return pickle.load(spill_file)
+
+    def discard(self):
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+class ChangeHistory:
+    """
+    Undo/redo stacks for staff edits. Each undo or redo is replayed as one batched transaction.
+    """
+    def __init__(self, db_manager, max_changes=100, max_rows_in_memory=1000):
+        self.db_manager = db_manager
+        self.max_changes = max_changes
+        self.max_rows_in_memory = max_rows_in_memory
+        self.undo_stack = []
+        self.redo_stack = []
+
+        # Called with [(staff_id, row)] after each tracked change is committed
+        self.on_change = None
+
+    def fetch_rows(self, staff_ids):
+        """
+        Returns {staff_id: row} for the given ids, reading them in chunks.
+        """
+        rows = {}
+        for start in range(0, len(staff_ids), LOOKUP_CHUNK_SIZE):
+            chunk = staff_ids[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.db_manager.fetch_all(f"SELECT {IMAGE_COLUMNS} FROM staff WHERE id IN ({placeholders})",
+                                                 chunk):
+                rows[row[0]] = row
+        return rows
+
+    @contextmanager
+    def track(self, label, staff_ids=None):
+        """
+        Records the rows changed inside the block as one undoable change.
+        Ids of rows inserted inside the block should be appended to change.staff_ids.
+        """
+        change = Change(label)
+        change.staff_ids.extend(staff_ids or [])
+
+        with self.db_manager.transaction():
+            before_rows = self.fetch_rows(list(change.staff_ids))
+            yield change
+            after_rows = self.fetch_rows(list(change.staff_ids))
+
+        change.rows = [(staff_id, before_rows.get(staff_id), after_rows.get(staff_id))
+                       for staff_id in change.staff_ids
+                       if before_rows.get(staff_id) != after_rows.get(staff_id)]
+        change.row_count = len(change.rows)
+        if change.row_count:
+            changed_rows = [(staff_id, table_row(after)) for staff_id, before, after in change.rows]
+            self.push(self.undo_stack, change)
+            self.clear(self.redo_stack)
+            if self.on_change:
+                self.on_change(changed_rows)
+
+    def push(self, stack, change):
+        if change.rows is not None and change.row_count > self.max_rows_in_memory:
+            change.spill()
+        stack.append(change)
+
+        # Forget the oldest changes once the history is full
+        while len(stack) > self.max_changes:
+            stack.pop(0).discard()
+
+    def clear(self, stack):
+        for change in stack:
+            change.discard()
+        stack.clear()
+
+    def reset(self):
+        """
+        Forgets every undo and redo step, e.g. once the database they describe has been replaced.
+        """
+        self.clear(self.undo_stack)
+        self.clear(self.redo_stack)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """
+        Puts back the before images of the latest change. Returns [(staff_id, row)] for the grid.
+        Raises ValueError, keeping the change on its stack, if that would break a unique index.
+        """
+        if not self.undo_stack:
+            return []
+        change = self.undo_stack.pop()
+        try:
+            rows = self.replay(change, use_before=True)
+        except sqlite3.IntegrityError as error:
+            self.undo_stack.append(change)
+            raise ValueError(f"Cannot undo {change.label}: {error}")
+        self.push(self.redo_stack, change)
+        return rows
+
+    def redo(self):
+        """
+        Re-applies the after images of the latest undone change. Returns [(staff_id, row)] for the grid.
+        """
+        if not self.redo_stack:
+            return []
+        change = self.redo_stack.pop()
+        try:
+            rows = self.replay(change, use_before=False)
+        except sqlite3.IntegrityError as error:
+            self.redo_stack.append(change)
+            raise ValueError(f"Cannot redo {change.label}: {error}")
+        self.push(self.undo_stack, change)
+        return rows
+
+    def replay(self, change, use_before):
+        rows = change.load_rows()
+        images = [(staff_id, before if use_before else after) for staff_id, before, after in rows]
+
+        columns = IMAGE_COLUMNS.split(", ")
+        placeholders = ", ".join("?" * len(columns))
+        assignments = ", ".join(f"{column} = ?" for column in columns[1:])
+
+        # Plain UPDATE and INSERT rather than an upsert: an upsert's conflict handling would override
+        # the OR REPLACE / OR IGNORE inside the triggers on 'staff' and make them fail
+        with self.db_manager.transaction():
+            self.db_manager.execute_many("DELETE FROM staff WHERE id = ?",
+                                         [(staff_id,) for staff_id, image in images if image is None])
+            self.db_manager.execute_many(f"UPDATE staff SET {assignments} WHERE id = ?",
+                                         [tuple(image[1:]) + (staff_id,) for staff_id, image in images
+                                          if image is not None])
+            self.db_manager.execute_many(f"INSERT INTO staff ({IMAGE_COLUMNS}) SELECT {placeholders} "
+                                         f"WHERE NOT EXISTS (SELECT 1 FROM staff WHERE id = ?)",
+                                         [tuple(image) + (staff_id,) for staff_id, image in images
+                                          if image is not None])
+        return [(staff_id, table_row(image)) for staff_id, image in images]
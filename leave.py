@@ -0,0 +1,100 @@
+import calendar
+from datetime import date
+
+
+LEAVE_KINDS = ["Annual", "Sick", "Unpaid", "Other"]
+
+# A company holiday has no staff member: everyone is away
+HOLIDAY = "Holiday"
+
+
+class LeaveCalendar:
+    """
+    Stores staff leave and company holidays as date ranges. An R*Tree on the ranges, kept up to date
+    by triggers, answers "who is away between A and B" by looking up only the overlapping ranges.
+    Dates are stored as yyyy-MM-dd; the index holds them as day numbers.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS leave (
+                id INTEGER PRIMARY KEY,
+                staff_id INTEGER,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                note TEXT
+            )
+        ''')
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_leave_staff ON leave (staff_id)")
+        db_manager.execute("CREATE VIRTUAL TABLE IF NOT EXISTS leave_index "
+                           "USING rtree_i32(id, first_day, last_day)")
+
+        # julianday() gives whole numbers for dates at noon, so the index holds one integer per day
+        day_range = "new.id, julianday(new.start_date, '+12 hours'), julianday(new.end_date, '+12 hours')"
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS leave_after_insert AFTER INSERT ON leave
+            BEGIN
+                INSERT INTO leave_index (id, first_day, last_day) VALUES ({day_range});
+            END
+        ''')
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS leave_after_update AFTER UPDATE OF start_date, end_date ON leave
+            BEGIN
+                INSERT OR REPLACE INTO leave_index (id, first_day, last_day) VALUES ({day_range});
+            END
+        ''')
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS leave_after_delete AFTER DELETE ON leave
+            BEGIN
+                DELETE FROM leave_index WHERE id = old.id;
+            END
+        ''')
+
+    def add(self, staff_id, start_date, end_date, kind, note=""):
+        """
+        Records leave for a staff member, or a company holiday when staff_id is None. Dates are date objects.
+        Returns the new leave id.
+        """
+        if end_date < start_date:
+            raise ValueError("The leave cannot end before it starts.")
+        if staff_id is not None and any(row[1] == staff_id
+                                        for row in self.overlapping(start_date, end_date, staff_id)):
+            raise ValueError("This staff member already has leave recorded in that period.")
+
+        self.db_manager.execute("INSERT INTO leave (staff_id, start_date, end_date, kind, note) VALUES (?, ?, ?, ?, ?)",
+                                (staff_id, start_date.isoformat(), end_date.isoformat(),
+                                 HOLIDAY if staff_id is None else kind, note))
+        return self.db_manager.cursor.lastrowid
+
+    def remove(self, leave_id):
+        self.db_manager.execute("DELETE FROM leave WHERE id = ?", (leave_id,))
+
+    def overlapping(self, start_date, end_date, staff_id=None):
+        """
+        Returns (id, staff_id, name, start_date, end_date, kind, note) for leave overlapping the period,
+        ordered by start date. Holidays have no staff id or name. Given a staff id, only that member's leave
+        and holidays are returned.
+        """
+        query = ("SELECT leave.id, leave.staff_id, staff.name, leave.start_date, leave.end_date, leave.kind, "
+                 "leave.note FROM leave_index JOIN leave ON leave.id = leave_index.id "
+                 "LEFT JOIN staff ON staff.id = leave.staff_id "
+                 "WHERE leave_index.first_day <= julianday(?, '+12 hours') "
+                 "AND leave_index.last_day >= julianday(?, '+12 hours')")
+        values = [end_date.isoformat(), start_date.isoformat()]
+        if staff_id is not None:
+            query += " AND (leave.staff_id = ? OR leave.staff_id IS NULL)"
+            values.append(staff_id)
+        return self.db_manager.fetch_all(query + " ORDER BY leave.start_date, staff.name", values)
+
+    def is_available(self, staff_id, start_date, end_date=None):
+        return not self.overlapping(start_date, end_date or start_date, staff_id)
+
+    def month(self, year, month):
+        """
+        Returns the leave overlapping one calendar month.
+        """
+        return self.overlapping(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
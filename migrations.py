@@ -0,0 +1,189 @@
+import importlib
+import re
+import sqlite3
+
+
+def create_staff_table(db_manager):
+    db_manager.execute('''
+        CREATE TABLE IF NOT EXISTS staff (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            mobile TEXT,
+            email TEXT,
+            role TEXT,
+            salary REAL,
+            joining_date TEXT,
+            address TEXT,
+            remark TEXT,
+            deleted_at TEXT
+        )
+    ''')
+
+
+def add_deleted_at(db_manager):
+    # Databases made before soft deletes have no 'deleted_at' column
+    columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+    if "deleted_at" not in columns:
+        db_manager.execute("ALTER TABLE staff ADD COLUMN deleted_at TEXT")
+
+
+def step(path):
+    """
+    Returns a migration step calling 'module.Class.method', importing the module only when the step runs.
+    An up to date database then never loads the feature modules (and payroll's NumPy) just to open.
+    """
+    module_name, class_name, method_name = path.split(".")
+
+    def run(db_manager):
+        feature_class = getattr(importlib.import_module(module_name), class_name)
+        getattr(feature_class, method_name)(db_manager)
+    return run
+
+
+def drop_triggers(db_manager, *trigger_names):
+    # CREATE TRIGGER IF NOT EXISTS keeps an old definition, so a changed trigger is dropped and created again
+    for trigger_name in trigger_names:
+        db_manager.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+
+
+def replace_salary_history_triggers(db_manager):
+    drop_triggers(db_manager, "salary_history_after_insert")
+    step("salary_history.SalaryHistory.create_schema")(db_manager)
+
+
+def remove_documents_with_staff(db_manager):
+    step("documents.DocumentStore.create_schema")(db_manager)
+
+
+def keep_documents_of_archived_staff(db_manager):
+    drop_triggers(db_manager, "staff_documents_after_staff_delete")
+    step("documents.DocumentStore.create_schema")(db_manager)
+
+
+def replace_version_trigger(db_manager):
+    drop_triggers(db_manager, "staff_version_after_update")
+    step("versioning.RowVersions.create_schema")(db_manager)
+
+
+def add_sync_tombstones(db_manager):
+    drop_triggers(db_manager, "staff_sync_after_insert", "staff_sync_after_update")
+    step("sync.SyncEngine.create_schema")(db_manager)
+    step("sync.SyncEngine.create_triggers")(db_manager)
+
+
+def never_reuse_staff_ids(db_manager):
+    """
+    Rebuilds the 'staff' table with AUTOINCREMENT, so the id of a removed or archived record is never given
+    to someone new; salary history, documents and the archive all refer to staff by id.
+    """
+    table_sql = db_manager.fetch_all("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'staff'")[0][0]
+    if "AUTOINCREMENT" in table_sql.upper():
+        return  # Branch databases are created with it
+
+    # Dropping the table drops its indexes and triggers, so keep them to create again afterwards
+    dependents = [row[0] for row in db_manager.fetch_all(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'staff' AND type IN ('index', 'trigger') AND sql IS NOT NULL")]
+
+    new_table_sql = re.sub(r"^CREATE TABLE staff\b", "CREATE TABLE staff_autoincrement", table_sql.strip())
+    new_table_sql = re.sub(r"\bid INTEGER PRIMARY KEY\b", "id INTEGER PRIMARY KEY AUTOINCREMENT", new_table_sql, 1)
+    db_manager.execute(new_table_sql)
+    # Copying the rows with their ids starts the sequence after the highest one
+    db_manager.execute("INSERT INTO staff_autoincrement SELECT * FROM staff")
+    db_manager.execute("DROP TABLE staff")
+    # Other tables' triggers still name 'staff', so the rename must not try to rewrite them
+    db_manager.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        db_manager.execute("ALTER TABLE staff_autoincrement RENAME TO staff")
+    finally:
+        db_manager.execute("PRAGMA legacy_alter_table = OFF")
+    for sql in dependents:
+        db_manager.execute(sql)
+
+
+def add_sync_archive_operations(db_manager):
+    drop_triggers(db_manager, "staff_sync_after_insert", "staff_sync_after_delete")
+    step("sync.SyncEngine.create_schema")(db_manager)
+    step("sync.SyncEngine.create_triggers")(db_manager)
+
+
+def milestones_for_real_dates(db_manager):
+    drop_triggers(db_manager, "staff_milestones_after_insert", "staff_milestones_after_update")
+    step("milestones.MilestoneAlerts.create_schema")(db_manager)
+    step("milestones.MilestoneAlerts.clear_invalid")(db_manager)
+
+
+def allow_empty_mobile_and_email(db_manager):
+    # The app creates the unique indexes again without empty values when it next starts
+    db_manager.execute("DROP INDEX IF EXISTS idx_staff_unique_mobile")
+    db_manager.execute("DROP INDEX IF EXISTS idx_staff_unique_email")
+
+
+# Every change to the schema, oldest first: (description, step, batched).
+# Only ever add new steps at the end, since a database's 'user_version' counts the steps it has had.
+# A step runs in one transaction together with the version bump, so it is either fully applied or not at all.
+# Batched steps fill in data in many small transactions instead, and simply carry on where they stopped
+# if the upgrade is interrupted.
+MIGRATIONS = [
+    ("staff table", create_staff_table, False),
+    ("soft delete column", add_deleted_at, False),
+    ("deleted records index", step("archive.StaffArchiver.create_schema"), False),
+    ("salary history", step("salary_history.SalaryHistory.create_schema"), False),
+    ("salary history from current salaries", step("salary_history.SalaryHistory.seed_history"), False),
+    ("reporting hierarchy", step("hierarchy.ReportingHierarchy.create_schema"), False),
+    ("reporting hierarchy from current managers", step("hierarchy.ReportingHierarchy.build_closure"), False),
+    ("attendance", step("attendance.AttendanceLog.create_schema"), False),
+    ("payroll", step("payroll.PayrollEngine.create_schema"), False),
+    ("roles table", step("roles.RoleDirectory.create_schema"), False),
+    ("roles from free text", step("roles.RoleDirectory.migrate"), True),
+    ("role triggers", step("roles.RoleDirectory.create_triggers"), False),
+    ("saved filters and filter indexes", step("query_builder.QueryBuilder.create_schema"), False),
+    ("documents", step("documents.DocumentStore.create_schema"), False),
+    ("row versions", step("versioning.RowVersions.create_schema"), False),
+    ("sync tables", step("sync.SyncEngine.create_schema"), False),
+    ("sync ids for existing rows", step("sync.SyncEngine.backfill_uids"), True),
+    ("sync triggers", step("sync.SyncEngine.create_triggers"), False),
+    ("leave calendar", step("leave.LeaveCalendar.create_schema"), False),
+    ("milestone columns", step("milestones.MilestoneAlerts.create_schema"), False),
+    ("milestones for existing rows", step("milestones.MilestoneAlerts.backfill"), True),
+    ("salary history for removed and reused ids", replace_salary_history_triggers, False),
+    ("documents of removed staff", remove_documents_with_staff, False),
+    ("row versions for visible changes only", replace_version_trigger, False),
+    ("sync tombstones for removed rows", add_sync_tombstones, False),
+    ("staff ids never reused", never_reuse_staff_ids, False),
+    ("documents kept for archived staff", keep_documents_of_archived_staff, False),
+    ("sync archive operations", add_sync_archive_operations, False),
+    ("milestones for real dates only", milestones_for_real_dates, False),
+    ("empty mobile and email not unique", allow_empty_mobile_and_email, False),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(db_manager):
+    return db_manager.fetch_all("PRAGMA user_version")[0][0]
+
+
+def migrate(db_manager):
+    """
+    Brings the database schema up to date. An up to date database costs a single PRAGMA read.
+    Returns the descriptions of the steps that were applied.
+    """
+    version = schema_version(db_manager)
+    if version >= SCHEMA_VERSION:
+        return []
+    if db_manager.read_only:
+        raise sqlite3.OperationalError(f"The database schema is out of date (version {version}, "
+                                       f"needs {SCHEMA_VERSION}). Open it once without --read-only to upgrade it.")
+
+    applied = []
+    for new_version, (description, step, batched) in enumerate(MIGRATIONS[version:], version + 1):
+        if batched:
+            step(db_manager)
+            with db_manager.transaction():
+                db_manager.execute(f"PRAGMA user_version = {new_version}")
+        else:
+            with db_manager.transaction():
+                step(db_manager)
+                db_manager.execute(f"PRAGMA user_version = {new_version}")
+        applied.append(description)
+    return applied
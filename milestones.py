@@ -0,0 +1,121 @@
+import calendar
+from datetime import date, timedelta
+
+from query_builder import BASE_FILTER
+from salary_history import JOINING_DATE_ISO
+
+
+# Months from joining until probation ends
+PROBATION_MONTHS = 6
+
+# Indexes over active staff for the precomputed milestone columns
+MILESTONE_INDEXES = {
+    "idx_staff_active_joining_month_day": "joining_month_day",
+    "idx_staff_active_probation_end": "probation_end",
+}
+
+
+class MilestoneAlerts:
+    """
+    Finds staff with a work anniversary or the end of their probation coming up.
+    'joining_date' is stored as dd-MM-yyyy text, so triggers keep two indexed columns worked out from it:
+    'joining_month_day' (MM-dd) and 'probation_end' (yyyy-MM-dd). Upcoming milestones are then range lookups
+    on those indexes, and their cost does not grow with the number of staff.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+        for column in ("joining_month_day", "probation_end"):
+            if column not in columns:
+                db_manager.execute(f"ALTER TABLE staff ADD COLUMN {column} TEXT")
+        for index_name, column in MILESTONE_INDEXES.items():
+            db_manager.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON staff ({column}) WHERE {BASE_FILTER}")
+
+        set_milestones = MilestoneAlerts.milestone_update("id = new.id")
+        db_manager.execute(f"CREATE TRIGGER IF NOT EXISTS staff_milestones_after_insert AFTER INSERT ON staff "
+                           f"BEGIN {set_milestones}; END")
+        db_manager.execute(f"CREATE TRIGGER IF NOT EXISTS staff_milestones_after_update "
+                           f"AFTER UPDATE OF joining_date ON staff "
+                           f"WHEN new.joining_date IS NOT old.joining_date BEGIN {set_milestones}; END")
+
+    @staticmethod
+    def valid_joining_date():
+        # date() takes '2024-02-31' as it is, but a modifier moves it on to March, so only real dates compare equal
+        joining_date = JOINING_DATE_ISO.format("staff")
+        return f"date({joining_date}, '+0 days') = {joining_date}"
+
+    @staticmethod
+    def milestone_update(where):
+        joining_date = JOINING_DATE_ISO.format("staff")
+        valid = MilestoneAlerts.valid_joining_date()
+        return (f"UPDATE staff SET joining_month_day = CASE WHEN {valid} THEN substr({joining_date}, 6, 5) END, "
+                f"probation_end = CASE WHEN {valid} THEN date({joining_date}, '+{PROBATION_MONTHS} months') END "
+                f"WHERE {where}")
+
+    @staticmethod
+    def backfill(db_manager, batch_size=1000):
+        """
+        Works out the milestone columns for rows from before they existed, in batches.
+        """
+        # Only real dates, or rows left NULL would be picked again forever
+        pending = (f"SELECT id FROM staff WHERE joining_month_day IS NULL "
+                   f"AND {MilestoneAlerts.valid_joining_date()} LIMIT ?")
+        if not db_manager.fetch_all(pending, (1,)):
+            return
+
+        while True:
+            with db_manager.transaction():
+                db_manager.execute(MilestoneAlerts.milestone_update(f"id IN ({pending})"), (batch_size,))
+                if db_manager.cursor.rowcount == 0:
+                    break
+
+    @staticmethod
+    def clear_invalid(db_manager):
+        # Rows filled in before impossible dates such as 31-02-2024 were left out
+        db_manager.execute(MilestoneAlerts.milestone_update(
+            f"joining_month_day IS NOT NULL AND NOT coalesce({MilestoneAlerts.valid_joining_date()}, 0)"))
+
+    def anniversaries(self, days=30, today=None):
+        """
+        Returns (anniversary date, years, staff id, name) for work anniversaries in the next days, soonest first.
+        """
+        today = today or date.today()
+        last_day = today + timedelta(days=days)
+
+        # The window may run over the new year, making it two month-day ranges
+        if last_day.year == today.year:
+            ranges = [(today.strftime("%m-%d"), last_day.strftime("%m-%d"))]
+        else:
+            ranges = [(today.strftime("%m-%d"), "12-31"), ("01-01", last_day.strftime("%m-%d"))]
+
+        upcoming = []
+        for first_month_day, last_month_day in ranges:
+            for staff_id, name, joining_month_day, joining_date in self.db_manager.fetch_all(
+                    f"SELECT id, name, joining_month_day, joining_date FROM staff "
+                    f"WHERE {BASE_FILTER} AND joining_month_day BETWEEN ? AND ?", (first_month_day, last_month_day)):
+                month, day = int(joining_month_day[:2]), int(joining_month_day[3:])
+                year = today.year if joining_month_day >= today.strftime("%m-%d") else today.year + 1
+                if month == 2 and day == 29 and not calendar.isleap(year):
+                    day = 28
+                try:
+                    anniversary = date(year, month, day)
+                except ValueError:
+                    continue  # Not a real day of the year, e.g. from a date edited outside the app
+                years = year - int(joining_date[6:])
+                if years > 0 and today <= anniversary <= last_day:
+                    upcoming.append((anniversary, years, staff_id, name))
+        return sorted(upcoming)
+
+    def probation_endings(self, days=30, today=None):
+        """
+        Returns (probation end date, staff id, name) for probations ending in the next days, soonest first.
+        """
+        today = today or date.today()
+        return [(date.fromisoformat(probation_end), staff_id, name)
+                for probation_end, staff_id, name in self.db_manager.fetch_all(
+                    f"SELECT probation_end, id, name FROM staff WHERE {BASE_FILTER} "
+                    f"AND probation_end BETWEEN ? AND ? ORDER BY probation_end",
+                    (today.isoformat(), (today + timedelta(days=days)).isoformat()))]
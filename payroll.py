@@ -0,0 +1,191 @@
+import calendar
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+
+from database import DatabaseManager
+from salary_history import JOINING_DATE_ISO
+from sharding import BranchShards
+
+
+# Flat deduction rates applied to gross pay; override per run as needed
+DEDUCTION_RATES = {
+    "tax": 0.10,
+    "provident_fund": 0.12,
+}
+
+
+def compute_payroll(salaries, joining_dates, period_start, period_end, deduction_rates):
+    """
+    Computes gross pay, deductions and net pay for one period in vectorized passes.
+    Staff who joined during the period are paid pro rata from their joining day, staff joining later get no days.
+    """
+    period_start = np.datetime64(period_start, "D")
+    period_end = np.datetime64(period_end, "D")
+    days_in_period = (period_end - period_start).astype(int) + 1
+
+    # Days worked: full period, from joining day if they joined mid-period, zero if they join later
+    first_day = np.maximum(joining_dates, period_start)
+    days_worked = np.clip((period_end - first_day).astype(int) + 1, 0, days_in_period)
+
+    gross = np.round(salaries * days_worked / days_in_period, 2)
+    deductions = {name: np.round(gross * rate, 2) for name, rate in deduction_rates.items()}
+    total_deductions = sum(deductions.values(), np.zeros_like(gross))
+    net = gross - total_deductions
+
+    return {"gross": gross, "deductions": total_deductions, "net": net, "days_worked": days_worked}
+
+
+def run_branch(database_path, period, deduction_rates):
+    """
+    Runs payroll on one branch database. Called in a worker process, so it opens its own connection.
+    Returns (totals, skipped staff ids).
+    """
+    db_manager = DatabaseManager(database_path)
+    try:
+        payroll = PayrollEngine(db_manager, deduction_rates)
+        return payroll.run(period), payroll.skipped
+    finally:
+        db_manager.close()
+
+
+class PayrollEngine:
+    """
+    Runs monthly payroll over the active roster with NumPy and stores the results in one bulk transaction.
+    """
+    def __init__(self, db_manager, deduction_rates=None):
+        self.db_manager = db_manager
+        self.deduction_rates = DEDUCTION_RATES if deduction_rates is None else deduction_rates
+        self.skipped = []  # Staff ids left out of the last run because their joining date is not a real date
+
+    @staticmethod
+    def create_schema(db_manager):
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS payroll_runs (
+                id INTEGER PRIMARY KEY,
+                period TEXT NOT NULL UNIQUE,
+                created_at TEXT NOT NULL,
+                headcount INTEGER NOT NULL,
+                total_gross REAL NOT NULL,
+                total_deductions REAL NOT NULL,
+                total_net REAL NOT NULL
+            )
+        ''')
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS payroll (
+                run_id INTEGER NOT NULL,
+                staff_id INTEGER NOT NULL,
+                days_worked INTEGER NOT NULL,
+                gross REAL NOT NULL,
+                deductions REAL NOT NULL,
+                net REAL NOT NULL,
+                PRIMARY KEY (run_id, staff_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def load_roster(self, group_by=None):
+        """
+        Loads the active roster into one NumPy array per column.
+        Staff whose joining date is shaped like a date but does not exist (e.g. 31-02-2024) are left out
+        and listed in 'skipped'.
+        """
+        # Missing or malformed joining dates count as having joined long ago. Dates that do not exist come back
+        # NULL, as date() moves them on to the next month when given a modifier.
+        joining_date = JOINING_DATE_ISO.format("staff")
+        group_column = f", {group_by}" if group_by else ""
+        rows = self.db_manager.fetch_all(
+            f"SELECT id, coalesce(salary, 0), CASE WHEN {joining_date} IS NULL THEN '1970-01-01' "
+            f"WHEN date({joining_date}, '+0 days') = {joining_date} THEN {joining_date} END{group_column} "
+            f"FROM staff WHERE deleted_at IS NULL"
+        )
+        columns = list(zip(*rows)) if rows else [(), (), ()] + ([()] if group_by else [])
+
+        staff_ids = np.array(columns[0], dtype=np.int64)
+        joining_dates = np.array(columns[2], dtype="datetime64[D]")
+        valid = ~np.isnat(joining_dates)
+        self.skipped = staff_ids[~valid].tolist()
+
+        roster = {
+            "staff_id": staff_ids[valid],
+            "salary": np.array(columns[1], dtype=np.float64)[valid],
+            "joining_date": joining_dates[valid],
+        }
+        if group_by:
+            roster["group"] = np.array([str(value) for value in columns[3]], dtype=object)[valid]
+        return roster
+
+    def run(self, period, group_by=None, workers=None):
+        """
+        Runs payroll for a yyyy-MM period and stores the results, replacing any earlier run for it.
+        When group_by names a staff column, each group is computed in its own worker process.
+        Only staff with days worked in the period are paid and counted.
+        Returns (headcount, total gross, total deductions, total net).
+        """
+        year, month = int(period[:4]), int(period[5:7])
+        period_start = date(year, month, 1).isoformat()
+        period_end = date(year, month, calendar.monthrange(year, month)[1]).isoformat()
+
+        roster = self.load_roster(group_by)
+
+        if group_by and len(roster["staff_id"]):
+            results = self.run_groups(roster, period_start, period_end, workers)
+        else:
+            results = compute_payroll(roster["salary"], roster["joining_date"], period_start, period_end,
+                                      self.deduction_rates)
+            results["staff_id"] = roster["staff_id"]
+
+        # Staff joining after the period are not on this payroll at all
+        paid = results["days_worked"] > 0
+        return self.save(period, {key: values[paid] for key, values in results.items()})
+
+    def run_groups(self, roster, period_start, period_end, workers):
+        groups = {name: np.flatnonzero(roster["group"] == name) for name in np.unique(roster["group"])}
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(compute_payroll, roster["salary"][indexes],
+                                             roster["joining_date"][indexes], period_start, period_end,
+                                             self.deduction_rates)
+                       for name, indexes in groups.items()}
+            group_results = {name: future.result() for name, future in futures.items()}
+
+        order = list(groups)
+        results = {key: np.concatenate([group_results[name][key] for name in order])
+                   for key in ("gross", "deductions", "net", "days_worked")}
+        results["staff_id"] = np.concatenate([roster["staff_id"][groups[name]] for name in order])
+        return results
+
+    @staticmethod
+    def run_branches(period, shards=None, deduction_rates=None, workers=None):
+        """
+        Runs payroll for every branch database, each branch in its own worker process, and stores each
+        branch's results in that branch's database. Returns {branch: (totals, skipped staff ids)}.
+        """
+        shards = shards or BranchShards()
+        deduction_rates = DEDUCTION_RATES if deduction_rates is None else deduction_rates
+        branches = shards.branches()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {branch: executor.submit(run_branch, shards.branch_path(branch), period, deduction_rates)
+                       for branch in branches}
+            return {branch: future.result() for branch, future in futures.items()}
+
+    def save(self, period, results):
+        totals = (len(results["staff_id"]), round(float(results["gross"].sum()), 2),
+                  round(float(results["deductions"].sum()), 2), round(float(results["net"].sum()), 2))
+
+        with self.db_manager.transaction():
+            self.db_manager.execute("DELETE FROM payroll WHERE run_id IN "
+                                    "(SELECT id FROM payroll_runs WHERE period = ?)", (period,))
+            self.db_manager.execute("DELETE FROM payroll_runs WHERE period = ?", (period,))
+            self.db_manager.execute(
+                "INSERT INTO payroll_runs (period, created_at, headcount, total_gross, total_deductions, total_net) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (period, datetime.now().isoformat(timespec="seconds")) + totals
+            )
+            run_id = self.db_manager.cursor.lastrowid
+            self.db_manager.execute_many(
+                "INSERT INTO payroll (run_id, staff_id, days_worked, gross, deductions, net) VALUES (?, ?, ?, ?, ?, ?)",
+                zip([run_id] * totals[0], results["staff_id"].tolist(), results["days_worked"].tolist(),
+                    results["gross"].tolist(), results["deductions"].tolist(), results["net"].tolist())
+            )
+
+        return totals
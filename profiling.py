@@ -0,0 +1,88 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+
+PROFILE_DIRECTORY = "profiles"
+
+
+class ActionProfiler:
+    """
+    Runs UI actions under cProfile and writes one report per run, slowest calls first.
+    """
+    def __init__(self, report_dir=PROFILE_DIRECTORY, top_calls=40):
+        self.report_dir = report_dir
+        self.top_calls = top_calls
+
+    def wrap(self, action_name, function):
+        """
+        Returns a slot that profiles every call of a function taking no arguments.
+        """
+        return lambda: self.run(action_name, function)
+
+    def run(self, action_name, function, *args):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profiler.runcall(function, *args)
+        finally:
+            self.write_report(action_name, profiler, time.perf_counter() - started)
+
+    def write_report(self, action_name, profiler, elapsed):
+        os.makedirs(self.report_dir, exist_ok=True)
+        report_path = os.path.join(self.report_dir,
+                                   f"{action_name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.txt")
+
+        report = io.StringIO()
+        report.write(f"{action_name} took {elapsed:.3f}s\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.top_calls)
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            report_file.write(report.getvalue())
+        return report_path
+
+
+class EventLoopWatchdog:
+    """
+    Watches the GUI thread from a background thread. The GUI thread calls heartbeat() from a timer;
+    when no heartbeat arrives for longer than the threshold, the GUI thread's stack is logged once per stall.
+    """
+    def __init__(self, threshold=0.5, log_path=os.path.join(PROFILE_DIRECTORY, "watchdog.log")):
+        self.threshold = threshold
+        self.log_path = log_path
+        self.gui_thread_id = threading.get_ident()
+        self.last_heartbeat = time.monotonic()
+        self.stall_logged = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.watch, name="event-loop-watchdog", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def heartbeat(self):
+        if self.stall_logged:
+            self.log(f"GUI thread responsive again after {time.monotonic() - self.last_heartbeat:.3f}s\n")
+        self.last_heartbeat = time.monotonic()
+        self.stall_logged = False
+
+    def watch(self):
+        while not self.stopped.wait(self.threshold / 4):
+            blocked_for = time.monotonic() - self.last_heartbeat
+            if blocked_for > self.threshold and not self.stall_logged:
+                self.stall_logged = True
+                frame = sys._current_frames().get(self.gui_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "(no stack)\n"
+                self.log(f"GUI thread blocked for {blocked_for:.3f}s:\n{stack}")
+
+    def log(self, message):
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            log_file.write(f"[{datetime.now().isoformat(timespec='milliseconds')}] {message}")
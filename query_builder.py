@@ -0,0 +1,176 @@
+import json
+from datetime import datetime
+
+from salary_history import JOINING_DATE_ISO
+
+
+# Index expressions cannot name the table, so use the joining date expression unqualified
+JOINING_DATE = JOINING_DATE_ISO.replace("{0}.", "")
+
+# Field label: (SQL expression, value type)
+FIELDS = {
+    "Name": ("name", "text"),
+    "Mobile": ("mobile", "text"),
+    "Email": ("email", "text"),
+    "Role": ("role_id", "role"),
+    "Salary": ("salary", "number"),
+    "Joining Year": (f"substr({JOINING_DATE}, 1, 4)", "year"),
+    "Joining Date": (JOINING_DATE, "date"),
+    "Address": ("address", "text"),
+    "Remark": ("remark", "text"),
+}
+
+# Operator label: SQL template, where {0} is the field expression
+OPERATORS = {
+    "equals": "{0} = ?",
+    "not equals": "{0} IS NOT ?",
+    "less than": "{0} < ?",
+    "at most": "{0} <= ?",
+    "greater than": "{0} > ?",
+    "at least": "{0} >= ?",
+    "between": "{0} BETWEEN ? AND ?",
+    "one of": "{0} IN ({1})",
+    "starts with": "{0} >= ? AND {0} < ?",
+    "contains": "{0} LIKE ? ESCAPE '\\'",
+    "is empty": "coalesce({0}, '') = ''",
+    "is not empty": "coalesce({0}, '') != ''",
+}
+
+# Active staff only; written exactly like the partial indexes' WHERE clause so the planner can use them
+BASE_FILTER = "deleted_at IS NULL"
+
+# Partial indexes for the fields people filter on most
+FILTER_INDEXES = {
+    "idx_staff_active_role": "role",
+    "idx_staff_active_role_id": "role_id",
+    "idx_staff_active_salary": "salary",
+    "idx_staff_active_joining_year": FIELDS["Joining Year"][0],
+    "idx_staff_active_joining_date": FIELDS["Joining Date"][0],
+}
+
+
+class QueryBuilder:
+    """
+    Compiles structured staff filters into parameterized SQL and stores them by name.
+    A filter is {"match": "all" or "any", "conditions": [...]}, where each condition is either
+    {"field", "operator", "value"} or another filter, so AND/OR groups can nest.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS saved_filters (
+                name TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                saved_at TEXT NOT NULL
+            )
+        ''')
+        for index_name, expression in FILTER_INDEXES.items():
+            db_manager.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON staff ({expression}) "
+                               f"WHERE {BASE_FILTER}")
+
+    def compile(self, definition):
+        """
+        Returns (where clause, parameters) for a filter. Raises ValueError for a bad field, operator or value.
+        """
+        where, parameters = self.compile_group(definition)
+        return (f"{BASE_FILTER} AND ({where})" if where else BASE_FILTER), parameters
+
+    def compile_group(self, group):
+        joiner = {"all": " AND ", "any": " OR "}.get(group.get("match", "all"))
+        if joiner is None:
+            raise ValueError(f"Unknown match type: {group.get('match')}")
+
+        clauses = []
+        parameters = []
+        for condition in group.get("conditions", []):
+            if "conditions" in condition:
+                clause, condition_parameters = self.compile_group(condition)
+            else:
+                clause, condition_parameters = self.compile_condition(condition)
+            if clause:
+                clauses.append(f"({clause})")
+                parameters += condition_parameters
+        return joiner.join(clauses), parameters
+
+    def compile_condition(self, condition):
+        field, operator, value = condition.get("field"), condition.get("operator"), condition.get("value", "")
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown operator: {operator}")
+        expression, value_type = FIELDS[field]
+        if value_type == "role" and operator not in ("equals", "not equals", "one of", "is empty", "is not empty"):
+            # Roles are matched by id; partial matches fall back to the role text
+            expression, value_type = "role", "text"
+
+        if operator in ("is empty", "is not empty"):
+            return OPERATORS[operator].format(expression), []
+        if operator == "contains":
+            escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            return OPERATORS[operator].format(expression), [f"%{escaped}%"]
+        if operator == "starts with":
+            # Salaries and dates do not sort as text, so a text range would match the wrong rows
+            if value_type != "text":
+                raise ValueError(f"{field} cannot use 'starts with'; use between instead.")
+            # A range instead of LIKE, so the index can be used; case sensitive
+            return OPERATORS[operator].format(expression), [str(value), str(value) + "\U0010ffff"]
+
+        values = [self.convert_value(part.strip(), field, value_type) for part in str(value).split(",")]
+        if operator == "between":
+            if len(values) != 2:
+                raise ValueError(f"{field} between needs two values separated by a comma.")
+            return OPERATORS[operator].format(expression), values
+        if operator == "one of":
+            return OPERATORS[operator].format(expression, ", ".join("?" * len(values))), values
+        if len(values) != 1:
+            raise ValueError(f"{field} {operator} takes a single value.")
+        return OPERATORS[operator].format(expression), values
+
+    def convert_value(self, value, field, value_type):
+        try:
+            if value_type == "number":
+                return float(value)
+            if value_type == "year":
+                return f"{int(value):04d}"
+            if value_type == "role":
+                # Unknown roles match nothing (ids start at 1)
+                rows = self.db_manager.fetch_all("SELECT id FROM roles WHERE name = ?", (value,))
+                return rows[0][0] if rows else 0
+            if value_type == "date":
+                # Entered as dd-MM-yyyy like everywhere else, compared as yyyy-MM-dd
+                return datetime.strptime(value, "%d-%m-%Y").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Invalid value for {field}: {value}")
+        return value
+
+    def explain(self, where, parameters):
+        """
+        Returns the query plan lines for a compiled filter, and whether any of them reads every active row.
+        """
+        plan = [row[3] for row in self.db_manager.fetch_all(
+            f"EXPLAIN QUERY PLAN SELECT id FROM staff WHERE {where}", parameters)]
+        return plan, any(line.startswith("SCAN") for line in plan)
+
+    def count(self, where, parameters):
+        return self.db_manager.fetch_all(f"SELECT count(*) FROM staff WHERE {where}", parameters)[0][0]
+
+    def saved_filters(self):
+        return [row[0] for row in self.db_manager.fetch_all("SELECT name FROM saved_filters ORDER BY name")]
+
+    def load(self, name):
+        rows = self.db_manager.fetch_all("SELECT definition FROM saved_filters WHERE name = ?", (name,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def save(self, name, definition):
+        # Compiling first makes sure only valid filters are saved
+        self.compile(definition)
+        self.db_manager.execute("INSERT INTO saved_filters (name, definition, saved_at) VALUES (?, ?, ?) "
+                                "ON CONFLICT (name) DO UPDATE SET definition = excluded.definition, "
+                                "saved_at = excluded.saved_at",
+                                (name, json.dumps(definition), datetime.now().isoformat(timespec="seconds")))
+
+    def delete(self, name):
+        self.db_manager.execute("DELETE FROM saved_filters WHERE name = ?", (name,))
@@ -0,0 +1,103 @@
+import html
+import os
+import sqlite3
+from datetime import datetime
+
+from database import READ_ONLY_MMAP_SIZE
+
+
+REPORT_DIRECTORY = "reports"
+
+# Report name: (title, column headers, query)
+REPORTS = {
+    "roster": (
+        "Staff Roster",
+        ["ID", "Name", "Mobile", "Email", "Role", "Salary", "Joining Date"],
+        "SELECT id, name, mobile, email, role, salary, joining_date FROM staff WHERE deleted_at IS NULL "
+        "ORDER BY name"
+    ),
+    "headcount": (
+        "Headcount by Role",
+        ["Role", "Headcount"],
+        "SELECT coalesce(roles.name, ''), count(*) FROM staff LEFT JOIN roles ON roles.id = staff.role_id "
+        "WHERE staff.deleted_at IS NULL GROUP BY staff.role_id ORDER BY count(*) DESC, roles.name"
+    ),
+    "salary": (
+        "Salary Summary by Role",
+        ["Role", "Headcount", "Minimum", "Average", "Maximum", "Total"],
+        "SELECT coalesce(roles.name, ''), count(*), min(salary), round(avg(salary), 2), max(salary), sum(salary) "
+        "FROM staff LEFT JOIN roles ON roles.id = staff.role_id WHERE staff.deleted_at IS NULL "
+        "GROUP BY staff.role_id ORDER BY sum(salary) DESC, roles.name"
+    ),
+}
+
+
+class ReportGenerator:
+    """
+    Renders reports to HTML by streaming rows from the database, so memory use stays flat for any roster size.
+    Opens its own read-only connection, so it can run from a background thread.
+    """
+    def __init__(self, database_path, output_dir=REPORT_DIRECTORY, progress_interval=1000):
+        self.database_path = database_path
+        self.output_dir = output_dir
+        self.progress_interval = progress_interval
+
+    def generate(self, report_name, progress=None):
+        """
+        Writes the report and returns the path of the HTML file.
+        """
+        title, headers, query = REPORTS[report_name]
+        os.makedirs(self.output_dir, exist_ok=True)
+        report_path = os.path.join(self.output_dir, f"{report_name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.html")
+
+        connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+        try:
+            # One read transaction, so the count and the rows come from the same snapshot;
+            # with write-ahead logging it never blocks writers however long the report takes
+            connection.execute(f"PRAGMA mmap_size = {READ_ONLY_MMAP_SIZE}")
+            connection.execute("BEGIN")
+            total = connection.execute(f"SELECT count(*) FROM ({query})").fetchone()[0]
+
+            # Write to a temporary file so a half written report is never picked up
+            with open(report_path + ".part", "w", encoding="utf-8") as report_file:
+                report_file.write(f"<html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>"
+                                  f"<h1>{html.escape(title)}</h1>"
+                                  f"<p>Generated {datetime.now().strftime('%d-%m-%Y %H:%M')}</p>"
+                                  f"<table border='1' cellspacing='0' cellpadding='4'><tr>")
+                report_file.write("".join(f"<th>{html.escape(header)}</th>" for header in headers) + "</tr>\n")
+
+                for row_num, row in enumerate(connection.execute(query), start=1):
+                    report_file.write("<tr>" + "".join(f"<td>{html.escape('' if value is None else str(value))}</td>"
+                                                       for value in row) + "</tr>\n")
+                    if progress and row_num % self.progress_interval == 0:
+                        progress(row_num, total)
+
+                report_file.write("</table></body></html>\n")
+        finally:
+            connection.close()
+
+        os.replace(report_path + ".part", report_path)
+        if progress:
+            progress(total, total)
+        return report_path
+
+
+class ReportCache:
+    """
+    Remembers generated report files by report, format and database change version,
+    so asking again for a report on unchanged data returns the existing file.
+    """
+    def __init__(self):
+        self.reports = {}
+
+    def get(self, report_name, report_format, change_version):
+        cached = self.reports.get((report_name, report_format))
+        if cached and cached[0] == change_version and os.path.exists(cached[1]):
+            return cached[1]
+        return None
+
+    def put(self, report_name, report_format, change_version, report_path):
+        self.reports[(report_name, report_format)] = (change_version, report_path)
+
+    def clear(self):
+        self.reports.clear()
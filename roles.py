@@ -0,0 +1,81 @@
+class RoleDirectory:
+    """
+    Keeps job roles in a 'roles' table referenced by 'staff.role_id'. Spellings that differ only in case
+    share one role. Triggers fill in 'role_id' from the role text on every write, so existing code that writes
+    'role' keeps working, and 'role' always holds the role's canonical spelling.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.cache_version = None
+        self.roles = {}
+
+    @staticmethod
+    def create_schema(db_manager):
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS roles (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE
+            )
+        ''')
+        columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+        if "role_id" not in columns:
+            db_manager.execute("ALTER TABLE staff ADD COLUMN role_id INTEGER REFERENCES roles (id)")
+
+    @staticmethod
+    def migrate(db_manager, batch_size=1000):
+        """
+        Moves free text roles into the roles table in batches, keeping the most common spelling of each.
+        """
+        if not db_manager.fetch_all("SELECT 1 FROM staff WHERE role_id IS NULL AND trim(role) != '' LIMIT 1"):
+            return
+
+        with db_manager.transaction():
+            db_manager.execute("INSERT OR IGNORE INTO roles (name) SELECT trim(role) FROM staff "
+                               "WHERE trim(role) != '' GROUP BY trim(role) ORDER BY count(*) DESC, trim(role)")
+
+        while True:
+            with db_manager.transaction():
+                db_manager.execute(
+                    "UPDATE staff SET (role_id, role) = (SELECT id, name FROM roles WHERE name = trim(staff.role)) "
+                    "WHERE id IN (SELECT id FROM staff WHERE role_id IS NULL AND trim(role) != '' LIMIT ?)",
+                    (batch_size,))
+                if db_manager.cursor.rowcount == 0:
+                    break
+
+    @staticmethod
+    def create_triggers(db_manager):
+        # Intern the role text, then point the row at it; a blank role clears 'role_id'
+        intern_role = '''
+            INSERT OR IGNORE INTO roles (name) SELECT trim(new.role) WHERE trim(new.role) != '';
+            UPDATE staff SET (role_id, role) = (SELECT id, name FROM roles WHERE name = trim(new.role))
+            WHERE id = new.id AND trim(new.role) != '';
+            UPDATE staff SET role_id = NULL WHERE id = new.id AND coalesce(trim(new.role), '') = '';
+        '''
+        db_manager.execute(f"CREATE TRIGGER IF NOT EXISTS staff_role_after_insert AFTER INSERT ON staff "
+                           f"BEGIN {intern_role} END")
+        db_manager.execute(f"CREATE TRIGGER IF NOT EXISTS staff_role_after_update AFTER UPDATE OF role ON staff "
+                           f"WHEN new.role IS NOT old.role BEGIN {intern_role} END")
+
+    def refresh(self):
+        # Reload the lookup only when the database has changed since it was cached
+        change_version = self.db_manager.change_version()
+        if change_version != self.cache_version:
+            self.roles = {name.lower(): (role_id, name)
+                          for role_id, name in self.db_manager.fetch_all("SELECT id, name FROM roles ORDER BY name")}
+            self.cache_version = change_version
+
+    def clear(self):
+        # Reload the lookup on next use even if the change version looks the same
+        self.cache_version = None
+
+    def names(self):
+        self.refresh()
+        return [name for role_id, name in self.roles.values()]
+
+    def lookup(self, name):
+        """
+        Returns the id of a role by name, ignoring case and surrounding spaces, or None.
+        """
+        self.refresh()
+        role = self.roles.get((name or "").strip().lower())
+        return role[0] if role else None
@@ -0,0 +1,122 @@
+# 'joining_date' is stored as dd-MM-yyyy; history dates are stored as yyyy-MM-dd so they sort as text.
+# Joining dates in any other format give NULL.
+JOINING_DATE_ISO = "CASE WHEN {0}.joining_date GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]' " \
+                   "THEN substr({0}.joining_date, 7, 4) || '-' || substr({0}.joining_date, 4, 2) || '-' || " \
+                   "substr({0}.joining_date, 1, 2) END"
+TODAY = "date('now', 'localtime')"
+
+
+class SalaryHistory:
+    """
+    Keeps an effective-dated history of every staff salary, maintained by triggers on the 'staff' table.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        # A row is in effect from 'valid_from' up to, but not including, 'valid_to' (NULL while current)
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS salary_history (
+                id INTEGER PRIMARY KEY,
+                staff_id INTEGER NOT NULL,
+                salary REAL NOT NULL,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT
+            )
+        ''')
+
+        # One employee's history, newest first, without touching other employees
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_salary_history_staff "
+                           "ON salary_history (staff_id, valid_from)")
+        # Covering index so a whole-roster "as of" query never reads the table itself
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_salary_history_period "
+                           "ON salary_history (valid_from, valid_to, staff_id, salary)")
+
+        # A new record counts from its joining date. An id with history already (a redone add, an archived record
+        # brought back, or an id an older database reused) counts from today, so it never overlaps the earlier rows.
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS salary_history_after_insert AFTER INSERT ON staff
+            WHEN new.salary IS NOT NULL AND new.deleted_at IS NULL
+            BEGIN
+                UPDATE salary_history SET valid_to = {TODAY} WHERE staff_id = new.id AND valid_to IS NULL;
+                INSERT INTO salary_history (staff_id, salary, valid_from)
+                VALUES (new.id, new.salary, CASE WHEN EXISTS (SELECT 1 FROM salary_history WHERE staff_id = new.id)
+                                            THEN {TODAY} ELSE coalesce({JOINING_DATE_ISO.format('new')}, {TODAY}) END);
+            END
+        ''')
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS salary_history_after_salary_update AFTER UPDATE OF salary ON staff
+            WHEN new.salary IS NOT old.salary AND new.deleted_at IS NULL
+            BEGIN
+                UPDATE salary_history SET valid_to = {TODAY} WHERE staff_id = new.id AND valid_to IS NULL;
+                INSERT INTO salary_history (staff_id, salary, valid_from) VALUES (new.id, new.salary, {TODAY});
+            END
+        ''')
+
+        # Leavers stop counting towards payroll from their deletion date, and count again if brought back
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS salary_history_after_delete_update AFTER UPDATE OF deleted_at ON staff
+            WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL
+            BEGIN
+                UPDATE salary_history SET valid_to = new.deleted_at WHERE staff_id = new.id AND valid_to IS NULL;
+            END
+        ''')
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS salary_history_after_restore_update AFTER UPDATE OF deleted_at ON staff
+            WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL AND new.salary IS NOT NULL
+            BEGIN
+                INSERT INTO salary_history (staff_id, salary, valid_from) VALUES (new.id, new.salary, {TODAY});
+            END
+        ''')
+
+        # A row removed while still active (an undone add, a merged duplicate) was never really on payroll.
+        # Archived leavers were soft deleted first, so their history is already closed and is kept.
+        db_manager.execute('''
+            CREATE TRIGGER IF NOT EXISTS salary_history_after_delete AFTER DELETE ON staff
+            BEGIN
+                DELETE FROM salary_history WHERE staff_id = old.id AND valid_to IS NULL;
+            END
+        ''')
+
+    @staticmethod
+    def seed_history(db_manager):
+        # Seed the history once from the salaries already in the 'staff' table
+        if not db_manager.fetch_all("SELECT 1 FROM salary_history LIMIT 1"):
+            db_manager.execute(
+                f"INSERT INTO salary_history (staff_id, salary, valid_from, valid_to) "
+                f"SELECT id, salary, coalesce({JOINING_DATE_ISO.format('staff')}, {TODAY}), deleted_at "
+                f"FROM staff WHERE salary IS NOT NULL"
+            )
+
+    def history_for(self, staff_id):
+        """
+        Returns (valid_from, valid_to, salary) rows for one employee, newest first.
+        """
+        return self.db_manager.fetch_all("SELECT valid_from, valid_to, salary FROM salary_history "
+                                         "WHERE staff_id = ? AND valid_to IS NOT valid_from "
+                                         "ORDER BY valid_from DESC, id DESC", (staff_id,))
+
+    def salary_as_of(self, staff_id, as_of):
+        """
+        Returns the salary one employee was on at the given yyyy-MM-dd date, or None.
+        """
+        rows = self.db_manager.fetch_all("SELECT salary FROM salary_history WHERE staff_id = ? AND valid_from <= ? "
+                                         "AND (valid_to IS NULL OR valid_to > ?) ORDER BY valid_from DESC, id DESC "
+                                         "LIMIT 1", (staff_id, as_of, as_of))
+        return rows[0][0] if rows else None
+
+    def roster_as_of(self, as_of):
+        """
+        Returns (staff_id, salary) for everyone on payroll at the given yyyy-MM-dd date.
+        """
+        return self.db_manager.fetch_all("SELECT staff_id, salary FROM salary_history "
+                                         "WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)", (as_of, as_of))
+
+    def payroll_as_of(self, as_of):
+        """
+        Returns (headcount, total salary) for the given yyyy-MM-dd date.
+        """
+        return self.db_manager.fetch_all("SELECT count(*), coalesce(sum(salary), 0) FROM salary_history "
+                                         "WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)",
+                                         (as_of, as_of))[0]
@@ -0,0 +1,80 @@
+import string
+from collections import OrderedDict
+
+
+# LIKE ignores case for ASCII letters only, so fold exactly those
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# Characters LIKE treats as wildcards; queries with them are never answered from another query's results
+LIKE_WILDCARDS = "%_"
+
+
+def fold_case(text):
+    return (text or "").translate(ASCII_LOWER)
+
+
+class SearchCache:
+    """
+    Remembers the results of recent staff name searches, for as long as the database is unchanged.
+    Typing more of a name ("ra", "raj", "rajesh") only narrows the results, so a query that extends
+    a cached one is answered by filtering the cached rows instead of searching the database again.
+    """
+    def __init__(self, db_manager, search, max_entries=32):
+        self.db_manager = db_manager
+        self.search = search  # Called as search(name, include_archive) on a cache miss
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.cache_version = None
+        self.hits = 0
+        self.refinements = 0
+        self.misses = 0
+
+    def get(self, name, include_archive=False):
+        # Any write may change the results, so start over when the database has changed
+        change_version = self.db_manager.change_version()
+        if change_version != self.cache_version:
+            self.entries.clear()
+            self.cache_version = change_version
+
+        key = (fold_case(name), include_archive)
+        rows = self.entries.get(key)
+        if rows is not None:
+            self.hits += 1
+        else:
+            rows = self.refine(*key)
+            if rows is not None:
+                self.refinements += 1
+            else:
+                self.misses += 1
+                rows = self.search(name, include_archive)
+
+        self.entries[key] = rows
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return rows
+
+    def clear(self):
+        self.entries.clear()
+        self.cache_version = None
+
+    def refine(self, folded_name, include_archive):
+        """
+        Filters the smallest cached result whose query is part of this one. Returns None if there is none.
+        """
+        if any(wildcard in folded_name for wildcard in LIKE_WILDCARDS):
+            return None
+
+        superset = None
+        for (cached_name, cached_archive), cached_rows in self.entries.items():
+            if cached_archive == include_archive and cached_name in folded_name \
+                    and not any(wildcard in cached_name for wildcard in LIKE_WILDCARDS) \
+                    and (superset is None or len(cached_rows) < len(superset)):
+                superset = cached_rows
+        if superset is None:
+            return None
+        return [row for row in superset if folded_name in fold_case(row[1])]
+
+    def hit_rate(self):
+        lookups = self.hits + self.refinements + self.misses
+        return (self.hits + self.refinements) / lookups if lookups else 0.0
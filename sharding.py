@@ -0,0 +1,119 @@
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from backup import BACKUP_DIRECTORY
+from database import STAFF_COLUMNS
+
+
+BRANCH_DIRECTORY = "branches"
+ARCHIVE_SUFFIX = "_archive"
+
+# Each branch hands out staff ids from its own block, so ids stay unique across all branch databases
+ID_BLOCK_SIZE = 1000000000
+
+
+class BranchShards:
+    """
+    Keeps one staff database per branch, e.g. branches/north.db, so each branch writes to its own file
+    instead of every branch queuing for the write lock of a single database.
+    Queries across all branches run on every branch file in parallel and merge the results.
+    Each branch also has its own archive, branches/north_archive.db, and its own backups, backups/north/.
+    """
+    def __init__(self, directory=BRANCH_DIRECTORY, max_workers=4):
+        self.directory = directory
+        self.max_workers = max_workers
+
+    def branch_path(self, branch):
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", branch or ""):
+            raise ValueError("Branch names may only contain letters, digits, '-' and '_'.")
+        if branch.endswith(ARCHIVE_SUFFIX):
+            raise ValueError(f"Branch names cannot end in '{ARCHIVE_SUFFIX}'.")
+        return os.path.join(self.directory, f"{branch}.db")
+
+    def archive_path(self, branch):
+        return os.path.splitext(self.branch_path(branch))[0] + f"{ARCHIVE_SUFFIX}.db"
+
+    def backup_dir(self, branch):
+        self.branch_path(branch)  # Checks the name
+        return os.path.join(BACKUP_DIRECTORY, branch)
+
+    def branches(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(file_name[:-3] for file_name in os.listdir(self.directory)
+                      if file_name.endswith(".db") and not file_name.endswith(f"{ARCHIVE_SUFFIX}.db"))
+
+    def open(self, branch):
+        """
+        Returns the database path for a branch, creating the branch database on first use.
+        """
+        path = self.branch_path(branch)
+        if not os.path.exists(path):
+            self.create(branch, path)
+        return path
+
+    def create(self, branch, path):
+        # Take the block after the highest one in use, before this branch's file exists
+        id_block = 1 + max((self.query_branch(other, "SELECT coalesce(max(seq), 0) FROM sqlite_sequence "
+                                                    "WHERE name = 'staff'")[0][0] // ID_BLOCK_SIZE
+                            for other in self.branches()), default=0)
+
+        os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(path)
+        try:
+            # Same columns as DatabaseManager creates, but AUTOINCREMENT so new ids continue from the branch's block
+            connection.execute('''
+                CREATE TABLE staff (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    mobile TEXT,
+                    email TEXT,
+                    role TEXT,
+                    salary REAL,
+                    joining_date TEXT,
+                    address TEXT,
+                    remark TEXT,
+                    deleted_at TEXT
+                )
+            ''')
+            connection.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('staff', ?)",
+                               (id_block * ID_BLOCK_SIZE,))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def query_branch(self, branch, query, values=()):
+        # Read only, so federated queries never take a write lock on a branch database
+        connection = sqlite3.connect(f"file:{self.branch_path(branch)}?mode=ro", uri=True)
+        try:
+            return connection.execute(query, values).fetchall()
+        finally:
+            connection.close()
+
+    def query_all(self, query, values=()):
+        """
+        Runs a query on every branch database in parallel. Returns {branch: rows}.
+        """
+        branches = self.branches()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda branch: self.query_branch(branch, query, values), branches)
+            return dict(zip(branches, results))
+
+    def search(self, name):
+        """
+        Searches active staff of all branches by name. Returns staff records with the branch name
+        in place of 'deleted_at', sorted by name.
+        """
+        results = self.query_all(f"SELECT {STAFF_COLUMNS} FROM staff WHERE deleted_at IS NULL AND name LIKE ?",
+                                 (f"%{name}%",))
+        return sorted((row[:9] + (branch,) for branch, rows in results.items() for row in rows),
+                      key=lambda row: (row[1] or "").lower())
+
+    def totals(self):
+        """
+        Returns (branch, headcount, total salary) for every branch.
+        """
+        results = self.query_all("SELECT count(*), total(salary) FROM staff WHERE deleted_at IS NULL")
+        return [(branch, rows[0][0], rows[0][1]) for branch, rows in results.items()]
@@ -0,0 +1,323 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+import uuid
+from datetime import date
+
+from archive import StaffArchiver
+
+
+# Fields exchanged between databases; ids differ per database, so rows are matched by 'sync_uid'
+SYNC_FIELDS = ["name", "mobile", "email", "role", "salary", "joining_date", "address", "remark", "deleted_at"]
+CHANGESET_KEYS = {"origin": str, "until": int, "acks": dict, "rows": list}
+ROW_KEYS = ["origin", "uid", "version"]
+
+# Format 2 added tombstones for removed rows; format 1 changesets are still read
+CHANGESET_FORMAT = 2
+READABLE_FORMATS = (1, 2)
+
+# Next sequence number, taken after the latest write or removal
+NEXT_SEQ = "(SELECT coalesce(max(seq), 0) + 1 FROM (SELECT max(seq) AS seq FROM sync_changes " \
+           "UNION ALL SELECT max(seq) FROM sync_deletes))"
+
+
+class SyncEngine:
+    """
+    Exchanges changed staff rows between copies of the staff database through compressed changeset files.
+    Triggers log every written row with an increasing sequence number, so a changeset holds only the rows
+    changed since the peer last confirmed receipt. Soft deletions travel as rows with 'deleted_at' set;
+    rows removed for good leave a tombstone. A tombstone for an undone add removes the row on the peers too;
+    one for an archived leaver moves the row into each peer's own archive instead.
+    When both sides changed a row, the higher row version wins, and on equal versions the higher database id,
+    so every database ends up with the same row whichever order changesets arrive in. Removing a row counts
+    as one more version of it.
+    Conflicts are settled per row, not per field: when two offices edit different fields of the same record,
+    the losing side's edit is lost as a whole rather than merged.
+    """
+    def __init__(self, db_manager, archiver=None):
+        self.db_manager = db_manager
+        self.archiver = StaffArchiver(db_manager) if archiver is None else archiver
+
+    @staticmethod
+    def create_schema(db_manager):
+        columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+        if "sync_uid" not in columns:
+            db_manager.execute("ALTER TABLE staff ADD COLUMN sync_uid TEXT")
+        db_manager.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_staff_sync_uid ON staff (sync_uid)")
+
+        # One entry per staff row: the sequence number of its latest write, and the database that made it
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS sync_changes (
+                staff_id INTEGER PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                origin TEXT
+            )
+        ''')
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_sync_changes_seq ON sync_changes (seq)")
+        # Tombstones of removed rows, on the same sequence as 'sync_changes'
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS sync_deletes (
+                sync_uid TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                origin TEXT
+            )
+        ''')
+        db_manager.execute("CREATE INDEX IF NOT EXISTS idx_sync_deletes_seq ON sync_deletes (seq)")
+        if "archived" not in [row[1] for row in db_manager.fetch_all("PRAGMA table_info(sync_deletes)")]:
+            db_manager.execute("ALTER TABLE sync_deletes ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        db_manager.execute('''
+            CREATE TABLE IF NOT EXISTS sync_peers (
+                database_id TEXT PRIMARY KEY,
+                received_seq INTEGER NOT NULL DEFAULT 0,
+                acked_seq INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        db_manager.execute("CREATE TABLE IF NOT EXISTS sync_identity (database_id TEXT NOT NULL)")
+        if not db_manager.fetch_all("SELECT 1 FROM sync_identity"):
+            db_manager.execute("INSERT INTO sync_identity (database_id) VALUES (?)", (uuid.uuid4().hex,))
+
+    @staticmethod
+    def backfill_uids(db_manager, batch_size=1000):
+        """
+        Gives existing rows a uid made from their id, name and joining date. Copies taken from the same database
+        agree on the rows they share, while different people added under the same id in two copies get
+        different uids instead of overwriting each other.
+        """
+        while True:
+            rows = db_manager.fetch_all("SELECT id, name, joining_date FROM staff WHERE sync_uid IS NULL LIMIT ?",
+                                        (batch_size,))
+            if not rows:
+                break
+            with db_manager.transaction():
+                db_manager.execute_many("UPDATE staff SET sync_uid = ? WHERE id = ?",
+                                        [(hashlib.blake2b(repr(row).encode("utf-8"), digest_size=16).hexdigest(),
+                                          row[0]) for row in rows])
+
+    @staticmethod
+    def create_triggers(db_manager):
+        log_change = f'''
+            INSERT OR REPLACE INTO sync_changes (staff_id, seq, origin) VALUES (new.id, {NEXT_SEQ}, NULL);
+        '''
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS staff_sync_after_insert AFTER INSERT ON staff
+            BEGIN
+                UPDATE staff SET sync_uid = lower(hex(randomblob(16))) WHERE id = new.id AND sync_uid IS NULL;
+                -- A record brought back from the archive is newer than its removal
+                UPDATE staff SET version = (SELECT version + 1 FROM sync_deletes WHERE sync_uid = new.sync_uid)
+                WHERE id = new.id AND new.version <= (SELECT version FROM sync_deletes WHERE sync_uid = new.sync_uid);
+                DELETE FROM sync_deletes WHERE sync_uid = new.sync_uid;
+                {log_change}
+            END
+        ''')
+        db_manager.execute(f"CREATE TRIGGER IF NOT EXISTS staff_sync_after_update AFTER UPDATE ON staff "
+                           f"BEGIN {log_change} END")
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS staff_sync_after_delete AFTER DELETE ON staff
+            WHEN old.sync_uid IS NOT NULL
+            BEGIN
+                -- Only archiving removes soft deleted rows; an undone add removes an active one
+                INSERT OR REPLACE INTO sync_deletes (sync_uid, seq, version, origin, archived)
+                VALUES (old.sync_uid, {NEXT_SEQ}, old.version + 1, NULL, old.deleted_at IS NOT NULL);
+                DELETE FROM sync_changes WHERE staff_id = old.id;
+            END
+        ''')
+
+    @property
+    def database_id(self):
+        return self.db_manager.fetch_all("SELECT database_id FROM sync_identity")[0][0]
+
+    def new_identity(self):
+        """
+        Gives this database a new sync id. Needed once after copying a database file to set up another office.
+        """
+        with self.db_manager.transaction():
+            # Changes made so far were made under the old id, which the other copies know them by
+            self.db_manager.execute("UPDATE sync_changes SET origin = ? WHERE origin IS NULL", (self.database_id,))
+            self.db_manager.execute("UPDATE sync_deletes SET origin = ? WHERE origin IS NULL", (self.database_id,))
+            self.db_manager.execute("UPDATE sync_identity SET database_id = ?", (uuid.uuid4().hex,))
+        return self.database_id
+
+    def peers(self):
+        """
+        Returns (database id, last sequence received from it, last sequence it confirmed receiving from us).
+        """
+        return self.db_manager.fetch_all("SELECT database_id, received_seq, acked_seq FROM sync_peers "
+                                         "ORDER BY database_id")
+
+    def export_changes(self, path, peer_id=None):
+        """
+        Writes the rows changed or removed since the peer last confirmed receipt to a gzip compressed changeset.
+        Rows last written by the peer itself are left out. Returns the number of rows and tombstones written.
+        """
+        database_id = self.database_id
+        peer = self.db_manager.fetch_all("SELECT acked_seq FROM sync_peers WHERE database_id = ?", (peer_id,))
+        since = peer[0][0] if peer else 0
+
+        rows = self.db_manager.fetch_all(
+            f"SELECT sync_changes.seq, coalesce(sync_changes.origin, ?), staff.sync_uid, staff.version, "
+            f"{', '.join('staff.' + field for field in SYNC_FIELDS)} FROM sync_changes "
+            f"JOIN staff ON staff.id = sync_changes.staff_id "
+            f"WHERE sync_changes.seq > ? AND sync_changes.origin IS NOT ? ORDER BY sync_changes.seq",
+            (database_id, since, peer_id or ""))
+        tombstones = self.db_manager.fetch_all(
+            "SELECT coalesce(origin, ?), sync_uid, version, archived FROM sync_deletes "
+            "WHERE seq > ? AND origin IS NOT ? ORDER BY seq", (database_id, since, peer_id or ""))
+        until = self.db_manager.fetch_all(f"SELECT {NEXT_SEQ} - 1")[0][0]
+
+        changeset = {
+            "format": CHANGESET_FORMAT,
+            "origin": database_id,
+            "since": since,
+            "until": until,
+            # Tells each peer how far we got with its changes, so it can stop resending them
+            "acks": {peer_database_id: received_seq for peer_database_id, received_seq, acked_seq in self.peers()},
+            "rows": [dict(zip(["origin", "uid", "version"] + SYNC_FIELDS, row[1:])) for row in rows],
+            "tombstones": [dict(zip(ROW_KEYS, tombstone[:3]), archived=bool(tombstone[3]))
+                           for tombstone in tombstones],
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as changeset_file:
+            json.dump(changeset, changeset_file, separators=(",", ":"))
+        return len(rows) + len(tombstones)
+
+    def import_changes(self, path):
+        """
+        Applies a changeset from another database in one transaction. Returns (applied, skipped, rejected),
+        where 'rejected' lists messages for rows that would break a uniqueness rule here.
+        """
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as changeset_file:
+                changeset = json.load(changeset_file)
+        except (OSError, ValueError) as error:
+            raise ValueError(f"Not a staff changeset file: {error}")
+        self.check_changeset(changeset)
+
+        database_id = self.database_id
+        origin = changeset["origin"]
+        if origin == database_id:
+            raise ValueError("This changeset came from this database or a copy of it. "
+                             "Give the copy its own sync id first.")
+
+        # ATTACH cannot run inside the import transaction, so attach the archive first if it may be needed
+        if any(tombstone.get("archived") for tombstone in changeset.get("tombstones", [])) or \
+                self.db_manager.fetch_all("SELECT 1 FROM sync_deletes WHERE archived = 1 LIMIT 1"):
+            self.archiver.attach()
+
+        applied = skipped = 0
+        rejected = []
+        with self.db_manager.transaction():
+            for row in changeset["rows"]:
+                try:
+                    with self.db_manager.transaction():
+                        if self.apply_row(row, database_id):
+                            applied += 1
+                        else:
+                            skipped += 1
+                except sqlite3.IntegrityError as error:
+                    rejected.append(f"{row['name']}: {error}")
+            for tombstone in changeset.get("tombstones", []):
+                if self.apply_tombstone(tombstone, database_id):
+                    applied += 1
+                else:
+                    skipped += 1
+
+            self.db_manager.execute("INSERT OR IGNORE INTO sync_peers (database_id) VALUES (?)", (origin,))
+            self.db_manager.execute(
+                "UPDATE sync_peers SET received_seq = max(received_seq, ?), acked_seq = max(acked_seq, ?) "
+                "WHERE database_id = ?", (changeset["until"], changeset["acks"].get(database_id, 0), origin))
+        return applied, skipped, rejected
+
+    def check_changeset(self, changeset):
+        # A damaged or foreign file must fail with a message rather than half way through the import
+        if not isinstance(changeset, dict):
+            raise ValueError("Not a staff changeset file.")
+        if changeset.get("format") not in READABLE_FORMATS:
+            raise ValueError("Unsupported changeset format.")
+        for key, value_type in CHANGESET_KEYS.items():
+            if not isinstance(changeset.get(key), value_type):
+                raise ValueError(f"Damaged changeset file: '{key}' is missing or invalid.")
+        if not isinstance(changeset.get("tombstones", []), list):
+            raise ValueError("Damaged changeset file: 'tombstones' is invalid.")
+        for row in changeset["rows"]:
+            if not isinstance(row, dict) or any(key not in row for key in ROW_KEYS + SYNC_FIELDS):
+                raise ValueError("Damaged changeset file: a changed row is incomplete.")
+        for tombstone in changeset.get("tombstones", []):
+            if not isinstance(tombstone, dict) or any(key not in tombstone for key in ROW_KEYS):
+                raise ValueError("Damaged changeset file: a removed row is incomplete.")
+
+    def local_row(self, uid, database_id):
+        # (staff id, version, origin) of the row with this uid here, or None
+        rows = self.db_manager.fetch_all(
+            "SELECT staff.id, staff.version, coalesce(sync_changes.origin, ?) FROM staff "
+            "LEFT JOIN sync_changes ON sync_changes.staff_id = staff.id WHERE staff.sync_uid = ?",
+            (database_id, uid))
+        return rows[0] if rows else None
+
+    def local_tombstone(self, uid, database_id):
+        # (version, origin, archived) of the removal of the row with this uid here, or None
+        rows = self.db_manager.fetch_all("SELECT version, coalesce(origin, ?), archived FROM sync_deletes "
+                                         "WHERE sync_uid = ?", (database_id, uid))
+        return rows[0] if rows else None
+
+    def apply_row(self, row, database_id):
+        local = self.local_row(row["uid"], database_id)
+
+        values = [row[field] for field in SYNC_FIELDS]
+        if local:
+            staff_id, version, local_origin = local
+            if (version, local_origin) >= (row["version"], row["origin"]):
+                return False
+            self.db_manager.execute(f"UPDATE staff SET {', '.join(field + ' = ?' for field in SYNC_FIELDS)}, "
+                                    f"version = ? WHERE id = ?", values + [row["version"], staff_id])
+        else:
+            # A row removed here stays removed unless the incoming write is newer than the removal
+            tombstone = self.local_tombstone(row["uid"], database_id)
+            if tombstone and tuple(tombstone[:2]) >= (row["version"], row["origin"]):
+                return False
+            if tombstone and tombstone[2]:
+                # Brought back from the archive elsewhere, so the copy in our archive is out of date
+                self.archiver.remove_archived(row["uid"])
+            self.db_manager.execute(f"INSERT INTO staff ({', '.join(SYNC_FIELDS)}, version, sync_uid) "
+                                    f"VALUES ({', '.join('?' * len(SYNC_FIELDS))}, ?, ?)",
+                                    values + [row["version"], row["uid"]])
+            staff_id = self.db_manager.cursor.lastrowid
+            self.db_manager.execute("DELETE FROM sync_deletes WHERE sync_uid = ?", (row["uid"],))
+
+        # Other triggers may have bumped the version; keep the writer's version and origin so both copies agree
+        self.db_manager.execute("UPDATE staff SET version = ? WHERE id = ? AND version IS NOT ?",
+                                (row["version"], staff_id, row["version"]))
+        self.db_manager.execute("UPDATE sync_changes SET origin = ? WHERE staff_id = ?", (row["origin"], staff_id))
+        return True
+
+    def apply_tombstone(self, tombstone, database_id):
+        """
+        Removes the row a tombstone names, unless it was written here after the removal.
+        An archived row is moved into this database's archive rather than deleted.
+        """
+        incoming = (tombstone["version"], tombstone["origin"])
+        archived = bool(tombstone.get("archived"))
+        local = self.local_row(tombstone["uid"], database_id)
+        if local:
+            staff_id, version, local_origin = local
+            if (version, local_origin) >= incoming:
+                return False
+            # The delete trigger leaves a tombstone here too, so the removal travels on to other peers
+            if archived:
+                # The leaver's soft delete may not have arrived yet; archived records are always deleted ones
+                self.db_manager.execute("UPDATE staff SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL",
+                                        (date.today().isoformat(), staff_id))
+                self.archiver.move([staff_id])
+            else:
+                self.db_manager.execute("DELETE FROM staff WHERE id = ?", (staff_id,))
+        else:
+            local_tombstone = self.local_tombstone(tombstone["uid"], database_id)
+            if local_tombstone and tuple(local_tombstone[:2]) >= incoming:
+                return False
+            self.db_manager.execute(f"INSERT OR REPLACE INTO sync_deletes (sync_uid, seq, version, origin) "
+                                    f"VALUES (?, {NEXT_SEQ}, ?, ?)", (tombstone["uid"],) + incoming)
+
+        # Keep the remover's version, origin and kind of removal so every copy agrees on the tombstone
+        self.db_manager.execute("UPDATE sync_deletes SET version = ?, origin = ?, archived = ? WHERE sync_uid = ?",
+                                incoming + (archived, tombstone["uid"]))
+        return True
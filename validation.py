@@ -0,0 +1,27 @@
+import re
+
+
+# Use a basic regular expression for email validation
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,4}$")
+
+
+def validate_mobile(mobile_text):
+    if not mobile_text.isdigit() or len(mobile_text) != 10:
+        return None
+    return mobile_text
+
+
+def validate_email(email_text):
+    if not EMAIL_PATTERN.match(email_text):
+        return None
+    return email_text
+
+
+def validate_salary(salary_text):
+    try:
+        salary = float(salary_text)
+        if salary <= 0:
+            raise ValueError("Salary must be a positive number")
+        return salary
+    except ValueError:
+        return None
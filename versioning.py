@@ -0,0 +1,71 @@
+from database import STAFF_COLUMNS
+
+
+# Columns a user can see or edit; bookkeeping columns kept up to date by triggers don't change the version
+VERSIONED_COLUMNS = ["name", "mobile", "email", "role", "salary", "joining_date", "address", "remark", "deleted_at",
+                     "manager_id"]
+
+
+class EditConflict(Exception):
+    """
+    Raised when a staff record changed after it was read. 'current' and 'version' hold the record as it is now,
+    or None if it no longer exists.
+    """
+    def __init__(self, message, current, version):
+        super().__init__(message)
+        self.current = current
+        self.version = version
+
+
+class RowVersions:
+    """
+    Gives every staff row a version number that each write increases, for optimistic concurrency:
+    an editor remembers the version it read and only writes if the row still has that version,
+    so nothing is locked while a dialog is open.
+    """
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def create_schema(db_manager):
+        columns = [row[1] for row in db_manager.fetch_all("PRAGMA table_info(staff)")]
+        if "version" not in columns:
+            db_manager.execute("ALTER TABLE staff ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+        # Writes that don't bump the version themselves get it bumped here, if they changed what a user sees
+        changed = " OR ".join(f"new.{column} IS NOT old.{column}" for column in VERSIONED_COLUMNS)
+        db_manager.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS staff_version_after_update AFTER UPDATE ON staff
+            WHEN new.version IS old.version AND ({changed})
+            BEGIN
+                UPDATE staff SET version = old.version + 1 WHERE id = new.id;
+            END
+        ''')
+
+    def fetch(self, staff_id):
+        """
+        Returns (record, version) for a staff member, or (None, None) if the record no longer exists.
+        """
+        rows = self.db_manager.fetch_all(f"SELECT {STAFF_COLUMNS}, version FROM staff WHERE id = ?", (staff_id,))
+        return (rows[0][:-1], rows[0][-1]) if rows else (None, None)
+
+    def update(self, staff_id, version, fields):
+        """
+        Writes the fields only if the record is still active and at the version that was read.
+        The version goes up only if a column a user sees changes. Raises EditConflict otherwise.
+        """
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        # Columns on the right of SET hold the values from before the update. A column's type applies to the value
+        # it is compared with, so saving '42000' over a salary of 42000.0 is no change.
+        versioned = [field for field in fields if field in VERSIONED_COLUMNS]
+        changed = " OR ".join(f"{field} IS NOT ?" for field in versioned) or "0"
+        self.db_manager.execute(f"UPDATE staff SET {assignments}, version = version + CASE WHEN {changed} THEN 1 "
+                                f"ELSE 0 END WHERE id = ? AND version = ? AND deleted_at IS NULL",
+                                list(fields.values()) + [fields[field] for field in versioned] + [staff_id, version])
+        if self.db_manager.cursor.rowcount == 0:
+            current, current_version = self.fetch(staff_id)
+            if current is None or current[9] is not None:
+                raise EditConflict("This staff member has been deleted by someone else.", current, current_version)
+            raise EditConflict("This staff member was changed by someone else while you were editing. "
+                               "The latest details have been loaded; please make your changes again.",
+                               current, current_version)